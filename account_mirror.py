@@ -0,0 +1,310 @@
+import asyncio
+from collections import deque
+
+from config import SYMBOL, LEVERAGE, ACCOUNT_RESYNC_SECONDS
+
+ESTADOS_ABIERTOS = ('NEW', 'PARTIALLY_FILLED')
+ESTADOS_ALGO_ABIERTOS = ('NEW',)  # después de TRIGGERING/TRIGGERED la sigue una orden normal
+EVENTOS_DE_ORDEN = ('ORDER_TRADE_UPDATE', 'ALGO_UPDATE')  # eventos de un solo símbolo (o.s)
+MAX_CERRADAS = 1000  # ids cerrados recordados para ignorar respuestas REST que llegan tarde
+MAX_TRADES_VISTOS = 5000  # ids de fills ya aplicados, para no duplicar al recuperar un hueco del USER stream
+LIMITE_USER_TRADES = 1000  # máximo de Binance por página de userTrades
+
+
+class AccountMirror:
+    """
+    Espejo local de la cuenta: órdenes abiertas (por orderId y clientOrderId),
+    órdenes algo abiertas (los SL, por algoId), posición y balance. Se mantiene al
+    día con ORDER_TRADE_UPDATE / ALGO_UPDATE / ACCOUNT_UPDATE del USER stream y con
+    las respuestas de crear/cancelar; REST sólo se consulta al arrancar, tras
+    reconectar el USER stream y cada `resync_seconds`.
+    """
+
+    def __init__(self, client, symbol=SYMBOL, resync_seconds=ACCOUNT_RESYNC_SECONDS, leverage=LEVERAGE):
+        self.client = client
+        self.symbol = symbol
+        self.resync_seconds = float(resync_seconds)
+        self.leverage = float(leverage)
+        self.ordenes = {}          # orderId -> orden con el formato de GET openOrders
+        self.por_client_id = {}    # clientOrderId -> orderId
+        self.algos = {}            # algoId -> orden algo con el formato de GET openAlgoOrders
+        self._cerradas = set()
+        self._cerradas_fifo = deque()
+        self._trades = set()
+        self._trades_fifo = deque()
+        # Cambios locales (stream o respuestas REST) numerados: un resync no pisa lo que cambió durante sus requests
+        self._seq = 0
+        self._seq_orden = {}       # orderId / ('algo', algoId) -> _seq de su último cambio
+        self._seq_cuenta = 0       # _seq del último ACCOUNT_UPDATE
+        self.posicion = 0.0
+        self.entrada = 0.0
+        self.wallet = 0.0
+        self._ajuste_balance = 0.0  # availableBalance REST - estimación local en el último resync
+        self.sincronizado = False
+        self.ultimo_evento_ms = 0
+        self.hueco_desde_ms = None  # último evento visto antes de un hueco del USER stream todavía sin recuperar
+        self.resyncs = 0
+        self.divergencias = 0
+        self._lock = asyncio.Lock()
+
+    # --- lectura ---
+    def ordenes_abiertas(self):
+        return list(self.ordenes.values())
+
+    def algos_abiertas(self):
+        return list(self.algos.values())
+
+    def orden(self, order_id=None, client_order_id=None):
+        if order_id is None and client_order_id is not None:
+            order_id = self.por_client_id.get(client_order_id)
+        return self.ordenes.get(order_id)
+
+    def _margen_local(self):
+        margen_ordenes = 0.0
+        for o in self.ordenes.values():
+            if o.get('reduceOnly') in (True, 'true', 'True') or o.get('closePosition') in (True, 'true', 'True'):
+                continue
+            resto = float(o.get('origQty') or 0) - float(o.get('executedQty') or 0)
+            margen_ordenes += resto * float(o.get('price') or 0)
+        return (margen_ordenes + abs(self.posicion) * self.entrada) / self.leverage
+
+    def balance_disponible(self):
+        """availableBalance estimado: wallet - margen de posición y órdenes, calibrado en cada resync."""
+        return self.wallet - self._margen_local() + self._ajuste_balance
+
+    # --- mutaciones ---
+    def _marcar_cerrada(self, clave):
+        # clave: orderId, o ('algo', algoId) para las órdenes algo (otro espacio de ids)
+        if clave in self._cerradas:
+            return
+        self._cerradas.add(clave)
+        self._cerradas_fifo.append(clave)
+        if len(self._cerradas_fifo) > MAX_CERRADAS:
+            self._cerradas.discard(self._cerradas_fifo.popleft())
+
+    def _tocar(self, clave):
+        self._seq += 1
+        self._seq_orden[clave] = self._seq
+
+    def _guardar(self, o):
+        oid = o['orderId']
+        previa = self.ordenes.get(oid)
+        if previa is not None and int(previa.get('updateTime') or 0) > int(o.get('updateTime') or 0):
+            return
+        self.ordenes[oid] = o
+        self._tocar(oid)
+        if o.get('clientOrderId'):
+            self.por_client_id[o['clientOrderId']] = oid
+
+    def trade_nuevo(self, trade_id):
+        """True la primera vez que se ve un fill (por stream o por userTrades); lo marca como visto."""
+        if trade_id is None:
+            return True
+        trade_id = int(trade_id)
+        if trade_id in self._trades:
+            return False
+        self._trades.add(trade_id)
+        self._trades_fifo.append(trade_id)
+        if len(self._trades_fifo) > MAX_TRADES_VISTOS:
+            self._trades.discard(self._trades_fifo.popleft())
+        return True
+
+    def quitar(self, order_id):
+        o = self.ordenes.pop(order_id, None)
+        self._seq_orden.pop(order_id, None)
+        self._marcar_cerrada(order_id)
+        if o is not None and self.por_client_id.get(o.get('clientOrderId')) == order_id:
+            del self.por_client_id[o['clientOrderId']]
+
+    def quitar_algo(self, algo_id):
+        self.algos.pop(algo_id, None)
+        self._seq_orden.pop(('algo', algo_id), None)
+        self._marcar_cerrada(('algo', algo_id))
+
+    def _guardar_algo(self, a):
+        previa = self.algos.get(a['algoId'])
+        if previa is not None and int(previa.get('updateTime') or 0) > int(a.get('updateTime') or 0):
+            return
+        self.algos[a['algoId']] = a
+        self._tocar(('algo', a['algoId']))
+
+    def registrar_respuesta(self, r):
+        """Respuesta REST de crear orden (u orden algo): entra al espejo salvo que el stream ya la haya cerrado."""
+        if isinstance(r, dict) and 'algoId' in r:
+            if not r.get('code') and r.get('algoStatus') in ESTADOS_ALGO_ABIERTOS and ('algo', r['algoId']) not in self._cerradas:
+                self._guardar_algo(dict(r))
+            return
+        if not isinstance(r, dict) or r.get('code') or r.get('status') not in ESTADOS_ABIERTOS:
+            return
+        oid = r.get('orderId')
+        if oid is None or oid in self._cerradas:
+            return
+        self._guardar(dict(r))
+
+    def limpiar_ordenes(self):
+        for oid in list(self.ordenes):
+            self.quitar(oid)
+
+    def aplicar_evento(self, msg):
+        e = msg.get('e')
+        if e == 'ORDER_TRADE_UPDATE':
+            self._aplicar_orden(msg.get('o', {}), msg.get('E') or msg.get('T') or 0)
+        elif e == 'ALGO_UPDATE':
+            self._aplicar_algo(msg.get('o', {}), msg.get('E') or msg.get('T') or 0)
+        elif e == 'ACCOUNT_UPDATE':
+            self._aplicar_cuenta(msg.get('a', {}))
+        else:
+            return
+        self.ultimo_evento_ms = int(msg.get('E') or self.ultimo_evento_ms)
+
+    def _aplicar_orden(self, o, ts):
+        if o.get('s') != self.symbol:
+            return
+        oid = o.get('i')
+        if o.get('X') not in ESTADOS_ABIERTOS:
+            self.quitar(oid)
+            return
+        if oid in self._cerradas:
+            return
+        self._guardar({
+            'orderId': oid,
+            'clientOrderId': o.get('c'),
+            'symbol': o.get('s'),
+            'side': o.get('S'),
+            'type': o.get('o'),
+            'price': o.get('p'),
+            'origQty': o.get('q'),
+            'executedQty': o.get('z', '0'),
+            'avgPrice': o.get('ap', '0'),
+            'stopPrice': o.get('sp', '0'),
+            'reduceOnly': o.get('R', False),
+            'closePosition': o.get('cp', False),
+            'status': o.get('X'),
+            'timeInForce': o.get('f'),
+            'updateTime': int(o.get('T') or ts or 0),
+        })
+
+    def _aplicar_algo(self, o, ts):
+        if o.get('s') != self.symbol:
+            return
+        aid = o.get('aid')
+        if o.get('X') not in ESTADOS_ALGO_ABIERTOS:
+            self.quitar_algo(aid)
+            return
+        if ('algo', aid) in self._cerradas:
+            return
+        self._guardar_algo({
+            'algoId': aid,
+            'clientAlgoId': o.get('caid'),
+            'algoType': o.get('at'),
+            'orderType': o.get('o'),
+            'symbol': o.get('s'),
+            'side': o.get('S'),
+            'quantity': o.get('q'),
+            'triggerPrice': o.get('tp'),
+            'price': o.get('p'),
+            'reduceOnly': o.get('R', False),
+            'closePosition': o.get('cp', False),
+            'algoStatus': o.get('X'),
+            'updateTime': int(ts or 0),
+        })
+
+    def _aplicar_cuenta(self, a):
+        self._seq += 1
+        self._seq_cuenta = self._seq
+        for b in a.get('B', []):
+            if b.get('a') == 'USDT':
+                self.wallet = float(b.get('cw') or b.get('wb') or 0)
+        for p in a.get('P', []):
+            if p.get('s') == self.symbol and p.get('ps', 'BOTH') == 'BOTH':
+                self.posicion = float(p.get('pa') or 0)
+                self.entrada = float(p.get('ep') or 0)
+
+    # --- REST ---
+    def invalidar(self):
+        """Se perdieron eventos (reconexión del USER stream): leer de REST hasta resincronizar."""
+        self.sincronizado = False
+        if self.hueco_desde_ms is None:
+            self.hueco_desde_ms = self.ultimo_evento_ms
+
+    async def sincronizar(self):
+        """
+        Reemplaza el espejo por el estado REST. Lo que el stream o una respuesta de
+        crear/cancelar cambió mientras los requests estaban en vuelo es más nuevo que
+        REST y se conserva: las órdenes cerradas no vuelven y las recién creadas quedan.
+        """
+        async with self._lock:
+            seq0 = self._seq
+            try:
+                ordenes, algos, posiciones, cuenta = await asyncio.gather(
+                    self.client.get_open_orders(),
+                    self.client.get_open_algo_orders(),
+                    self.client.futures_position_information(),
+                    self.client.futures_account(),
+                )
+            except Exception as e:
+                print(f"[CUENTA] Error al sincronizar: {e}")
+                return False
+            if (not isinstance(ordenes, list) or not isinstance(algos, list) or not isinstance(posiciones, list)
+                    or not isinstance(cuenta, dict)):
+                print("[CUENTA] Respuesta inválida al sincronizar")
+                return False
+
+            nuevas = {o['orderId']: o for o in ordenes
+                      if o.get('status', 'NEW') in ESTADOS_ABIERTOS and o['orderId'] not in self._cerradas}
+            nuevas_algos = {a['algoId']: a for a in algos
+                            if a.get('symbol', self.symbol) == self.symbol
+                            and a.get('algoStatus', 'NEW') in ESTADOS_ALGO_ABIERTOS and ('algo', a['algoId']) not in self._cerradas}
+            recientes = {oid: o for oid, o in self.ordenes.items() if self._seq_orden.get(oid, 0) > seq0}
+            recientes_algos = {aid: a for aid, a in self.algos.items() if self._seq_orden.get(('algo', aid), 0) > seq0}
+            if self.sincronizado:
+                dif = len((set(nuevas) - set(recientes)) ^ (set(self.ordenes) - set(recientes)))
+                if dif:
+                    self.divergencias += dif
+                    print(f"[CUENTA] Resync: {dif} órdenes difieren del espejo")
+            self.ordenes = {}
+            self.por_client_id = {}
+            self.algos = {}
+            self._seq_orden = {}
+            for o in nuevas.values():
+                self._guardar(o)
+            for a in nuevas_algos.values():
+                self._guardar_algo(a)
+            # _guardar se queda con la versión de updateTime más nuevo
+            for o in recientes.values():
+                self._guardar(o)
+            for a in recientes_algos.values():
+                self._guardar_algo(a)
+            if self._seq_cuenta <= seq0:
+                for p in posiciones:
+                    if p.get('symbol') == self.symbol:
+                        self.posicion = float(p.get('positionAmt') or 0)
+                        self.entrada = float(p.get('entryPrice') or 0)
+            disponible = 0.0
+            for asset in cuenta.get('assets', []):
+                if asset.get('asset') == 'USDT':
+                    if self._seq_cuenta <= seq0:
+                        self.wallet = float(asset.get('crossWalletBalance') or asset.get('walletBalance') or 0)
+                    disponible = float(asset.get('availableBalance') or 0)
+            self._ajuste_balance = 0.0
+            self._ajuste_balance = disponible - self.balance_disponible()
+            self.sincronizado = True
+            self.resyncs += 1
+            return True
+
+    async def trades_desde(self, desde_ms):
+        """Fills del símbolo desde `desde_ms` (userTrades paginado por id), ascendentes."""
+        trades = await self.client.futures_account_trades(startTime=desde_ms, limit=LIMITE_USER_TRADES)
+        pagina = trades
+        while isinstance(pagina, list) and len(pagina) >= LIMITE_USER_TRADES:
+            pagina = await self.client.futures_account_trades(fromId=int(pagina[-1]['id']) + 1, limit=LIMITE_USER_TRADES)
+            if isinstance(pagina, list):
+                trades = trades + pagina
+        if not isinstance(trades, list):
+            raise ValueError(f"respuesta inválida de userTrades: {trades}")
+        return sorted((t for t in trades if t.get('symbol', self.symbol) == self.symbol), key=lambda t: int(t['id']))
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.resync_seconds)
+            await self.sincronizar()
@@ -1,131 +1,165 @@
-import pandas as pd
-import ast
-import matplotlib.pyplot as plt
-
-# Cambia por el path real de tu log
-CSV_PATH = "log_historico.csv"
-
-def parse_signal(signal):
-    if pd.isna(signal) or signal == '':
-        return None
-    try:
-        return ast.literal_eval(signal)
-    except Exception:
-        return signal
-
-def parse_orders(order_str):
-    if pd.isna(order_str) or order_str == '':
-        return []
-    try:
-        return ast.literal_eval(order_str.replace('""', '"'))
-    except Exception:
-        return []
-
-def parse_tp(tp_str):
-    if pd.isna(tp_str) or tp_str == '':
-        return []
-    try:
-        return ast.literal_eval(tp_str.replace('""', '"'))
-    except Exception:
-        return []
-
-def parse_sl(sl_str):
-    if pd.isna(sl_str) or sl_str == '':
-        return []
-    try:
-        return ast.literal_eval(sl_str.replace('""', '"'))
-    except Exception:
-        return []
-
-def main():
-    df = pd.read_csv(CSV_PATH)
-
-    # Parse signals and orders
-    df['signal_parsed'] = df['signal'].apply(parse_signal)
-    df['open_orders_parsed'] = df['open_orders'].apply(parse_orders)
-    df['take_profits_parsed'] = df['take_profits'].apply(parse_tp)
-    df['stop_loss_parsed'] = df['stop_loss'].apply(parse_sl)
-
-    # Basic info
-    print("\n--- Info General ---")
-    print(df.info())
-    print("\n--- Primeras filas ---")
-    print(df.head(10))
-
-    # Estadísticas de precios y posición
-    print("\n--- Estadísticas de precios ---")
-    print(df['last_price'].describe())
-    print("\n--- Estadísticas de posición_qty ---")
-    print(df['position_qty'].describe())
-    print("\n--- Estadísticas de position_avg ---")
-    print(df['position_avg'].describe())
-    print("\n--- Estadísticas de fees ---")
-    print(df['fees'].describe())
-
-    # Número de órdenes abiertas por ciclo
-    df['num_open_orders'] = df['open_orders_parsed'].apply(lambda x: len(x))
-    print("\n--- Órdenes abiertas por ciclo ---")
-    print(df['num_open_orders'].describe())
-    print("Máximos:", df['num_open_orders'].max(), "Mínimos:", df['num_open_orders'].min())
-
-    # Ratio TP/SL por ciclo
-    df['num_tp'] = df['take_profits_parsed'].apply(lambda x: len(x))
-    df['num_sl'] = df['stop_loss_parsed'].apply(lambda x: len(x))
-    print("\n--- Ratio Take Profit / Stop Loss ---")
-    print("TP totales:", df['num_tp'].sum())
-    print("SL totales:", df['num_sl'].sum())
-    print("TP/SL ratio:", df['num_tp'].sum() / max(1, df['num_sl'].sum()))
-
-    # Señales utilizadas
-    print("\n--- Tipos de señales ---")
-    print(df['signal'].value_counts())
-
-    # Evolución de posición y precio
-    plt.figure(figsize=(12,4))
-    plt.plot(df['timestamp'], df['last_price'], label='Precio')
-    plt.plot(df['timestamp'], df['position_avg'], label='Promedio Entrada', alpha=0.7)
-    plt.legend()
-    plt.xticks(rotation=45)
-    plt.title('Evolución Precio y Promedio Entrada')
-    plt.tight_layout()
-    plt.show()
-
-    # Evolución de cantidad de posición
-    plt.figure(figsize=(12,4))
-    plt.plot(df['timestamp'], df['position_qty'], label='Cantidad Posición')
-    plt.xticks(rotation=45)
-    plt.title('Evolución Cantidad de Posición')
-    plt.tight_layout()
-    plt.show()
-
-    # Evolución de órdenes abiertas
-    plt.figure(figsize=(12,4))
-    plt.plot(df['timestamp'], df['num_open_orders'], label='Órdenes Abiertas')
-    plt.xticks(rotation=45)
-    plt.title('Órdenes Abiertas a lo largo del tiempo')
-    plt.tight_layout()
-    plt.show()
-
-    # Histograma de fees
-    plt.figure()
-    df['fees'].hist(bins=30)
-    plt.title('Distribución de Fees')
-    plt.xlabel('Fee')
-    plt.ylabel('Frecuencia')
-    plt.show()
-
-    # Profit estimado (simple, puedes mejorar)
-    # Si tienes la lógica para TP/SL, puedes sumar los profits según fills
-    print("\n--- Profit estimado (sólo muestra las fees acumuladas) ---")
-    print("Fees totales:", df['fees'].sum())
-
-    # Si tienes fills, podrías sumar el PNL por TP/SL (mejorable si agregas fills al log)
-
-    # Más análisis: añadir drawdown, PNL por sesión, ratio de rebalanceos, etc.
-    # Puedes agregar lo que quieras con pandas, por ejemplo:
-    # - Agrupar por día y ver profit diario
-    # - Ver cuántos ciclos hay entre cada TP/SL
-    # - Analizar la relación entre spacing y profit
-
-if __name__ == "__main__":
+import argparse
+import pandas as pd
+import ast
+import matplotlib.pyplot as plt
+
+from logger import leer_historico, LOG_HISTORICO_PATH
+
+# Cambia por el path real de tu log (formato CSV anterior)
+CSV_PATH = LOG_HISTORICO_PATH
+
+def parse_signal(signal):
+    if pd.isna(signal) or signal == '':
+        return None
+    try:
+        return ast.literal_eval(signal)
+    except Exception:
+        return signal
+
+def parse_orders(order_str):
+    if pd.isna(order_str) or order_str == '':
+        return []
+    try:
+        return ast.literal_eval(order_str.replace('""', '"'))
+    except Exception:
+        return []
+
+def parse_tp(tp_str):
+    if pd.isna(tp_str) or tp_str == '':
+        return []
+    try:
+        return ast.literal_eval(tp_str.replace('""', '"'))
+    except Exception:
+        return []
+
+def parse_sl(sl_str):
+    # La columna stop_loss guarda el precio plano del SL (vacío si no hay)
+    try:
+        return float(sl_str)
+    except (TypeError, ValueError):
+        return float('nan')
+
+def cargar_csv(path):
+    """Formato anterior: órdenes como JSON dentro de celdas CSV."""
+    df = pd.read_csv(path)
+    df['signal_parsed'] = df['signal'].apply(parse_signal)
+    df['open_orders_parsed'] = df['open_orders'].apply(parse_orders)
+    df['take_profits_parsed'] = df['take_profits'].apply(parse_tp)
+    df['stop_loss'] = df['stop_loss'].apply(parse_sl)
+    df['num_open_orders'] = df['open_orders_parsed'].apply(len)
+    df['num_tp'] = df['take_profits_parsed'].apply(len)
+    return df
+
+def cargar_columnar(desde=None, hasta=None):
+    df, ordenes = leer_historico(desde, hasta)
+    df['signal'] = df['signal_nombre']
+    df['num_open_orders'] = df['n_orders']
+    # TP = órdenes SELL reduceOnly de cada fila (tabla hija)
+    tps = ordenes[(ordenes['side'] == 'SELL') & (ordenes['reduce_only'] == 1)]
+    conteo = tps.groupby(['chunk', 'fila']).size().rename('num_tp')
+    df = df.join(conteo, on=['chunk', 'fila'])
+    df['num_tp'] = df['num_tp'].fillna(0).astype(int)
+    return df
+
+def main():
+    parser = argparse.ArgumentParser(description="Análisis del histórico del grid")
+    parser.add_argument('--csv', nargs='?', const=CSV_PATH, help="Leer el CSV del formato anterior")
+    parser.add_argument('--desde', help="Inicio del rango (ISO, ej. 2024-05-01T00:00:00+00:00)")
+    parser.add_argument('--hasta', help="Fin del rango (ISO)")
+    parser.add_argument('--reporte', metavar='DIR',
+                        help="Modo headless: análisis en streaming y en paralelo, gráficos y reporte a DIR")
+    args = parser.parse_args()
+
+    if args.reporte:
+        from analyze_stream import generar_reporte, ms_desde_iso
+        generar_reporte(args.reporte, args.csv, ms_desde_iso(args.desde), ms_desde_iso(args.hasta))
+        return
+
+    if args.csv:
+        df = cargar_csv(args.csv)
+    else:
+        desde = pd.Timestamp(args.desde).to_pydatetime() if args.desde else None
+        hasta = pd.Timestamp(args.hasta).to_pydatetime() if args.hasta else None
+        df = cargar_columnar(desde, hasta)
+    df['num_sl'] = df['stop_loss'].notna().astype(int)
+
+    # Basic info
+    print("\n--- Info General ---")
+    print(df.info())
+    print("\n--- Primeras filas ---")
+    print(df.head(10))
+
+    # Estadísticas de precios y posición
+    print("\n--- Estadísticas de precios ---")
+    print(df['last_price'].describe())
+    print("\n--- Estadísticas de posición_qty ---")
+    print(df['position_qty'].describe())
+    print("\n--- Estadísticas de position_avg ---")
+    print(df['position_avg'].describe())
+    print("\n--- Estadísticas de fees ---")
+    print(df['fees'].describe())
+
+    # Número de órdenes abiertas por ciclo
+    print("\n--- Órdenes abiertas por ciclo ---")
+    print(df['num_open_orders'].describe())
+    print("Máximos:", df['num_open_orders'].max(), "Mínimos:", df['num_open_orders'].min())
+
+    # Ratio TP/SL por ciclo
+    print("\n--- Ratio Take Profit / Stop Loss ---")
+    print("TP totales:", df['num_tp'].sum())
+    print("SL totales:", df['num_sl'].sum())
+    print("TP/SL ratio:", df['num_tp'].sum() / max(1, df['num_sl'].sum()))
+
+    # Señales utilizadas
+    print("\n--- Tipos de señales ---")
+    print(df['signal'].value_counts())
+
+    # Evolución de posición y precio
+    plt.figure(figsize=(12,4))
+    plt.plot(df['timestamp'], df['last_price'], label='Precio')
+    plt.plot(df['timestamp'], df['position_avg'], label='Promedio Entrada', alpha=0.7)
+    plt.legend()
+    plt.xticks(rotation=45)
+    plt.title('Evolución Precio y Promedio Entrada')
+    plt.tight_layout()
+    plt.show()
+
+    # Evolución de cantidad de posición
+    plt.figure(figsize=(12,4))
+    plt.plot(df['timestamp'], df['position_qty'], label='Cantidad Posición')
+    plt.xticks(rotation=45)
+    plt.title('Evolución Cantidad de Posición')
+    plt.tight_layout()
+    plt.show()
+
+    # Evolución de órdenes abiertas
+    plt.figure(figsize=(12,4))
+    plt.plot(df['timestamp'], df['num_open_orders'], label='Órdenes Abiertas')
+    plt.xticks(rotation=45)
+    plt.title('Órdenes Abiertas a lo largo del tiempo')
+    plt.tight_layout()
+    plt.show()
+
+    # Histograma de fees
+    plt.figure()
+    df['fees'].hist(bins=30)
+    plt.title('Distribución de Fees')
+    plt.xlabel('Fee')
+    plt.ylabel('Frecuencia')
+    plt.show()
+
+    # Profit estimado (simple, puedes mejorar)
+    # Si tienes la lógica para TP/SL, puedes sumar los profits según fills
+    print("\n--- Profit estimado (sólo muestra las fees acumuladas) ---")
+    print("Fees totales:", df['fees'].sum())
+
+    # Si tienes fills, podrías sumar el PNL por TP/SL (mejorable si agregas fills al log)
+
+    # Más análisis: añadir drawdown, PNL por sesión, ratio de rebalanceos, etc.
+    # Puedes agregar lo que quieras con pandas, por ejemplo:
+    # - Agrupar por día y ver profit diario
+    # - Ver cuántos ciclos hay entre cada TP/SL
+    # - Analizar la relación entre spacing y profit
+
+if __name__ == "__main__":
     main()
\ No newline at end of file
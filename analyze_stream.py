@@ -0,0 +1,443 @@
+"""
+Análisis del histórico en streaming, por bloques y en paralelo, sin cargarlo entero.
+
+El log se parte en tareas independientes (chunks del histórico columnar o rangos
+de bytes del CSV anterior) que un multiprocessing.Pool resume por separado. Cada
+resumen es mergeable y se combinan en orden, así que la memoria queda acotada
+por el tamaño de un bloque y no por el del log:
+
+  - describe(): Welford/Chan para media y varianza, min/max exactos y cuantiles
+    sobre un reservoir de tamaño fijo.
+  - distribución de órdenes abiertas, TP/SL y señales: Counters.
+  - equity (PnL realizado estimado - fees + PnL no realizado) como segmentos con
+    delta, pico, mínimo y drawdown; al unir dos segmentos se aplica la transición
+    entre la última fila de uno y la primera del otro.
+  - PnL diario: suma de incrementos de equity por día UTC.
+
+Los gráficos (backend Agg) y el reporte (txt + json) se escriben en un directorio.
+Uso: python analyze_stream.py [--csv log_historico.csv] [--desde ISO] [--hasta ISO] [-o reporte/]
+"""
+import argparse
+import io
+import json
+import math
+import multiprocessing as mp
+import os
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from logger import leer_index, leer_historico, HISTORICO_DIR, LOG_HISTORICO_PATH
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+COLUMNAS_STATS = ("last_price", "position_qty", "position_avg", "fees", "num_open_orders")
+RESERVOIR = 4096
+PUNTOS_POR_BLOQUE = 500     # puntos de la serie para gráficos que aporta cada bloque
+MAX_PUNTOS = 20000          # al superarlo la serie se diezma a la mitad
+FILAS_POR_LOTE = 50000      # filas del CSV parseadas a la vez
+BYTES_POR_TAREA = 64 * 1024 * 1024
+
+
+class Momentos:
+    """count/mean/std/min/max exactos y cuantiles aproximados (reservoir), mergeables."""
+
+    def __init__(self):
+        self.n = 0
+        self.media = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.muestra = np.zeros(0)
+
+    def _unir(self, n, media, m2, mn, mx, muestra, rng):
+        if n == 0:
+            return
+        total = self.n + n
+        d = media - self.media
+        self.media += d * n / total
+        self.m2 += m2 + d * d * self.n * n / total
+        self.min = min(self.min, mn)
+        self.max = max(self.max, mx)
+        # Reservoir ponderado: cada lado aporta en proporción a las filas que representa
+        k = min(RESERVOIR, len(self.muestra) + len(muestra))
+        k_a = min(len(self.muestra), int(round(k * self.n / total)))
+        k_b = min(len(muestra), k - k_a)
+        self.muestra = np.concatenate([
+            rng.choice(self.muestra, k_a, replace=False) if k_a < len(self.muestra) else self.muestra,
+            rng.choice(muestra, k_b, replace=False) if k_b < len(muestra) else muestra,
+        ])
+        self.n = total
+
+    def agregar(self, valores, rng):
+        v = np.asarray(valores, dtype=np.float64)
+        v = v[~np.isnan(v)]
+        if not len(v):
+            return
+        muestra = rng.choice(v, RESERVOIR, replace=False) if len(v) > RESERVOIR else v
+        self._unir(len(v), float(v.mean()), float(((v - v.mean()) ** 2).sum()), float(v.min()), float(v.max()), muestra, rng)
+
+    def merge(self, otro, rng):
+        self._unir(otro.n, otro.media, otro.m2, otro.min, otro.max, otro.muestra, rng)
+
+    def describe(self):
+        if not self.n:
+            return {"count": 0}
+        q = np.quantile(self.muestra, [0.25, 0.5, 0.75]) if len(self.muestra) else [math.nan] * 3
+        return {
+            "count": self.n, "mean": self.media,
+            "std": math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0,
+            "min": self.min, "25%": float(q[0]), "50%": float(q[1]), "75%": float(q[2]), "max": self.max,
+        }
+
+
+def _incrementos(q0, avg0, f0, p0, q1, avg1, f1, p1):
+    """Cambio de equity entre filas consecutivas (vectorizado o escalar)."""
+    realizado = np.maximum(q0 - q1, 0.0) * (p1 - avg0)      # reducción de posición al precio logueado
+    fee = np.where(f1 >= f0, f1 - f0, f1)                    # fees_total se resetea al cerrar posición
+    return realizado - fee + q1 * (p1 - avg1) - q0 * (p0 - avg0)
+
+
+class Resumen:
+    def __init__(self):
+        self.filas = 0
+        self.stats = {c: Momentos() for c in COLUMNAS_STATS}
+        self.ordenes = Counter()
+        self.tp = 0
+        self.sl = 0
+        self.senales = Counter()
+        self.desde = None
+        self.hasta = None
+        # Segmento de equity relativo a su primera fila
+        self.primera = None     # (q, avg, fees, precio)
+        self.ultima = None
+        self.dia_primera = None
+        self.delta = 0.0
+        self.pico = 0.0
+        self.minimo = 0.0
+        self.drawdown = 0.0
+        self.pnl_diario = Counter()
+        self.serie = None
+
+    def merge(self, otro, rng):
+        if not otro.filas:
+            return self
+        if not self.filas:
+            return otro
+        self.filas += otro.filas
+        for c in COLUMNAS_STATS:
+            self.stats[c].merge(otro.stats[c], rng)
+        self.ordenes += otro.ordenes
+        self.tp += otro.tp
+        self.sl += otro.sl
+        self.senales += otro.senales
+        self.desde = min(self.desde, otro.desde)
+        self.hasta = max(self.hasta, otro.hasta)
+        self.pnl_diario.update(otro.pnl_diario)  # update() conserva los días negativos
+
+        offset = 0.0
+        if otro.primera is not None:
+            if self.ultima is None:
+                self.primera = otro.primera
+                self.dia_primera = otro.dia_primera
+            else:
+                t = float(_incrementos(*self.ultima, *otro.primera))
+                self.pnl_diario[otro.dia_primera] += t
+                offset = self.delta + t
+            self.drawdown = max(self.drawdown, otro.drawdown, self.pico - (offset + otro.minimo))
+            self.pico = max(self.pico, offset + otro.pico)
+            self.minimo = min(self.minimo, offset + otro.minimo)
+            self.delta = offset + otro.delta
+            self.ultima = otro.ultima
+
+        if otro.serie is not None:
+            s = otro.serie.copy()
+            s["equity"] += offset
+            self.serie = s if self.serie is None else pd.concat([self.serie, s], ignore_index=True)
+            if len(self.serie) > MAX_PUNTOS:
+                self.serie = self.serie.iloc[::2].reset_index(drop=True)
+        return self
+
+    def reporte(self):
+        return {
+            "filas": self.filas,
+            "desde": pd.to_datetime(self.desde, unit="ms", utc=True).isoformat() if self.desde is not None else None,
+            "hasta": pd.to_datetime(self.hasta, unit="ms", utc=True).isoformat() if self.hasta is not None else None,
+            "describe": {c: m.describe() for c, m in self.stats.items()},
+            "ordenes_abiertas": {str(k): v for k, v in sorted(self.ordenes.items())},
+            "tp_total": self.tp,
+            "sl_total": self.sl,
+            "tp_sl_ratio": self.tp / max(1, self.sl),
+            "senales": {str(k): v for k, v in self.senales.most_common()},
+            "equity_final": self.delta,
+            "max_drawdown": self.drawdown,
+            "pnl_diario": {k: v for k, v in sorted(self.pnl_diario.items())},
+        }
+
+
+def resumir(df, rng):
+    """Resumen de un bloque normalizado (ts, signal, last_price, position_*, fees, num_*, stop_loss)."""
+    r = Resumen()
+    if not len(df):
+        return r
+    df = df.sort_values("ts", kind="stable")
+    r.filas = len(df)
+    r.desde = int(df["ts"].iloc[0])
+    r.hasta = int(df["ts"].iloc[-1])
+    for c in COLUMNAS_STATS:
+        r.stats[c].agregar(df[c].to_numpy(np.float64), rng)
+    r.ordenes = Counter(df["num_open_orders"].value_counts().to_dict())
+    r.tp = int(df["num_tp"].sum())
+    r.sl = int(df["stop_loss"].notna().sum())
+    r.senales = Counter(df["signal"].fillna("None").value_counts().to_dict())
+
+    ok = df["last_price"].notna()
+    e = df.loc[ok, ["ts", "position_qty", "position_avg", "fees", "last_price"]].fillna(0.0)
+    if len(e):
+        q, avg, f, p = (e[c].to_numpy(np.float64) for c in ("position_qty", "position_avg", "fees", "last_price"))
+        d = _incrementos(q[:-1], avg[:-1], f[:-1], p[:-1], q[1:], avg[1:], f[1:], p[1:])
+        equity = np.concatenate(([0.0], np.cumsum(d)))
+        r.primera = (q[0], avg[0], f[0], p[0])
+        r.ultima = (q[-1], avg[-1], f[-1], p[-1])
+        r.delta = float(equity[-1])
+        r.pico = float(equity.max())
+        r.minimo = float(equity.min())
+        r.drawdown = float((np.maximum.accumulate(equity) - equity).max())
+        dias = pd.to_datetime(e["ts"].to_numpy(), unit="ms", utc=True).strftime("%Y-%m-%d")
+        r.dia_primera = dias[0]
+        if len(d):
+            r.pnl_diario = Counter(pd.Series(d, index=dias[1:]).groupby(level=0).sum().to_dict())
+        paso = max(1, -(-len(e) // PUNTOS_POR_BLOQUE))
+        idx = np.arange(0, len(e), paso)
+        r.serie = pd.DataFrame({
+            "ts": e["ts"].to_numpy()[idx],
+            "last_price": p[idx],
+            "position_avg": avg[idx],
+            "position_qty": q[idx],
+            "num_open_orders": df.loc[ok, "num_open_orders"].to_numpy()[idx],
+            "equity": equity[idx],
+        })
+    return r
+
+
+# --- fuentes ---
+def _normalizar_csv(df):
+    fecha = pd.to_datetime(df["timestamp"], utc=True, errors="coerce")
+    df = df[fecha.notna()]
+    out = pd.DataFrame({
+        # La resolución del datetime depende de la versión de pandas: pasar a ms explícitamente
+        "ts": (fecha[fecha.notna()] - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(1, "ms"),
+        "last_price": pd.to_numeric(df["last_price"], errors="coerce"),
+        "position_qty": pd.to_numeric(df["position_qty"], errors="coerce"),
+        "position_avg": pd.to_numeric(df["position_avg"], errors="coerce"),
+        "fees": pd.to_numeric(df["fees"], errors="coerce"),
+        "stop_loss": pd.to_numeric(df["stop_loss"], errors="coerce"),
+    })
+    out["num_open_orders"] = [len(_loads(s)) if isinstance(s, str) and s else 0 for s in df["open_orders"]]
+    out["num_tp"] = [len(_loads(s)) if isinstance(s, str) and s else 0 for s in df["take_profits"]]
+    # La señal es 'DUMP' o el repr de un dict {'tipo': 'SOPORTE', ...}
+    senal = df["signal"].astype("string")
+    tipo = senal.str.extract(r"'tipo':\s*'(\w+)'", expand=False)
+    out["signal"] = tipo.fillna(senal).astype(object).where(senal.notna(), None)
+    return out
+
+
+def _lineas_rango(path, inicio, fin):
+    """Líneas que empiezan en [inicio, fin) (la línea que cruza `inicio` es de la tarea anterior)."""
+    with open(path, "rb") as f:
+        if inicio > 0:
+            f.seek(inicio - 1)
+            f.readline()
+        while f.tell() < fin:
+            line = f.readline()
+            if not line:
+                break
+            yield line
+
+
+def _tarea_csv(args):
+    path, inicio, fin, columnas, saltar_header = args
+    rng = np.random.default_rng(inicio)
+    total = Resumen()
+    lote = []
+    lineas = _lineas_rango(path, inicio, fin)
+    if saltar_header:
+        next(lineas, None)
+    for line in lineas:
+        lote.append(line)
+        if len(lote) >= FILAS_POR_LOTE:
+            total = total.merge(resumir(_normalizar_csv(_leer_lote(lote, columnas)), rng), rng)
+            lote = []
+    if lote:
+        total = total.merge(resumir(_normalizar_csv(_leer_lote(lote, columnas)), rng), rng)
+    return total
+
+
+def _leer_lote(lineas, columnas):
+    return pd.read_csv(io.BytesIO(b"".join(lineas)), header=None, names=columnas)
+
+
+def _tarea_chunk(args):
+    directorio, desde, hasta = args
+    rng = np.random.default_rng(desde)
+    df, ordenes = leer_historico(desde, hasta, directorio)
+    tps = ordenes[(ordenes["side"] == "SELL") & (ordenes["reduce_only"] == 1)]
+    conteo = tps.groupby(["chunk", "fila"]).size().rename("num_tp")
+    df = df.join(conteo, on=["chunk", "fila"])
+    df["num_tp"] = df["num_tp"].fillna(0).astype(int)
+    df["num_open_orders"] = df["n_orders"]
+    df["signal"] = df["signal_nombre"]
+    return resumir(df, rng)
+
+
+def tareas_csv(path, bytes_por_tarea=BYTES_POR_TAREA):
+    with open(path, "rb") as f:
+        columnas = f.readline().decode().strip().split(",")
+    size = os.path.getsize(path)
+    cortes = list(range(0, size, bytes_por_tarea)) + [size]
+    return [(path, a, b, columnas, a == 0) for a, b in zip(cortes[:-1], cortes[1:])]
+
+
+def tareas_columnar(desde=None, hasta=None, directorio=HISTORICO_DIR):
+    out = []
+    for c in leer_index(directorio)["chunks"]:
+        a = c["desde"] if desde is None else max(c["desde"], desde)
+        b = c["hasta"] if hasta is None else min(c["hasta"], hasta)
+        if a < b:
+            out.append((directorio, a, b))
+    return out
+
+
+def analizar(tareas, funcion, procesos=None):
+    rng = np.random.default_rng(0)
+    total = Resumen()
+    procesos = procesos or os.cpu_count() or 1
+    if procesos == 1 or len(tareas) <= 1:
+        for t in tareas:
+            total = total.merge(funcion(t), rng)
+        return total
+    with mp.Pool(procesos) as pool:
+        # imap mantiene el orden: los segmentos de equity se unen cronológicamente
+        for r in pool.imap(funcion, tareas):
+            total = total.merge(r, rng)
+    return total
+
+
+# --- salida ---
+def _texto(rep):
+    lineas = [f"Filas: {rep['filas']}  ({rep['desde']} -> {rep['hasta']})", "", "--- describe ---"]
+    cols = list(rep["describe"])
+    claves = ("count", "mean", "std", "min", "25%", "50%", "75%", "max")
+    lineas.append(f"{'':>8}" + "".join(f"{c:>18}" for c in cols))
+    for k in claves:
+        lineas.append(f"{k:>8}" + "".join(f"{rep['describe'][c].get(k, float('nan')):>18.6g}" for c in cols))
+    lineas += ["", "--- Órdenes abiertas por ciclo ---"]
+    lineas += [f"{k:>4}: {v}" for k, v in rep["ordenes_abiertas"].items()]
+    lineas += ["", "--- Take Profit / Stop Loss ---",
+               f"TP totales: {rep['tp_total']}", f"SL totales: {rep['sl_total']}",
+               f"TP/SL ratio: {rep['tp_sl_ratio']:.3f}", "", "--- Señales ---"]
+    lineas += [f"{k:>10}: {v}" for k, v in rep["senales"].items()]
+    lineas += ["", "--- Equity estimada ---",
+               f"Final: {rep['equity_final']:.4f}", f"Max drawdown: {rep['max_drawdown']:.4f}",
+               "", "--- PnL diario ---"]
+    lineas += [f"{k}: {v:.4f}" for k, v in rep["pnl_diario"].items()]
+    return "\n".join(lineas) + "\n"
+
+
+def escribir_reporte(total, directorio):
+    os.makedirs(directorio, exist_ok=True)
+    rep = total.reporte()
+    with open(os.path.join(directorio, "reporte.json"), "w") as f:
+        json.dump(rep, f, indent=2)
+    with open(os.path.join(directorio, "reporte.txt"), "w") as f:
+        f.write(_texto(rep))
+    _graficos(total, directorio)
+    return rep
+
+
+def _graficos(total, directorio):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    plt.switch_backend("Agg")
+
+    def guardar(nombre):
+        plt.tight_layout()
+        plt.savefig(os.path.join(directorio, nombre), dpi=110)
+        plt.close()
+
+    if total.serie is not None and len(total.serie):
+        s = total.serie
+        t = pd.to_datetime(s["ts"], unit="ms", utc=True)
+        plt.figure(figsize=(12, 4))
+        plt.plot(t, s["last_price"], label="Precio")
+        plt.plot(t, s["position_avg"].where(s["position_qty"] > 0), label="Promedio Entrada", alpha=0.7)
+        plt.legend()
+        plt.title("Evolución Precio y Promedio Entrada")
+        guardar("precio_promedio.png")
+
+        plt.figure(figsize=(12, 4))
+        plt.plot(t, s["position_qty"])
+        plt.title("Evolución Cantidad de Posición")
+        guardar("posicion.png")
+
+        plt.figure(figsize=(12, 4))
+        plt.plot(t, s["num_open_orders"])
+        plt.title("Órdenes Abiertas a lo largo del tiempo")
+        guardar("ordenes_abiertas.png")
+
+        plt.figure(figsize=(12, 4))
+        plt.plot(t, s["equity"], label="Equity")
+        plt.fill_between(t, s["equity"], s["equity"].cummax(), color="red", alpha=0.3, label="Drawdown")
+        plt.legend()
+        plt.title("Equity estimada")
+        guardar("equity.png")
+
+    if total.pnl_diario:
+        dias = sorted(total.pnl_diario)
+        plt.figure(figsize=(12, 4))
+        plt.bar(dias, [total.pnl_diario[d] for d in dias])
+        plt.xticks(rotation=45)
+        plt.title("PnL diario")
+        guardar("pnl_diario.png")
+
+    fees = total.stats["fees"].muestra
+    if len(fees):
+        plt.figure()
+        plt.hist(fees, bins=30)
+        plt.title("Distribución de Fees (muestra)")
+        guardar("fees.png")
+
+
+def generar_reporte(salida, csv=None, desde=None, hasta=None, procesos=None):
+    if csv:
+        total = analizar(tareas_csv(csv), _tarea_csv, procesos)
+    else:
+        total = analizar(tareas_columnar(desde, hasta), _tarea_chunk, procesos)
+    rep = escribir_reporte(total, salida)
+    print(f"[ANALISIS] {rep['filas']} filas -> {salida}")
+    return rep
+
+
+def ms_desde_iso(texto):
+    return int(pd.Timestamp(texto).timestamp() * 1000) if texto else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reporte del histórico en streaming (headless)")
+    parser.add_argument("--csv", nargs="?", const=LOG_HISTORICO_PATH, help="Analizar el CSV del formato anterior")
+    parser.add_argument("--desde", help="Inicio del rango (ISO)")
+    parser.add_argument("--hasta", help="Fin del rango (ISO)")
+    parser.add_argument("-o", "--salida", default="data/reporte")
+    parser.add_argument("--procesos", type=int, default=None)
+    args = parser.parse_args()
+    generar_reporte(args.salida, args.csv, ms_desde_iso(args.desde), ms_desde_iso(args.hasta), args.procesos)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Backtest de un SymbolGrid (el grid de un símbolo de GridBot) sobre datos de mercado grabados.
+
+Los eventos grabados (trade / depth / ticker) pasan por los handlers reales de
+SymbolGrid sobre un reloj simulado, contra un MotorMatching que llena las órdenes
+límite y stop con la cinta de trades y devuelve ORDER_TRADE_UPDATE a procesar_user.
+
+Uso: python backtest.py eventos.jsonl [--symbol ETHUSDT] [--balance 1000] [--trade-through] [--verbose]
+Cada línea es {"tipo": "TRADE"|"DEPTH"|"TICKER"|"SNAPSHOT", "data": {...}}, un frame
+del stream combinado {"stream": ..., "data": ...} o el evento crudo con su campo "e".
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import selectors
+import tempfile
+import time
+
+import reloj
+from bot import SymbolGrid
+from order_book import LocalOrderBook
+from sim_exchange import MotorMatching, SimClient
+from state_manager import StateManager
+from config import SYMBOL
+
+TIPOS_POR_EVENTO = {
+    'trade': 'TRADE',
+    'aggTrade': 'TRADE',
+    'depthUpdate': 'DEPTH',
+    '24hrMiniTicker': 'TICKER',
+}
+
+
+class _SelectorVirtual:
+    """Selector que, en vez de bloquear hasta el próximo timer, adelanta el reloj simulado."""
+
+    def __init__(self, loop, real):
+        self._loop = loop
+        self._real = real
+
+    def select(self, timeout=None):
+        eventos = self._real.select(0)
+        if not eventos and timeout is not None and timeout > 0:
+            self._loop._sim_t += timeout
+        return eventos
+
+    def __getattr__(self, nombre):
+        return getattr(self._real, nombre)
+
+
+class SimEventLoop(asyncio.SelectorEventLoop):
+    """
+    Event loop con reloj virtual: asyncio.sleep, wait_for y los timers avanzan en
+    tiempo simulado sin esperar, así un día de mercado se reproduce en segundos.
+    """
+
+    def __init__(self, t0):
+        super().__init__(selectors.DefaultSelector())
+        self._sim_t = float(t0)
+        # Con t0 en segundos epoch el paso de un float es ~2e-7 s: timeouts menores
+        # no avanzan el reloj, así que los timers se consideran vencidos dentro de 1 µs
+        self._clock_resolution = 1e-6
+        self._selector = _SelectorVirtual(self, self._selector)
+
+    def time(self):
+        return self._sim_t
+
+
+def leer_eventos(path):
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            r = json.loads(line)
+            if 'data' in r and 'stream' in r:
+                data = r['data']
+                tipo = TIPOS_POR_EVENTO.get(data.get('e'))
+            elif 'data' in r:
+                data = r['data']
+                tipo = r.get('tipo') or TIPOS_POR_EVENTO.get(data.get('e'))
+            else:
+                data = r
+                tipo = TIPOS_POR_EVENTO.get(r.get('e'))
+            if tipo:
+                yield tipo, data
+
+
+def _ts_ms(data):
+    return int(data.get('T') or data.get('E') or 0)
+
+
+class Backtest:
+    def __init__(self, eventos, balance=1000.0, trade_through=False, verbose=False, symbol=SYMBOL):
+        self.eventos = eventos
+        self.verbose = verbose
+        self.symbol = symbol
+        self.motor = MotorMatching(symbol, trade_through=trade_through)
+        self.motor.balance = float(balance)
+        self.balance_inicial = float(balance)
+        self.client = None
+        self.bot = None
+        self.libro = None
+        self.n_eventos = 0
+        self.pico = 0.0
+        self.max_drawdown = 0.0
+        self.equity = 0.0
+
+    def _muestrear_equity(self):
+        m = self.motor
+        self.equity = m.realizado - m.fees + m.no_realizado()
+        if self.equity > self.pico:
+            self.pico = self.equity
+        dd = self.pico - self.equity
+        if dd > self.max_drawdown:
+            self.max_drawdown = dd
+
+    async def _consumir_user(self):
+        while True:
+            evento = await self.client.eventos.get()
+            await self.bot.procesar_user(evento)
+
+    async def correr(self, primer_evento, state_dir):
+        loop = asyncio.get_running_loop()
+        self.client = SimClient(self.motor)
+        self.libro = LocalOrderBook(self.motor.filters['tickSize'])
+        self.client.libro = self.libro
+        state = StateManager(os.path.join(state_dir, 'state.json'), fsync=False)
+        self.bot = SymbolGrid(self.symbol, client=self.client, state=state)
+        self.bot.persistir_logs = False
+        await self.bot.arrancar()
+        consumidor = asyncio.create_task(self._consumir_user())
+
+        bot, motor, libro, cola = self.bot, self.motor, self.libro, self.client.eventos
+        eventos = self.eventos
+        if primer_evento is not None:
+            eventos = _encadenar(primer_evento, eventos)
+        for tipo, data in eventos:
+            ts = _ts_ms(data)
+            espera = ts / 1000.0 - loop.time()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            elif cola.qsize():
+                await asyncio.sleep(0)
+            self.n_eventos += 1
+            if tipo == 'TRADE':
+                motor.on_trade(float(data['p']), float(data['q']), ts)
+                await bot.procesar_trade(data)
+                self._muestrear_equity()
+            elif tipo == 'DEPTH':
+                if libro.last_update_id is None:
+                    # Sin snapshot grabado: el libro simulado arranca con el primer diff
+                    libro.cargar_snapshot({'lastUpdateId': int(data['U']), 'bids': [], 'asks': []})
+                libro.aplicar_diff(data)
+                bot.order_book.aplicar_diff(data)
+                await bot.procesar_depth(data)
+            elif tipo == 'TICKER':
+                await bot.procesar_ticker(data)
+            elif tipo == 'SNAPSHOT':
+                libro.cargar_snapshot(data)
+
+        # Dejar que terminen rebalanceos y eventos pendientes
+        for _ in range(10):
+            await asyncio.sleep(0)
+        tareas = bot._tareas + [consumidor]
+        bot.detener()
+        consumidor.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+        state.close()
+
+    def reporte(self, duracion_real, t_inicio_ms, t_fin_ms):
+        m = self.motor
+        self._muestrear_equity()
+        horas = max(0.0, (t_fin_ms - t_inicio_ms) / 3_600_000)
+        return {
+            'symbol': self.symbol,
+            'eventos': self.n_eventos,
+            'horas_simuladas': round(horas, 2),
+            'segundos_reales': round(duracion_real, 2),
+            'pnl_realizado': round(m.realizado, 6),
+            'pnl_no_realizado': round(m.no_realizado(), 6),
+            'fees': round(m.fees, 6),
+            'pnl_neto': round(m.realizado + m.no_realizado() - m.fees, 6),
+            'max_drawdown': round(self.max_drawdown, 6),
+            'posicion_final': m.posicion,
+            'ordenes_creadas': m.contadores['creadas'],
+            'ordenes_canceladas': m.contadores['canceladas'],
+            'ordenes_modificadas': m.contadores['modificadas'],
+            'ordenes_rechazadas': m.contadores['rechazadas'],
+            'ordenes_llenadas': m.contadores['llenadas'],
+            'fills': m.contadores['fills'],
+            'rebalanceos': self.bot.scheduler.exitosas if self.bot else 0,
+            'requests_rest': self.client.requests if self.client else 0,
+            'requests_por_fill': round(self.client.requests / m.contadores['fills'], 2) if self.client and m.contadores['fills'] else None,
+        }
+
+
+def _encadenar(primero, resto):
+    yield primero
+    yield from resto
+
+
+def correr_backtest(path, balance=1000.0, trade_through=False, verbose=False, symbol=SYMBOL):
+    eventos = leer_eventos(path)
+    primero = next(eventos, None)
+    if primero is None:
+        raise ValueError(f"Sin eventos en {path}")
+    t0 = _ts_ms(primero[1]) / 1000.0
+    bt = Backtest(eventos, balance=balance, trade_through=trade_through, verbose=verbose, symbol=symbol)
+
+    loop = SimEventLoop(t0)
+    reloj.usar_fuente(loop.time)
+    inicio = time.perf_counter()
+    try:
+        with tempfile.TemporaryDirectory() as state_dir:
+            salida = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+            with salida:
+                loop.run_until_complete(bt.correr(primero, state_dir))
+    finally:
+        reloj.usar_fuente(None)
+        loop.close()
+    return bt.reporte(time.perf_counter() - inicio, t0 * 1000, loop._sim_t * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest de GridBot sobre eventos grabados")
+    parser.add_argument('eventos')
+    parser.add_argument('--symbol', default=SYMBOL, help="Símbolo de la cinta (usa sus SYMBOL_OVERRIDES)")
+    parser.add_argument('--balance', type=float, default=1000.0)
+    parser.add_argument('--trade-through', action='store_true',
+                        help="Sólo llenar límites cuando un trade atraviesa el precio (más conservador)")
+    parser.add_argument('--verbose', action='store_true', help="Mostrar la salida del bot")
+    args = parser.parse_args()
+    rep = correr_backtest(args.eventos, args.balance, args.trade_through, args.verbose, args.symbol.upper())
+    for k, v in rep.items():
+        print(f"{k:>20}: {v}")
+
+
+if __name__ == "__main__":
+    main()
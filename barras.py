@@ -0,0 +1,259 @@
+"""
+Barras OHLCV incrementales a partir del stream @trade: barras de tiempo (1s/1m/5m)
+y barras de volumen, guardadas en buffers circulares de tamaño fijo. Cada serie
+mantiene al día la ATR (Wilder), la volatilidad realizada de los retornos entre
+cierres y el VWAP (por barra y de la ventana), así que leerlos es O(1) sin
+guardar ni recorrer trades.
+"""
+import math
+from array import array
+
+from config import BARRAS_INTERVALOS, BARRAS_VOLUMEN, BARRAS_CAPACIDAD, BARRAS_VENTANA
+
+
+def etiqueta(segundos):
+    """'1s', '1m', '5m', '1h' para un intervalo en segundos."""
+    segundos = int(segundos)
+    for unidad, n in (('h', 3600), ('m', 60)):
+        if segundos >= n and segundos % n == 0:
+            return f"{segundos // n}{unidad}"
+    return f"{segundos}s"
+
+
+class SerieBarras:
+    """
+    Barras cerradas en arrays circulares preasignados más la barra en curso.
+    Las subclases deciden cuándo cerrar una barra; al cerrarla se actualizan la
+    ATR, la suma de retornos² y las sumas del VWAP de las últimas `ventana` barras.
+    """
+
+    def __init__(self, capacidad=BARRAS_CAPACIDAD, ventana=BARRAS_VENTANA):
+        self.capacidad = max(2, int(capacidad))
+        # La barra que sale del VWAP tiene que seguir en el buffer: ventana < capacidad
+        self.ventana = max(1, min(int(ventana), self.capacidad - 1))
+        n = self.capacidad
+        self.ts = array('q', bytes(8 * n))   # apertura (ms)
+        self.open = array('d', bytes(8 * n))
+        self.high = array('d', bytes(8 * n))
+        self.low = array('d', bytes(8 * n))
+        self.close = array('d', bytes(8 * n))
+        self.volumen = array('d', bytes(8 * n))
+        self.quote = array('d', bytes(8 * n))  # Σ precio·qty: VWAP = quote / volumen
+        self.head = 0    # índice de la barra cerrada más vieja
+        self.count = 0
+        self.cerradas = 0
+
+        # Barra en curso
+        self.abierta = False
+        self._ts = 0
+        self._o = self._h = self._l = self._c = 0.0
+        self._v = 0.0
+        self._q = 0.0
+
+        # Estadísticos de las últimas `ventana` barras
+        self.atr = None
+        self._tr_suma = 0.0  # semilla de la ATR: media simple de las primeras `ventana` barras
+        self._tr_n = 0
+        self._r2 = array('d', bytes(8 * self.ventana))  # retornos² (log) entre cierres, circular
+        self._r2_i = 0
+        self._r2_n = 0
+        self._r2_suma = 0.0
+        self._v_suma = 0.0
+        self._q_suma = 0.0
+
+    # --- construcción ---
+    def _abrir(self, ts, precio):
+        self.abierta = True
+        self._ts = ts
+        self._o = self._h = self._l = self._c = precio
+        self._v = 0.0
+        self._q = 0.0
+
+    def _acumular(self, precio, qty):
+        if precio > self._h:
+            self._h = precio
+        elif precio < self._l:
+            self._l = precio
+        self._c = precio
+        self._v += qty
+        self._q += precio * qty
+
+    def _indice(self, k):
+        """Posición en los buffers de la k-ésima barra cerrada más reciente (0 = última)."""
+        return (self.head + self.count - 1 - k) % self.capacidad
+
+    def _cerrar(self):
+        previo = self.close[self._indice(0)] if self.count else None
+        if self.count == self.capacidad:
+            self.head = (self.head + 1) % self.capacidad
+            self.count -= 1
+        i = (self.head + self.count) % self.capacidad
+        self.ts[i] = self._ts
+        self.open[i] = self._o
+        self.high[i] = self._h
+        self.low[i] = self._l
+        self.close[i] = self._c
+        self.volumen[i] = self._v
+        self.quote[i] = self._q
+        self.count += 1
+        self.cerradas += 1
+        self.abierta = False
+        self._actualizar_estadisticos(previo)
+
+    def _actualizar_estadisticos(self, previo):
+        h, l, c = self._h, self._l, self._c
+        tr = h - l
+        if previo is not None:
+            tr = max(tr, abs(h - previo), abs(l - previo))
+            if previo > 0 and c > 0:
+                r2 = math.log(c / previo) ** 2
+                self._r2_suma += r2 - self._r2[self._r2_i]
+                self._r2[self._r2_i] = r2
+                self._r2_i = (self._r2_i + 1) % self.ventana
+                self._r2_n = min(self._r2_n + 1, self.ventana)
+        if self.atr is None:
+            self._tr_suma += tr
+            self._tr_n += 1
+            if self._tr_n == self.ventana:
+                self.atr = self._tr_suma / self.ventana
+        else:
+            self.atr += (tr - self.atr) / self.ventana
+
+        # Sumas del VWAP de la ventana: entra la barra nueva, sale la que queda afuera
+        self._v_suma += self._v
+        self._q_suma += self._q
+        if self.count > self.ventana:
+            j = self._indice(self.ventana)
+            self._v_suma -= self.volumen[j]
+            self._q_suma -= self.quote[j]
+
+    # --- lectura O(1) ---
+    def __len__(self):
+        return self.count
+
+    def lista(self):
+        """True cuando ya hay `ventana` barras para la ATR."""
+        return self.atr is not None
+
+    def ultima(self, k=0):
+        """k-ésima barra cerrada más reciente como dict (None si no existe)."""
+        if k >= self.count:
+            return None
+        i = self._indice(k)
+        v = self.volumen[i]
+        return {
+            'ts': self.ts[i], 'open': self.open[i], 'high': self.high[i], 'low': self.low[i],
+            'close': self.close[i], 'volumen': v, 'vwap': self.quote[i] / v if v > 0 else self.close[i],
+        }
+
+    def atr_relativo(self):
+        """ATR como fracción del último cierre (comparable con spacing y rango)."""
+        if self.atr is None or not self.count:
+            return None
+        c = self.close[self._indice(0)]
+        return self.atr / c if c > 0 else None
+
+    def volatilidad(self):
+        """Volatilidad realizada por barra: raíz de la media de los retornos² de las últimas `ventana` barras."""
+        if self._r2_n < self.ventana:
+            return None
+        return math.sqrt(max(0.0, self._r2_suma) / self._r2_n)
+
+    def vwap(self):
+        """VWAP de las últimas `ventana` barras cerradas."""
+        if self._v_suma <= 1e-12:
+            return self.close[self._indice(0)] if self.count else None
+        return self._q_suma / self._v_suma
+
+    def resumen(self):
+        return {
+            'barras': self.count,
+            'close': self.close[self._indice(0)] if self.count else None,
+            'atr': self.atr_relativo(),
+            'volatilidad': self.volatilidad(),
+            'vwap': self.vwap(),
+        }
+
+
+class BarrasTiempo(SerieBarras):
+    """
+    Barras de `intervalo` segundos alineadas al reloj del exchange. Una barra cierra
+    cuando llega el primer trade del intervalo siguiente; los intervalos sin trades
+    quedan como barras planas en el último cierre y sin volumen.
+    """
+
+    def __init__(self, intervalo, capacidad=BARRAS_CAPACIDAD, ventana=BARRAS_VENTANA):
+        super().__init__(capacidad, ventana)
+        self.intervalo = int(intervalo)
+        self.intervalo_ms = self.intervalo * 1000
+
+    def agregar(self, ts, precio, qty):
+        inicio = ts - ts % self.intervalo_ms
+        if self.abierta and inicio != self._ts:
+            if inicio < self._ts:
+                # Trade fuera de orden: cuenta en la barra en curso
+                inicio = self._ts
+            else:
+                vacias = min((inicio - self._ts) // self.intervalo_ms - 1, self.capacidad)
+                c = self._c
+                self._cerrar()
+                for k in range(vacias, 0, -1):
+                    self._abrir(inicio - k * self.intervalo_ms, c)
+                    self._cerrar()
+        if not self.abierta:
+            self._abrir(inicio, precio)
+        self._acumular(precio, qty)
+
+
+class BarrasVolumen(SerieBarras):
+    """Barras de `tamano` unidades de volumen; un trade que completa la barra pasa el excedente a la siguiente."""
+
+    def __init__(self, tamano, capacidad=BARRAS_CAPACIDAD, ventana=BARRAS_VENTANA):
+        super().__init__(capacidad, ventana)
+        self.tamano = float(tamano)
+
+    def agregar(self, ts, precio, qty):
+        while qty > 0:
+            if not self.abierta:
+                self._abrir(ts, precio)
+            parte = min(qty, self.tamano - self._v)
+            self._acumular(precio, parte)
+            qty -= parte
+            if self._v >= self.tamano - 1e-12:
+                self._cerrar()
+
+
+class AgregadorBarras:
+    """Las series de barras de un símbolo (una por intervalo más la de volumen), alimentadas trade a trade."""
+
+    def __init__(self, intervalos=BARRAS_INTERVALOS, volumen=BARRAS_VOLUMEN, capacidad=BARRAS_CAPACIDAD,
+                 ventana=BARRAS_VENTANA):
+        self.tiempo = {int(s): BarrasTiempo(s, capacidad, ventana) for s in intervalos}
+        self.volumen = BarrasVolumen(volumen, capacidad, ventana) if volumen else None
+        self._series = list(self.tiempo.values()) + ([self.volumen] if self.volumen is not None else [])
+
+    def agregar(self, ts, precio, qty):
+        if precio <= 0 or qty <= 0:
+            return
+        for serie in self._series:
+            serie.agregar(ts, precio, qty)
+
+    def agregar_trade(self, msg):
+        try:
+            self.agregar(int(msg.get('T') or 0), float(msg.get('p') or 0), float(msg.get('q') or 0))
+        except (TypeError, ValueError):
+            pass
+
+    def serie(self, segundos):
+        return self.tiempo.get(int(segundos))
+
+    def atr_relativo(self, segundos):
+        serie = self.tiempo.get(int(segundos))
+        return serie.atr_relativo() if serie is not None else None
+
+    def resumen(self):
+        """Resumen de cada serie ('1s', '1m', ..., 'volumen') para logs y diagnóstico."""
+        out = {etiqueta(s): serie.resumen() for s, serie in self.tiempo.items()}
+        if self.volumen is not None:
+            out['volumen'] = self.volumen.resumen()
+        return out
@@ -0,0 +1,83 @@
+"""
+Micro-benchmark de la señal de flujo de trades (strategy.VentanaTrades).
+
+Uso: python -m benchmarks.bench_trade_flow [n_trades]
+Compara el costo por trade del agregado incremental con el escaneo completo de la
+ventana que hacía evaluar_senales antes, para ventanas cada vez más grandes.
+"""
+import random
+import sys
+import time
+from collections import deque
+
+import strategy
+from strategy import VentanaTrades, QTY_SCALE
+
+
+def trades_sinteticos(n, tps=400, seed=11):
+    rnd = random.Random(seed)
+    ts = 1700000000000
+    out = []
+    for _ in range(n):
+        ts += int(rnd.expovariate(tps / 1000.0))
+        out.append((ts, round(rnd.uniform(0.001, 2.0), 3), rnd.random() < 0.55))
+    return out
+
+
+def costo_incremental(trades, window_ms, capacidad):
+    v = VentanaTrades(window_ms, capacidad)
+    inicio = time.perf_counter()
+    for ts, q, s in trades:
+        v.agregar(ts, q, s)
+        v.frecuencia() > 15 and v.vol_sell > 10 * QTY_SCALE
+    return (time.perf_counter() - inicio) / len(trades)
+
+
+def costo_escaneo(trades, window_ms, capacidad):
+    # Implementación anterior: deque de dicts + list comprehensions por trade
+    hist = deque(maxlen=capacidad)
+    inicio = time.perf_counter()
+    for ts, q, s in trades:
+        hist.append({'price': 0.0, 'qty': q, 'timestamp': ts, 'sell': s})
+        now = hist[-1]['timestamp']
+        ultimos = [t for t in hist if now - t['timestamp'] <= window_ms]
+        ventas = [t for t in ultimos if t['sell']]
+        sum(t['qty'] for t in ventas) > 10 and len(ultimos) / (window_ms / 1000.0) > 15
+    return (time.perf_counter() - inicio) / len(trades)
+
+
+def mismas_senales(trades):
+    # La señal incremental debe coincidir con el escaneo original trade a trade
+    hist = deque(maxlen=300)
+    v = VentanaTrades(2000, 300)
+    last_a = last_b = 0
+    for ts, q, s in trades:
+        hist.append({'qty': q, 'timestamp': ts, 'sell': s})
+        ultimos = [t for t in hist if ts - t['timestamp'] <= 2000]
+        vol = sum(t['qty'] for t in ultimos if t['sell'])
+        a = len(ultimos) / 2.0 > 15 and vol > 10 and ts - last_a > strategy.COOLDOWN_MS
+        if a:
+            last_a = ts
+        v.agregar(ts, q, s)
+        b = v.frecuencia() > 15 and v.vol_sell > 10 * QTY_SCALE and ts - last_b > strategy.COOLDOWN_MS
+        if b:
+            last_b = ts
+        if a != b:
+            return False
+    return True
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    trades = trades_sinteticos(n)
+    print(f"[BENCH] {n} trades sintéticos (~400 trades/s)")
+    print(f"[BENCH] señales idénticas a la implementación anterior: {mismas_senales(trades)}")
+    for window_ms in (2000, 10000, 60000):
+        capacidad = max(300, window_ms)  # sin tope efectivo: la ventana manda
+        inc = costo_incremental(trades, window_ms, capacidad)
+        esc = costo_escaneo(trades[:min(n, 5000)], window_ms, capacidad)
+        print(f"[BENCH] ventana {window_ms/1000:>4.0f}s: incremental {inc*1e6:6.2f} us/trade | escaneo {esc*1e6:9.2f} us/trade")
+
+
+if __name__ == "__main__":
+    main()
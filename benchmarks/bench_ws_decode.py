@@ -0,0 +1,83 @@
+"""
+Benchmark del camino decode + dispatch de frames del stream combinado.
+
+Uso: python -m benchmarks.bench_ws_decode [frames.jsonl] [repeticiones]
+Cada línea de frames.jsonl es un frame crudo tal cual llega por el WebSocket
+({"stream": ..., "data": ...}). Sin archivo se generan frames sintéticos de ETHUSDT.
+"""
+import asyncio
+import json
+import random
+import sys
+import time
+
+import stream_router
+from stream_router import StreamRouter
+
+SYMBOL = 'ethusdt'
+
+
+def frames_sinteticos(n=50000, seed=7):
+    rnd = random.Random(seed)
+    precio = 3000.0
+    frames = []
+    u = 1000
+    for i in range(n):
+        precio += rnd.uniform(-0.5, 0.5)
+        r = rnd.random()
+        ts = 1700000000000 + i * 5
+        if r < 0.7:
+            data = {"e": "trade", "E": ts, "T": ts, "s": "ETHUSDT", "t": i, "p": f"{precio:.2f}",
+                    "q": f"{rnd.uniform(0.001, 5):.3f}", "X": "MARKET", "m": rnd.random() < 0.5}
+            stream = f"{SYMBOL}@trade"
+        elif r < 0.95:
+            bids = [[f"{precio - 0.01 * k:.2f}", f"{rnd.uniform(0, 50):.3f}"] for k in range(10)]
+            asks = [[f"{precio + 0.01 * k:.2f}", f"{rnd.uniform(0, 50):.3f}"] for k in range(10)]
+            data = {"e": "depthUpdate", "E": ts, "T": ts, "s": "ETHUSDT", "U": u + 1, "u": u + 10, "pu": u,
+                    "b": bids, "a": asks}
+            u += 10
+            stream = f"{SYMBOL}@depth@100ms"
+        else:
+            data = {"e": "24hrMiniTicker", "E": ts, "s": "ETHUSDT", "c": f"{precio:.2f}", "o": "2990.00",
+                    "h": "3050.00", "l": "2950.00", "v": "123456.789", "q": "370370370.00"}
+            stream = f"{SYMBOL}@miniTicker"
+        frames.append(json.dumps({"stream": stream, "data": data}, separators=(',', ':')).encode())
+    return frames
+
+
+async def _medir(frames, loads, repeticiones):
+    async def handler(data, tipo, symbol):
+        return None
+
+    router = StreamRouter(handler, loads=loads)
+    router.registrar(f"{SYMBOL}@trade", 'TRADE', SYMBOL)
+    router.registrar(f"{SYMBOL}@depth@100ms", 'DEPTH', SYMBOL)
+    router.registrar(f"{SYMBOL}@miniTicker", 'TICKER', SYMBOL)
+    despachar = router.despachar
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for f in frames:
+            await despachar(f)
+    dur = time.perf_counter() - inicio
+    return router.mensajes / dur
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 and not sys.argv[1].isdigit() else None
+    repeticiones = int(sys.argv[-1]) if sys.argv[-1].isdigit() else 3
+    if path:
+        with open(path, 'rb') as f:
+            frames = [l.strip() for l in f if l.strip()]
+    else:
+        frames = frames_sinteticos()
+    print(f"[BENCH] {len(frames)} frames x {repeticiones} repeticiones")
+    decoders = [('json', json.loads)]
+    if stream_router.DECODER != 'json':
+        decoders.append((stream_router.DECODER, stream_router._loads))
+    for nombre, loads in decoders:
+        rate = asyncio.run(_medir(frames, loads, repeticiones))
+        print(f"[BENCH] decode+dispatch {nombre:>7}: {rate:,.0f} msg/s ({1e6 / rate:.2f} us/msg)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""
+Suite de benchmarks de los caminos calientes del bot con puertas de regresión.
+
+Uso: python -m benchmarks.run [--solo caso1,caso2] [--guardar] [--umbral 0.25] [--rapido] [--frames frames.jsonl]
+Cada caso mide ops/s, latencia por operación (p50/p99, la mejor de varias
+pasadas) y pico de memoria (tracemalloc, en una pasada aparte para no inflar
+los tiempos). Con --guardar
+escribe benchmarks/baselines.json; sin él compara contra ese archivo y sale con
+código 1 si algún caso empeora más que el umbral. Los baselines dependen de la
+máquina: regenerarlos con --guardar al cambiar de entorno.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, UTC
+
+import numpy as np
+
+import strategy
+from backtest import leer_eventos
+from barras import AgregadorBarras
+from benchmarks.bench_ws_decode import frames_sinteticos
+from binance_client import DEFAULT_FILTERS
+from bot import SymbolGrid
+from logger import HistoricoColumnar
+from order_book import LocalOrderBook
+from sim_exchange import MotorMatching, SimClient
+from state_manager import StateManager
+from ticks import TickScale
+from websocket_listener import WebSocketManager
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+UMBRAL = 0.30          # Caída de ops/s tolerada (fracción)
+UMBRAL_LATENCIA = 1.0  # Suba de p50/p99 tolerada: las latencias por operación son más ruidosas
+UMBRAL_MEMORIA = 0.25  # Suba del pico de memoria tolerada
+REPETICIONES = 3       # Pasadas de tiempo por caso: se queda con la mejor de cada métrica
+SYMBOL = 'ETHUSDT'
+
+CASOS = {}
+
+
+def caso(nombre, ops, tolerancia=1.0):
+    """
+    Registra `preparar(n, entrada)` -> función (o corrutina) de un argumento: el índice
+    de la operación. `tolerancia` multiplica los umbrales (casos que tocan disco varían más).
+    """
+    def registrar(preparar):
+        CASOS[nombre] = (preparar, ops, tolerancia)
+        return preparar
+    return registrar
+
+
+class Entrada:
+    """Mensajes de mercado para los casos: grabados (--frames) o sintéticos."""
+
+    def __init__(self, path=None, n=50000):
+        self._tmp = tempfile.mkdtemp(prefix='snipo_bench_')
+        if path:
+            self.frames = []
+            for tipo, data in leer_eventos(path):
+                stream = {'TRADE': 'trade', 'DEPTH': 'depth@100ms', 'TICKER': 'miniTicker'}.get(tipo)
+                if stream:
+                    frame = {'stream': f"{SYMBOL.lower()}@{stream}", 'data': data}
+                    self.frames.append(json.dumps(frame, separators=(',', ':')).encode())
+        else:
+            self.frames = frames_sinteticos(n)
+        self.trades = []
+        self.depths = []
+        for f in self.frames:
+            data = json.loads(f)['data']
+            if data.get('e') in ('trade', 'aggTrade'):
+                self.trades.append(data)
+            elif data.get('e') == 'depthUpdate':
+                self.depths.append(data)
+
+    def directorio(self):
+        """Directorio temporal propio de una pasada (se borra todo al final)."""
+        return tempfile.mkdtemp(dir=self._tmp)
+
+    def cerrar(self):
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def libro_sincronizado(self):
+        """LocalOrderBook listo para recibir los diffs de la entrada en orden."""
+        libro = LocalOrderBook(DEFAULT_FILTERS['tickSize'])
+        primero = self.depths[0] if self.depths else {'U': 1}
+        libro.cargar_snapshot({'lastUpdateId': int(primero['U']), 'bids': [], 'asks': []})
+        return libro
+
+
+# --- casos ---
+@caso('strategy.analizar_trade', 100000)
+def _analizar_trade(n, entrada):
+    # analizar_trade incluye evaluar_senales (ventana + umbrales de DUMP)
+    senales = strategy.SenalesSimbolo()
+    trades = entrada.trades
+    m = len(trades)
+    return lambda i: senales.analizar_trade(trades[i % m])
+
+
+@caso('barras.agregar', 100000)
+def _barras_agregar(n, entrada):
+    # Por trade: las tres series de tiempo (1s/1m/5m) y la de volumen con sus estadísticos
+    barras = AgregadorBarras()
+    trades = entrada.trades
+    m = len(trades)
+    return lambda i: barras.agregar_trade(trades[i % m])
+
+
+@caso('strategy.analizar_depth', 20000)
+def _analizar_depth(n, entrada):
+    # Por frame de depth: el diff al libro local (hook del router) y la señal SOPORTE sobre él
+    senales = strategy.SenalesSimbolo()
+    depths = entrada.depths
+    m = len(depths)
+    estado = {'libro': entrada.libro_sincronizado()}
+
+    def paso(i):
+        if i % m == 0 and i:
+            estado['libro'] = entrada.libro_sincronizado()
+        libro = estado['libro']
+        libro.aplicar_diff(depths[i % m])
+        senales.last_support_ts = 0
+        return senales.analizar_depth(libro)
+    return paso
+
+
+@caso('ticks.escalera_grande', 2000)
+def _escalera(n, entrada):
+    # construir_grid + redondeo a filtros para una escalera de ~1000 niveles
+    escala = TickScale.desde_filtros(DEFAULT_FILTERS)
+
+    def paso(i):
+        precio = 2000.0 + (i % 100) * 0.37
+        strategy.construir_grid(precio, 0.0005, 0.5, escala.tick)
+        ticks, steps = escala.escalera(precio, 0.0005, 0.5, 10.0, 10, 0.0, 0.0, None)
+        return escala.niveles(ticks, steps)
+    return paso
+
+
+@caso('ws.decode_dispatch', 50000)
+def _ws_dispatch(n, entrada):
+    # El router que arma WebSocketManager, con el hook de depth aplicando diffs al libro local
+    async def handler(data, tipo, symbol):
+        return None
+
+    ws = WebSocketManager(symbols=[SYMBOL])
+    frames = entrada.frames
+    m = len(frames)
+    estado = {}
+
+    def nuevo_router():
+        ws.order_books[SYMBOL] = entrada.libro_sincronizado()
+        estado['router'] = ws._crear_router(handler)
+
+    nuevo_router()
+
+    async def paso(i):
+        if i % m == 0 and i:
+            nuevo_router()
+        await estado['router'].despachar(frames[i % m])
+    return paso
+
+
+@caso('state.fills_journal', 10000, tolerancia=2.0)
+def _state_fills(n, entrada):
+    # agregar_compra/agregar_venta con la lista de fills creciendo (ventas parciales, nunca cierra)
+    state = StateManager(os.path.join(entrada.directorio(), 'state.json'))
+
+    def paso(i):
+        precio = 2000.0 - (i % 500) * 0.1
+        if i % 4 == 3:
+            state.agregar_venta(precio + 5, 0.01, 0.001)
+        else:
+            state.agregar_compra(precio, 0.02, 0.001)
+    return paso
+
+
+@caso('logger.guardar_historico', 10000, tolerancia=2.0)
+def _guardar_historico(n, entrada):
+    historico = HistoricoColumnar(entrada.directorio())
+    t0 = 1_700_000_000.0
+    ordenes = [{"side": "BUY", "price": f"{2000 - k:.2f}", "qty": "0.005", "reduceOnly": False} for k in range(20)]
+    ordenes.append({"side": "SELL", "price": "2010.00", "qty": "0.05", "reduceOnly": True})
+
+    def paso(i):
+        historico.agregar({
+            "timestamp": datetime.fromtimestamp(t0 + i, UTC).isoformat(),
+            "signal": 'DUMP' if i % 50 == 0 else None,
+            "last_price": 2000.0 + (i % 100) * 0.01,
+            "position": {"qty": 0.05, "avg": 1995.5, "fees": 0.12},
+            "open_orders": ordenes,
+            "take_profits": [{"price": "2010.00", "qty": "0.05", "clientOrderId": "TP_1"}],
+            "stop_loss": {"price": "1900.00"},
+            "bot_version": "bench",
+            "symbol": SYMBOL,
+        })
+    return paso
+
+
+@caso('bot.rebalance', 200, tolerancia=2.0)
+def _rebalance(n, entrada):
+    # Ciclo completo (escalera, diff contra el libro, TP/SL) contra el cliente simulado en memoria
+    motor = MotorMatching(SYMBOL)
+    motor.balance = 100000.0
+    client = SimClient(motor)
+    motor.emitir = lambda evento: None
+    grid = SymbolGrid(SYMBOL, client=client, state=StateManager(os.path.join(entrada.directorio(), 'state.json'), fsync=False))
+    grid.persistir_logs = False
+    estado = {'iniciado': False}
+
+    async def paso(i):
+        if not estado['iniciado']:
+            await grid.iniciar_cliente()
+            estado['iniciado'] = True
+        # Precio alternando: cada ciclo mantiene parte del grid y mueve el resto
+        grid.last_price = 2000.0 + (i % 2) * 1.5
+        grid.last_grid_price = None
+        grid._last_rebalance = 0
+        await grid._rebalance_si_corresponde()
+    return paso
+
+
+# --- medición ---
+async def _correr_async(paso, n, latencias):
+    inicio = time.perf_counter_ns()
+    for i in range(n):
+        t = time.perf_counter_ns()
+        await paso(i)
+        latencias[i] = time.perf_counter_ns() - t
+    return time.perf_counter_ns() - inicio
+
+
+def _correr(paso, n, latencias):
+    inicio = time.perf_counter_ns()
+    for i in range(n):
+        t = time.perf_counter_ns()
+        paso(i)
+        latencias[i] = time.perf_counter_ns() - t
+    return time.perf_counter_ns() - inicio
+
+
+def _pasada(preparar, n, entrada):
+    latencias = np.zeros(n, dtype=np.int64)
+    # Los casos imprimen lo mismo que el bot: fuera del reporte
+    with contextlib.redirect_stdout(io.StringIO()):
+        paso = preparar(n, entrada)
+        if asyncio.iscoroutinefunction(paso):
+            total = asyncio.run(_correr_async(paso, n, latencias))
+        else:
+            total = _correr(paso, n, latencias)
+    return total, latencias
+
+
+def medir(nombre, n, entrada, repeticiones=REPETICIONES):
+    preparar = CASOS[nombre][0]
+    _pasada(preparar, min(n, 1000), entrada)  # calentamiento
+    # Mejor de varias pasadas: el ruido de la máquina sólo empeora los números
+    mejor_total = p50 = p99 = np.inf
+    for _ in range(max(1, repeticiones)):
+        total, latencias = _pasada(preparar, n, entrada)
+        mejor_total = min(mejor_total, total)
+        p50 = min(p50, float(np.percentile(latencias, 50)))
+        p99 = min(p99, float(np.percentile(latencias, 99)))
+    tracemalloc.start()
+    try:
+        _pasada(preparar, n, entrada)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'n': n,
+        'ops_s': round(n / (mejor_total / 1e9), 1),
+        'p50_us': round(p50 / 1000, 3),
+        'p99_us': round(p99 / 1000, 3),
+        'pico_kb': round(pico / 1024, 1),
+    }
+
+
+def regresiones(resultado, base, umbral=UMBRAL, umbral_latencia=UMBRAL_LATENCIA, umbral_memoria=UMBRAL_MEMORIA):
+    """Lista de textos con cada métrica que empeoró más que su umbral respecto al baseline."""
+    out = []
+    if resultado['ops_s'] < base['ops_s'] * (1 - umbral):
+        out.append(f"ops/s {resultado['ops_s']:,.0f} < {base['ops_s']:,.0f} (-{umbral:.0%})")
+    for clave, u in (('p50_us', umbral_latencia), ('p99_us', umbral_latencia), ('pico_kb', umbral_memoria)):
+        if resultado[clave] > base[clave] * (1 + u):
+            out.append(f"{clave} {resultado[clave]} > {base[clave]} (+{u:.0%})")
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de los caminos calientes con puertas de regresión")
+    parser.add_argument('--solo', help="Casos separados por coma (por defecto todos)")
+    parser.add_argument('--guardar', action='store_true', help="Escribir los resultados como nuevos baselines")
+    parser.add_argument('--umbral', type=float, default=UMBRAL)
+    parser.add_argument('--umbral-latencia', type=float, default=UMBRAL_LATENCIA)
+    parser.add_argument('--umbral-memoria', type=float, default=UMBRAL_MEMORIA)
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES)
+    parser.add_argument('--rapido', action='store_true', help="Una quinta parte de las operaciones (sin comparar)")
+    parser.add_argument('--frames', help="Cinta grabada (formato de backtest.py) en lugar de mensajes sintéticos")
+    parser.add_argument('--baselines', default=BASELINES)
+    args = parser.parse_args()
+
+    nombres = [c.strip() for c in args.solo.split(',')] if args.solo else list(CASOS)
+    if args.guardar and args.rapido:
+        parser.error("--guardar no se combina con --rapido")
+    desconocidos = [c for c in nombres if c not in CASOS]
+    if desconocidos:
+        parser.error(f"casos desconocidos: {', '.join(desconocidos)} (disponibles: {', '.join(CASOS)})")
+
+    entrada = Entrada(args.frames)
+    try:
+        return _correr_casos(args, nombres, entrada)
+    finally:
+        entrada.cerrar()
+
+
+def _correr_casos(args, nombres, entrada):
+    print(f"[BENCH] {len(entrada.frames)} frames ({len(entrada.trades)} trades, {len(entrada.depths)} depth)"
+          f"{' de ' + args.frames if args.frames else ' sintéticos'}")
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f).get('casos', {})
+
+    resultados = {}
+    fallas = {}
+    print(f"{'caso':<26}{'ops/s':>12}{'p50 us':>10}{'p99 us':>10}{'pico KB':>10}  vs baseline")
+    for nombre in nombres:
+        _, ops, tolerancia = CASOS[nombre]
+        n = max(1, ops // 5) if args.rapido else ops
+        r = resultados[nombre] = medir(nombre, n, entrada, args.repeticiones)
+        base = baselines.get(nombre)
+        if base is None:
+            comparacion = "sin baseline"
+        else:
+            comparacion = f"{(r['ops_s'] / base['ops_s'] - 1) * 100:+.1f}% ops/s"
+            if not args.guardar and not args.rapido:
+                malas = regresiones(r, base, args.umbral * tolerancia, args.umbral_latencia * tolerancia,
+                                    args.umbral_memoria)
+                if malas:
+                    fallas[nombre] = malas
+                    comparacion += "  REGRESIÓN"
+        print(f"{nombre:<26}{r['ops_s']:>12,.0f}{r['p50_us']:>10.2f}{r['p99_us']:>10.2f}{r['pico_kb']:>10.1f}  {comparacion}")
+
+    if args.guardar:
+        todos = dict(baselines)
+        todos.update(resultados)
+        with open(args.baselines, 'w') as f:
+            json.dump({
+                'maquina': {'python': platform.python_version(), 'plataforma': platform.platform(),
+                            'cpu': platform.processor() or platform.machine(), 'cpus': os.cpu_count()},
+                'fecha': datetime.now(UTC).isoformat(timespec='seconds'),
+                'casos': todos,
+            }, f, indent=2)
+        print(f"[BENCH] Baselines guardados en {args.baselines}")
+        return 0
+    for nombre, malas in fallas.items():
+        for m in malas:
+            print(f"[BENCH] REGRESIÓN {nombre}: {m}")
+    return 1 if fallas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,159 @@
 ORDER_TYPE_STOP_MARKET = "STOP_MARKET"
 
+import asyncio
+import copy
+import json
 import time
-from binance.client import Client
+from binance import Client, AsyncClient
 from binance.enums import *
 from binance.exceptions import BinanceAPIException
-from config import API_KEY, API_SECRET, SYMBOL, LEVERAGE, PAPER_MODE, USE_TESTNET
+from config import (
+    API_KEY, API_SECRET, SYMBOL, SYMBOLS, LEVERAGE, PAPER_MODE, USE_TESTNET, REST_FAPI_URL,
+    EXCHANGE_CACHE_FILE, EXCHANGE_CACHE_TTL_SECONDS, ajustes_simbolo
+)
+from rate_governor import RateGovernor, LimiteDiferido, PROTECCION, INFO, GRID
+from metrics import REST_RTT, REST_ERRORES, RECHAZOS
+from ticks import TickScale
 
 import os
 
-class BinanceClient:
+DEFAULT_FILTERS = {'tickSize': 0.01, 'stepSize': 0.001, 'minQty': 0.001}
+# Errores de precisión/tickSize/stepSize: los filtros cacheados ya no valen
+FILTER_ERROR_CODES = (-1111, -4014, -4023)
+
+
+def _parse_symbol_filters(info, symbol):
+    for s in info.get('symbols', []):
+        if s['symbol'] == symbol:
+            filters = {f['filterType']: f for f in s['filters']}
+            tick = float(filters['PRICE_FILTER']['tickSize'])
+            step = float(filters['LOT_SIZE']['stepSize'])
+            min_qty = float(filters['LOT_SIZE']['minQty'])
+            return {'tickSize': tick, 'stepSize': step, 'minQty': min_qty}
+    return None
+
+
+def _clave_cache(symbol):
+    return f"{'TEST' if USE_TESTNET else 'PROD'}:{symbol}"
+
+
+def _leer_cache_todo():
+    try:
+        with open(EXCHANGE_CACHE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def leer_cache_exchange(symbol):
+    """Metadata cacheada del símbolo (filters, rateLimits, leverage) o None si falta o venció."""
+    entrada = _leer_cache_todo().get(_clave_cache(symbol))
+    if not entrada or 'filters' not in entrada:
+        return None
+    if time.time() - entrada.get('ts', 0) > EXCHANGE_CACHE_TTL_SECONDS:
+        return None
+    return entrada
+
+
+def _escribir_cache_todo(data):
+    # Escritura atómica (tmp + rename): un crash nunca deja el caché a medias
+    os.makedirs(os.path.dirname(EXCHANGE_CACHE_FILE) or '.', exist_ok=True)
+    tmp = EXCHANGE_CACHE_FILE + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, EXCHANGE_CACHE_FILE)
+
+
+def guardar_cache_exchange(symbol, **campos):
+    data = _leer_cache_todo()
+    data.setdefault(_clave_cache(symbol), {}).update(campos)
+    _escribir_cache_todo(data)
+
+
+def invalidar_cache_exchange(symbol):
+    data = _leer_cache_todo()
+    if data.pop(_clave_cache(symbol), None) is not None:
+        _escribir_cache_todo(data)
+
+
+def _apply_fapi_url(client):
+    # Testnet o servidor REST local (mock) para pruebas de carga/latencia
+    if USE_TESTNET:
+        try:
+            client.FUTURES_URL = 'https://testnet.binancefuture.com/fapi'
+        except Exception:
+            pass
+    if REST_FAPI_URL:
+        client.FUTURES_URL = REST_FAPI_URL
+        client.FUTURES_TESTNET_URL = REST_FAPI_URL
+
+
+class _SymbolRounding:
+    symbol = SYMBOL
+    filters = DEFAULT_FILTERS
+    _escala = None
+
+    @property
+    def escala(self):
+        # Se reconstruye si los filtros cambian (p. ej. recarga de exchangeInfo)
+        if self._escala is None or self._escala.filters != self.filters:
+            self._escala = TickScale.desde_filtros(self.filters)
+        return self._escala
+
+    def round_price(self, price):
+        return self.escala.round_price(price)
+
+    def round_qty(self, qty):
+        return self.escala.round_qty(qty)
+
+    def _limit_params(self, side, price, qty, reduce_only, newClientOrderId):
+        price = self.round_price(price)
+        qty = self.round_qty(qty)
+        if price is None or price == 0 or qty is None or qty == 0:
+            return None
+        params = {
+            'symbol': self.symbol,
+            'side': side,
+            'type': ORDER_TYPE_LIMIT,
+            'price': float(price),
+            'quantity': float(qty),
+            'reduceOnly': reduce_only,
+            'timeInForce': TIME_IN_FORCE_GTC,
+        }
+        if newClientOrderId:
+            params['newClientOrderId'] = newClientOrderId
+        return params
+
+    @staticmethod
+    def _batch_params(params):
+        # batchOrders exige todos los valores como string (y booleanos en minúscula)
+        out = {}
+        for k, v in params.items():
+            if isinstance(v, bool):
+                out[k] = 'true' if v else 'false'
+            else:
+                out[k] = str(v)
+        return out
+
+    def _stop_params(self, stop_price):
+        # Los STOP_MARKET son órdenes algo (POST algoOrder): triggerPrice en lugar de stopPrice
+        stop_price = self.round_price(stop_price)
+        if stop_price is None or stop_price == 0:
+            return None
+        return {
+            'symbol': self.symbol,
+            'side': SIDE_SELL,
+            'algoType': 'CONDITIONAL',
+            'type': ORDER_TYPE_STOP_MARKET,
+            'triggerPrice': float(stop_price),
+            'closePosition': True,
+        }
+
+
+class BinanceClient(_SymbolRounding):
     def __init__(self):
         self.client = Client(API_KEY, API_SECRET, testnet=USE_TESTNET)
-        if USE_TESTNET:
-            try:
-                self.client.FUTURES_URL = 'https://testnet.binancefuture.com/fapi'
-            except Exception:
-                pass
+        _apply_fapi_url(self.client)
         self.filters = self._load_symbol_filters(SYMBOL)
 
         if not PAPER_MODE:
@@ -26,30 +164,12 @@ class BinanceClient:
 
     def _load_symbol_filters(self, symbol):
         try:
-            info = self.client.futures_exchange_info()
-            for s in info.get('symbols', []):
-                if s['symbol'] == symbol:
-                    filters = {f['filterType']: f for f in s['filters']}
-                    tick = float(filters['PRICE_FILTER']['tickSize'])
-                    step = float(filters['LOT_SIZE']['stepSize'])
-                    min_qty = float(filters['LOT_SIZE']['minQty'])
-                    return {'tickSize': tick, 'stepSize': step, 'minQty': min_qty}
+            filters = _parse_symbol_filters(self.client.futures_exchange_info(), symbol)
+            if filters:
+                return filters
         except Exception as e:
             print(f"[WARN] exchange_info: {e}")
-        return {'tickSize': 0.01, 'stepSize': 0.001, 'minQty': 0.001}
-
-    def round_price(self, price):
-        tick = self.filters['tickSize']
-        return float(f"{round(round(price / tick) * tick, 8)}")
-
-    def round_qty(self, qty):
-        step = self.filters['stepSize']
-        min_qty = self.filters['minQty']
-        steps = int(qty / step)
-        q = steps * step
-        if q < min_qty:
-            q = min_qty
-        return float(f"{q:.6f}")
+        return dict(DEFAULT_FILTERS)
 
     def futures_account(self):
         if PAPER_MODE:
@@ -88,23 +208,14 @@ class BinanceClient:
             return []
         return self.client.futures_get_open_orders(symbol=SYMBOL)
 
+    def futures_symbol_ticker(self):
+        return self.client.futures_symbol_ticker(symbol=SYMBOL)
+
     def place_limit(self, side, price, qty, reduce_only=False, newClientOrderId=None):
-        price = self.round_price(price)
-        qty = self.round_qty(qty)
-        if price is None or price == 0 or qty is None or qty == 0:
+        params = self._limit_params(side, price, qty, reduce_only, newClientOrderId)
+        if params is None:
             print("[ERROR] place_limit: precio o qty cero/None")
             return {'status': 'ERROR', 'error': 'price or qty zero'}
-        params = {
-            'symbol': SYMBOL,
-            'side': side,
-            'type': ORDER_TYPE_LIMIT,
-            'price': float(price),
-            'quantity': float(qty),
-            'reduceOnly': reduce_only,
-            'timeInForce': TIME_IN_FORCE_GTC,
-        }
-        if newClientOrderId:
-            params['newClientOrderId'] = newClientOrderId
         try:
             return self.futures_create_order(**params)
         except BinanceAPIException as e:
@@ -114,18 +225,25 @@ class BinanceClient:
             print(f"[ERROR] place_limit: {e}")
             return {'status': 'ERROR', 'error': str(e)}
 
+    def place_limit_batch(self, params_list):
+        """Envía hasta 5 órdenes LIMIT (params de _limit_params) en un solo batchOrders."""
+        if PAPER_MODE:
+            print(f"[PAPER][BATCH_ORDERS] {params_list}")
+            return [{'status': 'SIMULATED', 'orderId': -1} for _ in params_list]
+        try:
+            return self.client.futures_place_batch_order(batchOrders=[self._batch_params(p) for p in params_list])
+        except BinanceAPIException as e:
+            print(f"[ERROR] API Binance batchOrders: {e}")
+            return [{'status': 'ERROR', 'error': str(e)} for _ in params_list]
+        except Exception as e:
+            print(f"[ERROR] batchOrders: {e}")
+            return [{'status': 'ERROR', 'error': str(e)} for _ in params_list]
+
     def place_stop_market_close_position(self, stop_price):
-        stop_price = self.round_price(stop_price)
-        if stop_price is None or stop_price == 0:
+        params = self._stop_params(stop_price)
+        if params is None:
             print("[ERROR] place_stop_market_close_position: stop_price cero/None")
             return {'status': 'ERROR', 'error': 'stop_price zero'}
-        params = {
-            'symbol': SYMBOL,
-            'side': SIDE_SELL,
-            'type': ORDER_TYPE_STOP_MARKET,
-            'stopPrice': float(stop_price),
-            'closePosition': True,
-        }
         try:
             return self.futures_create_order(**params)
         except BinanceAPIException as e:
@@ -180,4 +298,356 @@ class BinanceClient:
         except Exception as e:
             print(f"[WARN] listenKey close: {e}")
 
-    # Otros métodos de user stream y public price igual que antes...
\ No newline at end of file
+    # Otros métodos de user stream y public price igual que antes...
+
+
+class AsyncBinanceClient(_SymbolRounding):
+    """
+    Misma interfaz que BinanceClient pero con métodos awaitables sobre el
+    AsyncClient de python-binance (una sola sesión aiohttp con conexiones
+    keep-alive reutilizadas), para no bloquear el event loop de los streams.
+    Todo request pasa por `governor` (rate limits con carriles de prioridad).
+    Cada instancia opera un símbolo; `para_simbolo` da la vista de otro par sobre
+    la misma sesión y el mismo governor. Crear con `await AsyncBinanceClient.create()`.
+    """
+
+    def __init__(self, client, symbol=SYMBOL):
+        self.client = client
+        self.symbol = symbol
+        self.filters = dict(DEFAULT_FILTERS)
+        self.governor = RateGovernor()
+        self._vistas = {symbol: self}  # compartido por todas las vistas
+        self._recarga_metadata = None
+
+    def para_simbolo(self, symbol):
+        """Cliente para `symbol` que comparte sesión HTTP, governor (presupuesto de la cuenta) y vistas."""
+        vista = self._vistas.get(symbol)
+        if vista is None:
+            vista = copy.copy(self)
+            vista.symbol = symbol
+            vista.filters = dict(DEFAULT_FILTERS)
+            vista._escala = None
+            vista._recarga_metadata = None
+            self._vistas[symbol] = vista
+        return vista
+
+    async def _llamar(self, prioridad, fn, peso=1, ordenes=0, **kwargs):
+        """Reserva margen en el governor, llama y actualiza los buckets con los headers de la respuesta."""
+        await self.governor.adquirir(peso, ordenes, prioridad)
+        endpoint = getattr(fn, '__name__', 'rest')
+        t0 = time.perf_counter()
+        try:
+            return await fn(**kwargs)
+        except BinanceAPIException as e:
+            REST_ERRORES.inc(endpoint, e.code)
+            if ordenes:
+                RECHAZOS.inc(e.code)
+            self.governor.registrar_error(e.status_code, getattr(e.response, 'headers', None))
+            if e.code in FILTER_ERROR_CODES:
+                self._invalidar_metadata()
+            raise
+        finally:
+            # RTT sin la espera del governor
+            REST_RTT.observar(time.perf_counter() - t0, endpoint)
+            self.governor.registrar_headers(getattr(getattr(self.client, 'response', None), 'headers', None))
+
+    @classmethod
+    async def create(cls, symbols=None):
+        t0 = time.monotonic()
+        symbols = list(symbols or SYMBOLS)
+        # Sin AsyncClient.create(): evita el ping/serverTime al API spot en el arranque
+        client = AsyncClient(API_KEY, API_SECRET, testnet=USE_TESTNET)
+        _apply_fapi_url(client)
+        self = cls(client, symbols[0])
+
+        # Con cache vigente no hace falta exchangeInfo (decenas de KB) ni re-aplicar el leverage;
+        # un solo exchangeInfo cubre todos los símbolos que falten
+        caches = {s: leer_cache_exchange(s) for s in symbols}
+        faltan = [s for s, c in caches.items() if not c]
+        pasos = []
+        for s, cache in caches.items():
+            if cache:
+                self.para_simbolo(s).filters = dict(cache['filters'])
+                self.governor.configurar(cache.get('rateLimits'))
+        if faltan:
+            pasos.append(self._cargar_metadata(faltan))
+        if not PAPER_MODE:
+            for s in symbols:
+                leverage = ajustes_simbolo(s).LEVERAGE
+                if (caches[s] or {}).get('leverage') != leverage:
+                    pasos.append(self.para_simbolo(s)._fijar_leverage(leverage))
+        await asyncio.gather(*pasos)
+        print(f"[STARTUP] Cliente REST listo en {(time.monotonic() - t0) * 1000:.0f}ms "
+              f"({len(symbols)} símbolos, {len(symbols) - len(faltan)} desde cache, {len(pasos)} requests)")
+        return self
+
+    async def _cargar_metadata(self, symbols=None):
+        symbols = symbols or [self.symbol]
+        try:
+            info = await self._llamar(INFO, self.client.futures_exchange_info)
+        except Exception as e:
+            print(f"[WARN] exchange_info: {e}")
+            return
+        self.governor.configurar(info.get('rateLimits'))
+        for s in symbols:
+            filters = _parse_symbol_filters(info, s)
+            if not filters:
+                print(f"[WARN] exchange_info: {s} sin filtros, uso los de defecto")
+                continue
+            self.para_simbolo(s).filters = filters
+            guardar_cache_exchange(s, filters=filters, rateLimits=info.get('rateLimits'), ts=time.time())
+
+    async def _fijar_leverage(self, leverage=LEVERAGE):
+        try:
+            await self._llamar(INFO, self.client.futures_change_leverage, symbol=self.symbol, leverage=leverage)
+        except Exception as e:
+            print(f"[WARN] set leverage {self.symbol}: {e}")
+            return
+        guardar_cache_exchange(self.symbol, leverage=leverage)
+
+    def _invalidar_metadata(self):
+        """El exchange rechazó precio/qty por filtros: descartar el cache y recargar exchangeInfo."""
+        invalidar_cache_exchange(self.symbol)
+        if self._recarga_metadata is None or self._recarga_metadata.done():
+            print(f"[WARN] Filtros de {self.symbol} desactualizados: recargando exchangeInfo")
+            self._recarga_metadata = asyncio.ensure_future(self._cargar_metadata())
+
+    async def close(self):
+        try:
+            await self.client.close_connection()
+        except Exception as e:
+            print(f"[WARN] cerrar sesión REST: {e}")
+
+    async def futures_account(self):
+        if PAPER_MODE:
+            return {'assets': [{'asset':'USDT','availableBalance':'0'}]}
+        return await self._llamar(INFO, self.client.futures_account, peso=5)
+
+    async def get_available_balance(self, asset='USDT'):
+        try:
+            acc = await self.futures_account()
+            for a in acc.get('assets', []):
+                if a['asset'] == asset:
+                    return float(a['availableBalance'])
+        except Exception as e:
+            print(f"[WARN] get_available_balance: {e}")
+        return 0.0
+
+    async def futures_position_information(self):
+        if PAPER_MODE:
+            return []
+        return await self._llamar(INFO, self.client.futures_position_information, peso=5, symbol=self.symbol)
+
+    async def futures_create_order(self, prioridad=PROTECCION, **kwargs):
+        if PAPER_MODE:
+            print(f"[PAPER][CREATE_ORDER] {kwargs}")
+            return {'status': 'SIMULATED', 'orderId': -1}
+        # Crear orden: peso 0 de IP, 1 en cada contador de órdenes
+        return await self._llamar(prioridad, self.client.futures_create_order, peso=0, ordenes=1, **kwargs)
+
+    async def futures_cancel_all_open_orders(self):
+        if PAPER_MODE:
+            print("[PAPER] cancelar todas las órdenes")
+            return []
+        return await self._llamar(PROTECCION, self.client.futures_cancel_all_open_orders, symbol=self.symbol)
+
+    async def futures_get_open_orders(self):
+        if PAPER_MODE:
+            return []
+        return await self._llamar(INFO, self.client.futures_get_open_orders, symbol=self.symbol)
+
+    async def futures_get_open_algo_orders(self):
+        """Órdenes algo abiertas (los STOP_MARKET): no aparecen en openOrders."""
+        if PAPER_MODE:
+            return []
+        return await self._llamar(INFO, self.client.futures_get_open_algo_orders, symbol=self.symbol)
+
+    async def futures_symbol_ticker(self):
+        return await self._llamar(INFO, self.client.futures_symbol_ticker, symbol=self.symbol)
+
+    async def futures_account_trades(self, startTime=None, fromId=None, limit=1000):
+        """Fills de la cuenta (userTrades) desde startTime o desde fromId (Binance no acepta ambos)."""
+        if PAPER_MODE:
+            return []
+        params = {'symbol': self.symbol, 'limit': limit}
+        if fromId is not None:
+            params['fromId'] = fromId
+        elif startTime is not None:
+            params['startTime'] = int(startTime)
+        return await self._llamar(PROTECCION, self.client.futures_account_trades, peso=5, **params)
+
+    async def futures_order_book(self, limit=1000):
+        peso = 2 if limit <= 50 else 5 if limit <= 100 else 10 if limit <= 500 else 20
+        return await self._llamar(INFO, self.client.futures_order_book, peso=peso, symbol=self.symbol, limit=limit)
+
+    async def place_limit(self, side, price, qty, reduce_only=False, newClientOrderId=None):
+        params = self._limit_params(side, price, qty, reduce_only, newClientOrderId)
+        if params is None:
+            print("[ERROR] place_limit: precio o qty cero/None")
+            return {'status': 'ERROR', 'error': 'price or qty zero'}
+        try:
+            return await self.futures_create_order(prioridad=PROTECCION if reduce_only else GRID, **params)
+        except BinanceAPIException as e:
+            print(f"[ERROR] API Binance place_limit: {e}")
+            return {'status': 'ERROR', 'error': str(e)}
+        except Exception as e:
+            print(f"[ERROR] place_limit: {e}")
+            return {'status': 'ERROR', 'error': str(e)}
+
+    async def place_limit_batch(self, params_list):
+        """Envía hasta 5 órdenes LIMIT (params de _limit_params) en un solo batchOrders."""
+        if PAPER_MODE:
+            print(f"[PAPER][BATCH_ORDERS] {params_list}")
+            return [{'status': 'SIMULATED', 'orderId': -1} for _ in params_list]
+        try:
+            return await self._llamar(GRID, self.client.futures_place_batch_order, peso=5, ordenes=len(params_list),
+                                      batchOrders=[self._batch_params(p) for p in params_list])
+        except LimiteDiferido as e:
+            print(f"[RATE] batchOrders diferido: {e}")
+            return [{'status': 'ERROR', 'error': str(e)} for _ in params_list]
+        except BinanceAPIException as e:
+            print(f"[ERROR] API Binance batchOrders: {e}")
+            return [{'status': 'ERROR', 'error': str(e)} for _ in params_list]
+        except Exception as e:
+            print(f"[ERROR] batchOrders: {e}")
+            return [{'status': 'ERROR', 'error': str(e)} for _ in params_list]
+
+    async def place_stop_market_close_position(self, stop_price):
+        """SL closePosition por el Algo Order API: la respuesta trae algoId, no orderId."""
+        params = self._stop_params(stop_price)
+        if params is None:
+            print("[ERROR] place_stop_market_close_position: stop_price cero/None")
+            return {'status': 'ERROR', 'error': 'stop_price zero'}
+        if PAPER_MODE:
+            print(f"[PAPER][ALGO_ORDER] {params}")
+            return {'algoStatus': 'SIMULATED', 'algoId': -1}
+        try:
+            return await self._llamar(PROTECCION, self.client.futures_create_algo_order, peso=0, ordenes=1, **params)
+        except BinanceAPIException as e:
+            print(f"[ERROR] API Binance stop_market_close_position: {e}")
+            return {'status': 'ERROR', 'error': str(e)}
+        except Exception as e:
+            print(f"[ERROR] stop_market_close_position: {e}")
+            return {'status': 'ERROR', 'error': str(e)}
+
+    async def get_open_orders(self):
+        return await self.futures_get_open_orders()
+
+    async def get_open_algo_orders(self):
+        return await self.futures_get_open_algo_orders()
+
+    async def cancel_order(self, orderId):
+        if PAPER_MODE:
+            print(f"[PAPER] cancelar orden {orderId}")
+            return {'status': 'CANCELLED', 'orderId': orderId}
+        try:
+            return await self._llamar(PROTECCION, self.client.futures_cancel_order, symbol=self.symbol, orderId=orderId)
+        except BinanceAPIException as e:
+            print(f"[ERROR] cancelar orden {orderId}: {e}")
+            return {'status': 'ERROR', 'error': str(e)}
+        except Exception as e:
+            print(f"[ERROR] cancelar orden {orderId}: {e}")
+            return {'status': 'ERROR', 'error': str(e)}
+
+    async def cancel_algo_order(self, algoId):
+        """Cancela una orden algo (DELETE algoOrder) por algoId."""
+        if PAPER_MODE:
+            print(f"[PAPER] cancelar orden algo {algoId}")
+            return {'algoId': algoId, 'code': '200', 'msg': 'success'}
+        try:
+            return await self._llamar(PROTECCION, self.client.futures_cancel_algo_order, symbol=self.symbol, algoId=algoId)
+        except BinanceAPIException as e:
+            print(f"[ERROR] cancelar orden algo {algoId}: {e}")
+            return {'status': 'ERROR', 'error': str(e)}
+        except Exception as e:
+            print(f"[ERROR] cancelar orden algo {algoId}: {e}")
+            return {'status': 'ERROR', 'error': str(e)}
+
+    async def modify_limit(self, orderId, side, price, qty):
+        """Nuevo precio/cantidad de una LIMIT abierta (PUT order) en un request, sin cancelar y recrear."""
+        price = self.round_price(price)
+        qty = self.round_qty(qty)
+        if not price or not qty:
+            print("[ERROR] modify_limit: precio o qty cero/None")
+            return {'status': 'ERROR', 'error': 'price or qty zero'}
+        if PAPER_MODE:
+            print(f"[PAPER] modificar orden {orderId}: {side} {qty} @ {price}")
+            return {'status': 'SIMULATED', 'orderId': orderId}
+        try:
+            # Peso 0 de IP, 1 en cada contador de órdenes (como crear)
+            return await self._llamar(PROTECCION, self.client.futures_modify_order, peso=0, ordenes=1,
+                                      symbol=self.symbol, orderId=orderId, side=side,
+                                      quantity=float(qty), price=float(price))
+        except BinanceAPIException as e:
+            print(f"[ERROR] API Binance modificar orden {orderId}: {e}")
+            return {'status': 'ERROR', 'error': str(e)}
+        except Exception as e:
+            print(f"[ERROR] modificar orden {orderId}: {e}")
+            return {'status': 'ERROR', 'error': str(e)}
+
+    async def cancel_all(self):
+        return await self.futures_cancel_all_open_orders()
+
+    async def cancel_orders_batch(self, order_ids):
+        """Cancela hasta 10 órdenes en un request. Devuelve un resultado por orderId."""
+        if PAPER_MODE:
+            print(f"[PAPER] cancelar órdenes {order_ids}")
+            return [{'status': 'CANCELED', 'orderId': oid} for oid in order_ids]
+        try:
+            return await self._llamar(PROTECCION, self.client.futures_cancel_orders,
+                                      symbol=self.symbol, orderIdList=json.dumps(list(order_ids), separators=(',', ':')))
+        except BinanceAPIException as e:
+            print(f"[ERROR] API Binance cancel batchOrders: {e}")
+            return [{'status': 'ERROR', 'error': str(e)} for _ in order_ids]
+        except Exception as e:
+            print(f"[ERROR] cancel batchOrders: {e}")
+            return [{'status': 'ERROR', 'error': str(e)} for _ in order_ids]
+
+    async def futures_stream_get_listen_key(self):
+        try:
+            res = await self._llamar(PROTECCION, self.client.futures_stream_get_listen_key)
+            if isinstance(res, dict):
+                return res.get('listenKey')
+            return res
+        except Exception as e:
+            print(f"[WARN] listenKey get: {e}")
+            return None
+
+    async def futures_stream_keepalive(self, listenKey):
+        if PAPER_MODE or not listenKey:
+            return None
+        try:
+            return await self._llamar(PROTECCION, self.client.futures_stream_keepalive, listenKey=listenKey)
+        except Exception as e:
+            print(f"[WARN] listenKey keepalive: {e}")
+
+    async def futures_stream_close(self, listenKey):
+        if PAPER_MODE or not listenKey:
+            return None
+        try:
+            return await self._llamar(PROTECCION, self.client.futures_stream_close, listenKey=listenKey)
+        except Exception as e:
+            print(f"[WARN] listenKey close: {e}")
+
+
+_cliente = None
+_cliente_lock = None
+
+
+async def obtener_cliente():
+    """Cliente REST compartido del proceso: se crea en el primer uso y lo reutilizan bot y streams."""
+    global _cliente, _cliente_lock
+    if _cliente is None:
+        if _cliente_lock is None:
+            _cliente_lock = asyncio.Lock()
+        async with _cliente_lock:
+            if _cliente is None:
+                _cliente = await AsyncBinanceClient.create()
+    return _cliente
+
+
+async def cerrar_cliente():
+    global _cliente
+    cliente, _cliente = _cliente, None
+    if cliente is not None:
+        await cliente.close()
@@ -1,34 +1,62 @@
 import asyncio
 import time
+import reloj
+import metrics
 from datetime import datetime, UTC
 from websocket_listener import WebSocketManager
-from binance_client import BinanceClient
+from binance_client import obtener_cliente, cerrar_cliente
 from orders import OrderManager
 from state_manager import StateManager
+from order_book import LocalOrderBook
+from account_mirror import AccountMirror, EVENTOS_DE_ORDEN
+from barras import AgregadorBarras, etiqueta
+from rebalance_scheduler import RebalanceScheduler
 import strategy
 
 from config import (
-    SYMBOL, MIN_GRID_SPACING, MAX_GRID_SPACING,
-    GRID_RANGE_MIN, GRID_RANGE_MAX, REBALANCE_SECONDS,
-    MIN_PROFIT_THRESHOLD, TP_OFFSET_LOW, TP_OFFSET_MID, TP_OFFSET_HIGH,
-    STOP_LOSS_PERCENTAGE, PAPER_MODE, MAKER_FEE_RATE,
-    ORDER_USDT_SIZE, LEVERAGE, SAFE_SPREAD
+    SYMBOL, SYMBOLS, STATE_FILE, PAPER_MODE, METRICS_PORT, USER_GAP_MARGIN_MS,
+    LOOP_LAG_CHECK_SECONDS, LOOP_LAG_REPORT_SECONDS,
+    ajustes_simbolo, ruta_simbolo
 )
-from logger import guardar_estado_vivo, guardar_historico
+from logger import registrar_contexto, cerrar_escritor
 
 BOT_VERSION = "v1"
 
-class GridBot:
-    def __init__(self):
-        self.client = BinanceClient()
-        self.orders = OrderManager(self.client)
-        self.state = StateManager()
+class SymbolGrid:
+    """Grid de un símbolo: estrategia, estado, ajustes y órdenes propios."""
+
+    def __init__(self, symbol=SYMBOL, client=None, state=None, cfg=None):
+        # El cliente REST es asíncrono y se crea dentro del event loop (ver iniciar_cliente);
+        # el backtest inyecta un cliente simulado y un StateManager propio
+        self.symbol = symbol
+        self.cfg = cfg or ajustes_simbolo(symbol)
+        self.client = client
+        self.orders = None
+        self.order_book = None
+        self.cuenta = None  # AccountMirror (None en PAPER_MODE: no hay USER stream)
+        self.state = state or StateManager(ruta_simbolo(STATE_FILE, symbol))
+        # Barras OHLCV del stream @trade: la volatilidad que usan spacing y rango
+        self.barras = AgregadorBarras(
+            self.cfg.BARRAS_INTERVALOS, self.cfg.BARRAS_VOLUMEN, self.cfg.BARRAS_CAPACIDAD, self.cfg.BARRAS_VENTANA)
+        self.senales = strategy.SenalesSimbolo(
+            self.cfg.DUMP_MIN_TRADES_PER_SEC, self.cfg.DUMP_MIN_SELL_VOLUME, barras=self.barras,
+            window_ms=self.cfg.TRADE_WINDOW_MS, capacidad=self.cfg.TRADE_WINDOW_CAPACITY)
+        self.persistir_logs = True
+        self._tareas = []
         self.last_price = None
-        self.last_signal = None
-        self.current_spacing = (MIN_GRID_SPACING + MAX_GRID_SPACING) / 2
-        self.current_range = (GRID_RANGE_MIN + GRID_RANGE_MAX) / 2
+        self.last_signal = None  # señal pendiente: la consume el próximo rebalanceo
+        self.senal_grid = None   # señal que decidió spacing/rango del grid vigente
+        self.current_spacing = (self.cfg.MIN_GRID_SPACING + self.cfg.MAX_GRID_SPACING) / 2
+        self.current_range = (self.cfg.GRID_RANGE_MIN + self.cfg.GRID_RANGE_MAX) / 2
         self._last_rebalance = 0
         self._last_price_rest_fetched = 0  # Para rate-limitar el fallback REST
+        self.scheduler = RebalanceScheduler(
+            self._rebalance_si_corresponde, self.cfg.REBALANCE_SECONDS, self.cfg.REBALANCE_DEBOUNCE_SECONDS, symbol=self.symbol)
+        # Misma mecánica para TP/SL: los fills de una ráfaga se coalescen en una sola actualización
+        self.proteccion = RebalanceScheduler(
+            self._actualizar_proteccion, 0, self.cfg.FILL_COALESCE_SECONDS, nombre="protección", symbol=self.symbol)
+        self._fill_pendiente_ms = None  # T del primer fill todavía sin TP/SL actualizados
+        self._user_desde_ms = None  # desde cuándo el estado refleja los fills (si aún no llegó ningún evento USER)
 
         # Para lógica post-TP
         self.last_tp_price = None
@@ -37,39 +65,62 @@ class GridBot:
         # Para evitar grids hundidos
         self.last_grid_price = None
 
-        print(f"[INFO] PAPER_MODE={'ON' if PAPER_MODE else 'OFF'} | ENV={'TEST' if self.client.client.testnet else 'PROD'} | Symbol={SYMBOL}")
+        # Línea de tiempo del arranque: etapa -> ms desde el inicio de GridBot.run()
+        self.arranque = {}
+        self._arranque_t0 = None
+
+    def _marcar_arranque(self, etapa):
+        if self._arranque_t0 is None or etapa in self.arranque:
+            return
+        ms = (reloj.monotonic() - self._arranque_t0) * 1000
+        self.arranque[etapa] = round(ms, 1)
+        print(f"[STARTUP] +{ms:.0f}ms {self.symbol} {etapa}")
+        if etapa == 'primera_orden':
+            print(f"[STARTUP] Línea de tiempo {self.symbol}: {self.arranque}")
+
+    async def iniciar_cliente(self):
+        # Sin requests de cuenta: los streams pueden conectar mientras arrancar() sincroniza
+        if self.client is None:
+            self.client = (await obtener_cliente()).para_simbolo(self.symbol)
+        if not PAPER_MODE and self.cuenta is None:
+            self.cuenta = AccountMirror(self.client, self.symbol, leverage=self.cfg.LEVERAGE)
+        self.orders = OrderManager(self.client, self.cuenta)
+        self.order_book = LocalOrderBook(self.client.filters['tickSize'], self.client.futures_order_book)
+        print(f"[INFO] PAPER_MODE={'ON' if PAPER_MODE else 'OFF'} | ENV={'TEST' if self.client.client.testnet else 'PROD'} | Symbol={self.symbol}")
 
     async def proteger_posicion_existente(self):
-        pos_info = self.client.futures_position_information()
         qty = 0.0
         entry_price = None
-        for pos in pos_info:
-            if pos.get('symbol') == SYMBOL:
-                qty = float(pos.get('positionAmt', 0))
-                entry_price = float(pos.get('entryPrice', 0))
-                break
+        if self.cuenta is not None and self.cuenta.sincronizado:
+            qty, entry_price = self.cuenta.posicion, self.cuenta.entrada
+        else:
+            pos_info = await self.client.futures_position_information()
+            for pos in pos_info:
+                if pos.get('symbol') == self.symbol:
+                    qty = float(pos.get('positionAmt', 0))
+                    entry_price = float(pos.get('entryPrice', 0))
+                    break
         if abs(qty) > 0.0:
             print(f"[STARTUP] Posición detectada: qty={qty} entry={entry_price}")
             self.state.state['posicion_total'] = abs(qty)
             self.state.state['costo_total'] = abs(qty) * entry_price
             self.state.state['fills'] = []
-            open_orders = self.orders.get_open_orders()
+            open_orders, stops = await asyncio.gather(self.orders.get_open_orders(), self.orders.get_open_algo_orders())
             tp_ok = False
-            sl_ok = False
-            # Verifica si hay TP/SL activos
+            # Verifica si hay TP/SL activos (el SL es una orden algo: sólo está en openAlgoOrders)
             for o in open_orders:
                 if o.get('side') == 'SELL' and o.get('reduceOnly'):
                     tp_target = entry_price * 1.003
                     if abs(float(o.get('price')) - tp_target)/tp_target <= 0.0002:
                         tp_ok = True
-                if o.get('type') in ("STOP_MARKET", "STOP") and o.get('closePosition') in (True, 'true', 'True'):
-                    sl_ok = True
+            sl_ok = any(self.orders.es_stop_loss(a) for a in stops)
             if not tp_ok:
-                self.orders.place_tp_sell(entry_price*1.003, abs(qty), "AUTO_TP")
+                await self.orders.place_tp_sell(entry_price*1.003, abs(qty), "AUTO_TP")
+                self._marcar_arranque('primera_orden')
                 print(f"[STARTUP] TP repuesto en {self.client.round_price(entry_price*1.003):.2f}")
             if not sl_ok:
-                self.orders.colocar_stop_loss_close_position(entry_price*(1-STOP_LOSS_PERCENTAGE))
-                print(f"[STARTUP] SL repuesto en {self.client.round_price(entry_price*(1-STOP_LOSS_PERCENTAGE)):.2f}")
+                await self.orders.colocar_stop_loss_close_position(entry_price*(1-self.cfg.STOP_LOSS_PERCENTAGE))
+                print(f"[STARTUP] SL repuesto en {self.client.round_price(entry_price*(1-self.cfg.STOP_LOSS_PERCENTAGE)):.2f}")
         else:
             print("[STARTUP] No hay posición abierta al iniciar el bot.")
 
@@ -81,11 +132,11 @@ class GridBot:
             self.last_price = float(price or self.last_price or 0)
         except Exception:
             print(f"[DEBUG] Trade msg sin precio válido: {msg}")
-        sig = strategy.analizar_trade(msg)
+        sig = self.senales.analizar_trade(msg)
         if sig == 'DUMP':
             self.last_signal = sig
             print("[ESTRATEGIA] Caída rápida detectada → spacing MAX")
-        await self._rebalance_si_corresponde()
+        self.scheduler.solicitar()
 
     async def procesar_ticker(self, msg):
         price = msg.get('c') or msg.get('price') or msg.get('p')
@@ -93,18 +144,21 @@ class GridBot:
             self.last_price = float(price or self.last_price or 0)
         except Exception:
             print(f"[DEBUG] Ticker msg sin precio válido: {msg}")
-        await self._rebalance_si_corresponde()
+        self.scheduler.solicitar()
 
     async def procesar_depth(self, msg):
-        soporte = strategy.analizar_depth(msg)
+        # El diff ya fue aplicado al libro local por WebSocketManager
+        soporte = self.senales.analizar_depth(self.order_book)
         # NO actualizar self.last_price aquí para evitar grids hundidos por bids anómalos
         if soporte:
             self.last_signal = soporte
             print(f"[ESTRATEGIA] Soporte detectado en {soporte['precio']} (vol {round(soporte['volumen'],3)}) → spacing MIN")
-        await self._rebalance_si_corresponde()
+        self.scheduler.solicitar()
 
     async def procesar_user(self, msg):
         try:
+            if self.cuenta is not None:
+                self.cuenta.aplicar_evento(msg)
             if msg.get('e') != 'ORDER_TRADE_UPDATE':
                 return
             o = msg.get('o', {})
@@ -114,113 +168,168 @@ class GridBot:
             last_filled_qty = float(o.get('l') or 0)
             commission = float(o.get('n') or 0)
             if last_filled_qty > 0 and X in ('PARTIALLY_FILLED','FILLED'):
-                if s == 'BUY':
-                    self.state.agregar_compra(avg_price, last_filled_qty, fee=commission)
-                elif s == 'SELL':
-                    self.state.agregar_venta(avg_price, last_filled_qty, fee=commission)
-                await self.colocar_tp_y_sl_si_corresponde()
-                # --- NUEVA LÓGICA: Si la posición queda en cero, guardar TP ---
-                if s == 'SELL' and self.state.state.get('posicion_total', 0.0) < 1e-3:
-                    self.last_tp_price = avg_price
-                    self.last_tp_time = time.time()
+                if self.cuenta is not None and not self.cuenta.trade_nuevo(o.get('t')):
+                    return  # ya aplicado al recuperar un hueco del USER stream
+                self._aplicar_fill(s, avg_price, last_filled_qty, commission, o.get('T') or msg.get('E'))
         except Exception as e:
             print(f"[USER] error parse: {e}")
 
+    def _aplicar_fill(self, side, precio, qty, fee, t_fill):
+        if side == 'BUY':
+            self.state.agregar_compra(precio, qty, fee=fee)
+        elif side == 'SELL':
+            self.state.agregar_venta(precio, qty, fee=fee)
+        if t_fill and self._fill_pendiente_ms is None:
+            self._fill_pendiente_ms = int(t_fill)
+        self.proteccion.solicitar()
+        # --- NUEVA LÓGICA: Si la posición queda en cero, guardar TP ---
+        if side == 'SELL' and self.state.state.get('posicion_total', 0.0) < 1e-3:
+            self.last_tp_price = precio
+            self.last_tp_time = reloj.ahora()
+
+    async def recuperar_user(self, t0):
+        """
+        Tras (re)conectar el USER stream: los fills del hueco (userTrades desde el último
+        evento visto) pasan al estado y el espejo se resincroniza, ambos en paralelo.
+        `t0` es el reloj.monotonic() de la reconexión; si algo falla se reintenta.
+        """
+        if self.cuenta is None:
+            return
+        espera = 1
+        while not await self._recuperar_hueco(t0):
+            print(f"[USER] {self.symbol} recuperación incompleta, reintentando en {espera}s")
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, 30)
+
+    async def _recuperar_hueco(self, t0):
+        desde = self.cuenta.hueco_desde_ms
+        desde = desde - USER_GAP_MARGIN_MS if desde else self._user_desde_ms
+        if desde is None:
+            # Todavía arrancando: proteger_posicion_existente toma la posición de REST
+            self.cuenta.hueco_desde_ms = None
+            return await self.cuenta.sincronizar()
+        trades, sincronizado = await asyncio.gather(
+            self.cuenta.trades_desde(desde), self.cuenta.sincronizar(), return_exceptions=True)
+        if isinstance(trades, Exception):
+            print(f"[USER] {self.symbol} error al pedir los fills perdidos: {trades}")
+            return False
+        recuperados = 0
+        for t in trades:
+            if not self.cuenta.trade_nuevo(t.get('id')):
+                continue
+            self._aplicar_fill(t.get('side'), float(t['price']), float(t['qty']), float(t.get('commission') or 0), t.get('time'))
+            recuperados += 1
+        if recuperados:
+            metrics.FILLS_RECUPERADOS.inc(self.symbol, n=recuperados)
+        if sincronizado is not True:
+            return False
+        self.cuenta.hueco_desde_ms = None
+        ms = (reloj.monotonic() - t0) * 1000
+        metrics.RECUPERACION_USER.observar(ms / 1000, self.symbol)
+        print(f"[USER] {self.symbol} consistente {ms:.0f}ms tras reconectar ({recuperados} fills recuperados)")
+        return True
+
     # --- FALLBACK REST PARA PRECIO ---
     async def _rebalance_si_corresponde(self):
-        now = time.time()
+        # Lo ejecuta sólo el RebalanceScheduler; devuelve True si hubo rebalanceo
+        now = reloj.ahora()
         # Si el precio es inválido, intenta refrescarlo vía REST una vez cada 30s
         if self.last_price is None or self.last_price == 0:
             print("[GRID] Precio no válido para rebalanceo, omitiendo... Intentando refrescar desde Binance REST.")
             if now - getattr(self, '_last_price_rest_fetched', 0) > 30:
                 try:
-                    ticker = self.client.client.futures_symbol_ticker(symbol=SYMBOL)
+                    ticker = await self.client.futures_symbol_ticker()
                     self.last_price = float(ticker['price'])
                     self._last_price_rest_fetched = now
                     print(f"[GRID] Precio refrescado vía REST: {self.last_price}")
                 except Exception as e:
                     print(f"[GRID] Error al refrescar precio vía REST: {e}")
-            return
-        if now - self._last_rebalance < REBALANCE_SECONDS:
-            return
+            return False
+        if now - self._last_rebalance < self.cfg.REBALANCE_SECONDS:
+            return False
+        t0 = time.perf_counter()
 
         # --- NUEVO CONTROL DE GRIDS HUNDIDOS ---
         if self.last_grid_price is not None:
             if self.last_price < 0.95 * self.last_grid_price:
                 print(f"[WARN] Precio actual ({self.last_price}) está más de 5% debajo del último grid ({self.last_grid_price}), ignorando rebalance.")
-                return
-
-        self.current_spacing = strategy.recomendar_spacing(self.last_signal, MIN_GRID_SPACING, MAX_GRID_SPACING)
-        self.current_range = strategy.recomendar_rango(self.last_signal, GRID_RANGE_MIN, GRID_RANGE_MAX)
-        niveles = strategy.construir_grid(self.last_price, self.current_spacing, self.current_range)
-        niveles = await self._cap_por_margen(niveles)
+                return False
 
+        # Cada señal decide un solo rebalanceo; sin señal nueva spacing y rango siguen a la ATR de las barras
+        self.senal_grid, self.last_signal = self.last_signal, None
+        volatilidad = self.barras.atr_relativo(self.cfg.VOLATILIDAD_BARRA)
+        self.current_spacing = strategy.recomendar_spacing(
+            self.senal_grid, self.cfg.MIN_GRID_SPACING, self.cfg.MAX_GRID_SPACING, volatilidad, self.cfg.SPACING_ATR_MULT)
+        self.current_range = strategy.recomendar_rango(
+            self.senal_grid, self.cfg.GRID_RANGE_MIN, self.cfg.GRID_RANGE_MAX, volatilidad, self.cfg.RANGO_ATR_MULT)
+        open_orders = await self.orders.get_open_orders()
+        # Las BUY del grid que ya están en el libro tienen su margen reservado
+        grid_en_libro = sum(1 for o in open_orders if o.get('side') == 'BUY' and o.get('reduceOnly') not in (True, 'true', 'True'))
+        max_niveles = await self._max_niveles_por_margen(reservadas=grid_en_libro)
         self._last_rebalance = now
-        if not niveles:
-            print("[GRID] No hay niveles para grid.")
-            return
-
-        contexto = self._get_contexto_log()
-        guardar_estado_vivo(contexto)
-        guardar_historico(contexto)
-
-        print(f"[GRID] Rebalance spacing={round(self.current_spacing*100,2)}% range={round(self.current_range*100,2)}% niveles={len(niveles)}")
-        self.last_grid_price = self.last_price  # Actualiza precio de referencia del grid
-
-        try:
-            self.orders.cancel_all()
-            await asyncio.sleep(0.5)
-        except Exception as e:
-            print(f"[ERROR] Cancelar todas: {e}")
-
-        open_orders = self.orders.get_open_orders()
-        if open_orders:
-            print(f"[WARN] Quedaron {len(open_orders)} órdenes abiertas antes de crear grid nuevo")
 
         avg_entry = self.state.calcular_costo_promedio()
         # FIX robusto para posición residual
         pos_qty = float(self.state.state.get('posicion_total', 0.0))
         if pos_qty < 1e-3:
-            print("[FIX] Posición virtualmente cerrada, reseteando avg_entry a 0 y posición_total a 0.")
             avg_entry = 0.0
-            self.state.state['posicion_total'] = 0.0
-            self.state.state['costo_total'] = 0.0
-            self.state.save_state()
+            # Snapshot síncrono sólo si había un residuo que limpiar: sin posición no hay nada que persistir
+            if pos_qty or self.state.state.get('costo_total'):
+                print("[FIX] Posición virtualmente cerrada, reseteando avg_entry a 0 y posición_total a 0.")
+                self.state.state['posicion_total'] = 0.0
+                self.state.state['costo_total'] = 0.0
+                self.state.save_state()
         # FIN FIX
 
-        for p in niveles:
-            if p is None or p == 0:
-                continue
-            # SAFE: Solo colocar la orden si está por debajo del promedio y mejora el promedio lo suficiente
-            if avg_entry and p >= avg_entry:
-                print(f"[SAFE GRID] No se coloca orden en {p} porque está por encima del promedio de entrada ({avg_entry})")
-                continue
-            if avg_entry and ((avg_entry - p)/avg_entry < SAFE_SPREAD):
-                print(f"[SAFE GRID] No se coloca orden en {p} porque no mejora el promedio suficiente (SAFE_SPREAD={SAFE_SPREAD})")
-                continue
-            qty = self.orders.calcular_cantidad(p, ORDER_USDT_SIZE, LEVERAGE)
-            if qty is None or qty == 0:
-                continue
-            try:
-                self.orders.colocar_orden_limit('BUY', p, qty, reduce_only=False)
-            except Exception as e:
-                print(f"[ERROR] crear orden grid: {e}")
+        # Escalera completa en ticks/steps enteros: niveles, qty, SAFE_SPREAD sobre avg_entry y tope de margen
+        escala = self.client.escala
+        ticks, steps = escala.escalera(
+            self.last_price, self.current_spacing, self.current_range,
+            self.cfg.ORDER_USDT_SIZE, self.cfg.LEVERAGE, avg_entry, self.cfg.SAFE_SPREAD, max_niveles
+        )
+        if not len(ticks):
+            # Sin niveles válidos igual se reconcilia: las BUY que quedaron fuera se cancelan
+            print(f"[GRID] No hay niveles para grid (avg_entry={avg_entry}, SAFE_SPREAD={self.cfg.SAFE_SPREAD}).")
+        a_colocar = escala.niveles(ticks, steps)
 
-        await self.colocar_tp_y_sl_si_corresponde()
+        self._registrar_contexto(open_orders)
 
-    async def _cap_por_margen(self, niveles):
+        print(f"[GRID] Rebalance spacing={round(self.current_spacing*100,2)}% range={round(self.current_range*100,2)}% niveles={len(a_colocar)} lag_cola={self.scheduler.lag_ultimo*1000:.0f}ms")
+        self.last_grid_price = self.last_price  # Actualiza precio de referencia del grid
+
+        # Diff incremental contra el libro: las órdenes que no cambian conservan su prioridad
+        try:
+            res = await self.orders.reconcile_grid(a_colocar, open_orders)
+            for r in res['failed']:
+                print(f"[ERROR] crear orden grid en {r['price']}: {r.get('error')}")
+            if res['created']:
+                self._marcar_arranque('primera_orden')
+            metrics.REBALANCE_ORDENES.observar(res['created'] + res['canceled'], self.symbol)
+            print(f"[GRID] Diff: mantenidas={res['kept']} canceladas={res['canceled']} creadas={res['created']} "
+                  f"requests={res['requests']} (ahorradas {res['requests_saved']} vs cancel-all)")
+            if res['deferred']:
+                print(f"[RATE] {res['deferred']} niveles del grid diferidos por rate limit: {self.client.governor.estado()}")
+        except Exception as e:
+            print(f"[ERROR] reconciliar grid: {e}")
+
+        await self.proteccion.ejecutar()
+        metrics.REBALANCE_DURACION.observar(time.perf_counter() - t0, self.symbol)
+        return True
+
+    async def _max_niveles_por_margen(self, reservadas=0):
         if PAPER_MODE:
-            return niveles[:20]
+            return 20
         try:
-            avail = self.client.get_available_balance()
+            if self.cuenta is not None and self.cuenta.sincronizado:
+                avail = self.cuenta.balance_disponible()
+            else:
+                avail = await self.client.get_available_balance()
             if avail <= 0:
-                return niveles[:5]
-            max_orders = int(avail // float(ORDER_USDT_SIZE))
-            if max_orders <= 0:
-                max_orders = 1
-            return niveles[:max_orders]
+                return max(5, reservadas)
+            max_orders = int(avail // float(self.cfg.ORDER_USDT_SIZE)) + reservadas
+            return max(max_orders, 1)
         except Exception:
-            return niveles[:10]
+            return 10
 
     def _tp_threshold_neto(self):
         pos = float(self.state.state.get('posicion_total', 0.0))
@@ -229,32 +338,49 @@ class GridBot:
         avg = self.state.calcular_costo_promedio()
         notional = pos * avg
         fees_compras = float(self.state.state.get('fees_total', 0.0))
-        maker_fee_venta = MAKER_FEE_RATE * notional
-        threshold = MIN_PROFIT_THRESHOLD + (fees_compras + maker_fee_venta) / notional
+        maker_fee_venta = self.cfg.MAKER_FEE_RATE * notional
+        threshold = self.cfg.MIN_PROFIT_THRESHOLD + (fees_compras + maker_fee_venta) / notional
         return threshold
 
+    async def _actualizar_proteccion(self):
+        # Lo ejecuta sólo self.proteccion: una actualización de TP/SL por ráfaga de fills
+        t_fill, self._fill_pendiente_ms = self._fill_pendiente_ms, None
+        await self.colocar_tp_y_sl_si_corresponde()
+        if t_fill:
+            # Del primer fill de la ráfaga en el exchange a TP/SL colocados
+            metrics.FILL_A_TP.observar(max(0.0, reloj.ahora_ms() - t_fill) / 1000, self.symbol)
+        return True
+
     async def colocar_tp_y_sl_si_corresponde(self):
         pos = float(self.state.state.get('posicion_total', 0.0))
         if pos <= 0 or self.last_price is None:
             return
         avg = self.state.calcular_costo_promedio()
-        open_orders = self.orders.get_open_orders()
-        self.orders.ensure_take_profits(avg, pos, open_orders, offset=0.0002)
-        sl_price = avg * (1 - STOP_LOSS_PERCENTAGE)
-        self.orders.colocar_stop_loss_close_position(sl_price)
+        open_orders, stops = await asyncio.gather(self.orders.get_open_orders(), self.orders.get_open_algo_orders())
+        # Como mucho un TP (modificado en el lugar) y un SL (reemplazado sólo si cambia su precio)
+        await self.orders.ensure_take_profits(avg, pos, open_orders, offset=0.0002)
+        sl_price = avg * (1 - self.cfg.STOP_LOSS_PERCENTAGE)
+        await self.orders.ensure_stop_loss(sl_price, stops)
 
-        contexto = self._get_contexto_log()
-        guardar_estado_vivo(contexto)
-        guardar_historico(contexto)
+        self._registrar_contexto(open_orders, stops)
 
-    def _get_contexto_log(self):
+    def _registrar_contexto(self, open_orders=(), stops=()):
+        # Sin disco ni REST en el event loop: el contexto sale de memoria y lo escribe EscritorLogs
+        if not self.persistir_logs:
+            return
+        registrar_contexto(self._contexto_log(open_orders, stops))
+
+    def _contexto_log(self, open_orders=(), stops=()):
+        # El espejo de cuenta, si está al día, refleja ya lo que se acaba de colocar/cancelar
+        if self.cuenta is not None and self.cuenta.sincronizado:
+            open_orders = self.cuenta.ordenes_abiertas()
+            stops = self.cuenta.algos_abiertas()
         try:
             position = {
                 "qty": float(self.state.state.get('posicion_total', 0.0)),
                 "avg": self.state.calcular_costo_promedio(),
                 "fees": float(self.state.state.get('fees_total', 0.0)),
             }
-            open_orders = self.orders.get_open_orders()
             open_orders_min = [
                 {"side": o.get("side"), "price": o.get("price"), "qty": o.get("origQty"), "reduceOnly": o.get("reduceOnly")}
                 for o in open_orders
@@ -263,22 +389,31 @@ class GridBot:
             take_profits_min = [
                 {"price": o.get("price"), "qty": o.get("origQty"), "clientOrderId": o.get("clientOrderId")} for o in take_profits
             ]
-            stop_loss = next((o for o in open_orders if o.get("side") == "SELL" and o.get("type", "") == "STOP_MARKET"), {})
+            stop_loss = next((a for a in stops if a.get("side") == "SELL" and a.get("orderType", "") == "STOP_MARKET"), {})
             contexto = {
-                "timestamp": datetime.now(UTC).isoformat(),
-                "signal": self.last_signal,
+                "timestamp": datetime.fromtimestamp(reloj.ahora(), UTC).isoformat(),
+                "signal": self.senal_grid,
                 "last_price": self.last_price,
                 "position": position,
                 "open_orders": open_orders_min,
                 "take_profits": take_profits_min,
-                "stop_loss": {"price": stop_loss.get("stopPrice")},
+                "stop_loss": {"price": stop_loss.get("triggerPrice")},
+                # Resúmenes O(1) de las barras: la serie que decide spacing/rango y todas las demás
+                "volatilidad": self._resumen_volatilidad(),
+                "barras": self.barras.resumen(),
                 "bot_version": BOT_VERSION,
-                "symbol": SYMBOL,
+                "symbol": self.symbol,
             }
         except Exception as e:
-            contexto = {"error": str(e), "timestamp": datetime.now(UTC).isoformat()}
+            contexto = {"error": str(e), "timestamp": datetime.fromtimestamp(reloj.ahora(), UTC).isoformat()}
         return contexto
 
+    def _resumen_volatilidad(self):
+        serie = self.barras.serie(self.cfg.VOLATILIDAD_BARRA)
+        if serie is None:
+            return {}
+        return dict(serie.resumen(), barra=etiqueta(self.cfg.VOLATILIDAD_BARRA))
+
     # --- NUEVA TAREA POST-TP ---
     async def chequeo_post_tp(self):
         while True:
@@ -289,31 +424,158 @@ class GridBot:
                     precio_actual = self.last_price
                     if precio_actual and abs(precio_actual - self.last_tp_price)/self.last_tp_price > 0.0015:
                         print("[TP GRID] El precio se alejó >0.15% del TP, reestableciendo el grid.")
-                        await self._rebalance_si_corresponde()
+                        self.scheduler.solicitar()
                         # Resetea para no repetir
                         self.last_tp_price = None
                         self.last_tp_time = None
 
-    async def run(self):
+    async def arrancar(self):
+        if self.orders is None:
+            await self.iniciar_cliente()
+        if self.cuenta is not None and not self.cuenta.sincronizado:
+            # Órdenes, posición y balance en paralelo (ver AccountMirror.sincronizar)
+            await self.cuenta.sincronizar()
+            self._marcar_arranque('cuenta')
         await self.proteger_posicion_existente()
+        # Desde aquí un hueco del USER stream se recupera con userTrades
+        self._user_desde_ms = reloj.ahora_ms()
+        self._marcar_arranque('posicion')
         # Inicia la tarea de chequeo post-TP
-        asyncio.create_task(self.chequeo_post_tp())
-        ws = WebSocketManager()
-        async def handler(msg, tipo):
+        self._tareas.append(asyncio.create_task(self.chequeo_post_tp()))
+        if self.cuenta is not None:
+            # Contraste periódico del espejo con REST
+            self._tareas.append(asyncio.create_task(self.cuenta.run()))
+        # El rebalanceo corre en su propia tarea; los handlers sólo lo solicitan
+        self._tareas.append(asyncio.create_task(self.scheduler.run()))
+        self._tareas.append(asyncio.create_task(self.proteccion.run()))
+
+    def detener(self):
+        self.scheduler.stop()
+        self.proteccion.stop()
+        for t in self._tareas:
+            t.cancel()
+        self._tareas = []
+
+
+class GridBot:
+    """
+    N símbolos en un solo event loop: un SymbolGrid por par sobre un único cliente
+    REST (una sesión HTTP y un presupuesto de rate limit para toda la cuenta) y una
+    única conexión WebSocket multiplexada, con el ruteo por (símbolo, tipo).
+    """
+
+    def __init__(self, symbols=None, client=None, puerto_metricas=METRICS_PORT):
+        self.symbols = [s.upper() for s in (symbols or SYMBOLS)]
+        self.client = client  # el supervisor inyecta un ClienteRemoto (REST vía el gateway)
+        self.puerto_metricas = puerto_metricas  # 0: sin endpoint /metrics
+        self.grids = {s: SymbolGrid(s) for s in self.symbols}
+        self._tareas = []
+
+        # Retraso máximo del event loop observado en la ventana actual (segundos)
+        self.loop_lag_max = 0.0
+
+        # Línea de tiempo del arranque (común a todos los símbolos)
+        self.arranque = {}
+        self._arranque_t0 = None
+
+    def _marcar_arranque(self, etapa):
+        if self._arranque_t0 is None or etapa in self.arranque:
+            return
+        ms = (reloj.monotonic() - self._arranque_t0) * 1000
+        self.arranque[etapa] = round(ms, 1)
+        print(f"[STARTUP] +{ms:.0f}ms {etapa}")
+
+    # --- DIAGNÓSTICO: retraso del event loop ---
+    async def monitor_lag_event_loop(self):
+        loop = asyncio.get_running_loop()
+        ultimo_reporte = loop.time()
+        while True:
+            inicio = loop.time()
+            await asyncio.sleep(LOOP_LAG_CHECK_SECONDS)
+            ahora = loop.time()
+            lag = ahora - inicio - LOOP_LAG_CHECK_SECONDS
+            metrics.LAG_LOOP.observar(max(0.0, lag))
+            if lag > self.loop_lag_max:
+                self.loop_lag_max = lag
+                metrics.LAG_LOOP_MAX.set(lag)
+            if ahora - ultimo_reporte >= LOOP_LAG_REPORT_SECONDS:
+                print(f"[LOOP] Retraso máximo del event loop: {self.loop_lag_max*1000:.1f} ms")
+                self.loop_lag_max = 0.0
+                metrics.LAG_LOOP_MAX.set(0.0)
+                ultimo_reporte = ahora
+
+    async def procesar_user(self, msg):
+        # ORDER_TRADE_UPDATE / ALGO_UPDATE van al grid de su símbolo; ACCOUNT_UPDATE a todos (cada espejo filtra el suyo)
+        if msg.get('e') in EVENTOS_DE_ORDEN:
+            grid = self.grids.get(msg.get('o', {}).get('s'))
+            if grid is not None:
+                await grid.procesar_user(msg)
+            return
+        for grid in self.grids.values():
+            await grid.procesar_user(msg)
+
+    async def run(self, fuente=None):
+        """
+        `fuente(ws, handler)` entrega los mensajes de los streams; por defecto
+        ws.start_all (conexión propia). Los workers del supervisor los reciben del ingest.
+        """
+        self._arranque_t0 = reloj.monotonic()
+        if self.client is None:
+            self.client = await obtener_cliente()
+        self._marcar_arranque('cliente')
+        for grid in self.grids.values():
+            grid._arranque_t0 = self._arranque_t0
+            if grid.client is None:
+                grid.client = self.client.para_simbolo(grid.symbol)
+            await grid.iniciar_cliente()
+        print(f"[INFO] {len(self.grids)} símbolos en un proceso: {', '.join(self.symbols)}")
+
+        ws = WebSocketManager(self.client, symbols=self.symbols)
+        ws.order_books = {s: g.order_book for s, g in self.grids.items()}
+        ws.cuentas = {s: g.cuenta for s, g in self.grids.items() if g.cuenta is not None}
+        ws.recuperadores = {s: g.recuperar_user for s, g in self.grids.items() if g.cuenta is not None}
+        rutas = {}
+        for s, g in self.grids.items():
+            rutas[('TRADE', s)] = g.procesar_trade
+            rutas[('DEPTH', s)] = g.procesar_depth
+            rutas[('TICKER', s)] = g.procesar_ticker
+        rutas[('USER', None)] = self.procesar_user
+
+        async def handler(msg, tipo, symbol):
+            self._marcar_arranque(f'primer_{tipo}')
+            simbolo = symbol or ''
+            metrics.MENSAJES.inc(tipo, simbolo)
+            t_evento = msg.get('E') or msg.get('T')
+            if t_evento:
+                metrics.LATENCIA_EVENTO.observar(max(0.0, reloj.ahora_ms() - int(t_evento)) / 1000, tipo, simbolo)
+            t0 = time.perf_counter()
             try:
-                if tipo == 'TRADE':
-                    await self.procesar_trade(msg)
-                elif tipo == 'DEPTH':
-                    await self.procesar_depth(msg)
-                elif tipo == 'TICKER':
-                    await self.procesar_ticker(msg)
-                elif tipo == 'USER':
-                    await self.procesar_user(msg)
+                h = rutas.get((tipo, symbol))
+                if h is not None:
+                    await h(msg)
             except Exception as e:
-                print(f"[ERROR] Handler {tipo}: {e}")
-        await ws.start_all(handler)
+                print(f"[ERROR] Handler {tipo} {simbolo}: {e}")
+            finally:
+                metrics.DURACION_HANDLER.observar(time.perf_counter() - t0, tipo, simbolo)
+        # listenKey y conexión de streams en paralelo con la sincronización de cuentas
+        fuente = fuente or WebSocketManager.start_all
+        streams = asyncio.create_task(fuente(ws, handler))
+        self._tareas.append(asyncio.create_task(self.monitor_lag_event_loop()))
+        if self.puerto_metricas:
+            self._tareas.append(asyncio.create_task(metrics.servir(port=self.puerto_metricas)))
+        try:
+            await asyncio.gather(*(g.arrancar() for g in self.grids.values()))
+            await streams
+        finally:
+            streams.cancel()
+            for t in self._tareas:
+                t.cancel()
+            for g in self.grids.values():
+                g.detener()
+            cerrar_escritor()
+            await cerrar_cliente()
 
 if __name__ == "__main__":
-    print("[BOT] Iniciando ETH Grid Bot Dinámico...")
+    print(f"[BOT] Iniciando Grid Bot Dinámico ({', '.join(SYMBOLS)})...")
     bot = GridBot()
     asyncio.run(bot.run())
\ No newline at end of file
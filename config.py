@@ -1,13 +1,26 @@
+import os
+from types import SimpleNamespace
+
 API_KEY = ''
 API_SECRET = ''
 
 
-SYMBOL = 'ETHUSDT'
+SYMBOL = 'ETHUSDT'  # Par principal: conserva los nombres de archivo de estado/logs de siempre
 LEVERAGE = 10
+SYMBOLS = [SYMBOL]  # Pares operados en el mismo proceso (una conexión WS, una sesión REST, un presupuesto de rate limit)
+SYMBOL_OVERRIDES = {
+    # 'BTCUSDT': {'ORDER_USDT_SIZE': 20, 'LEVERAGE': 5, 'MIN_GRID_SPACING': 0.0008},
+}
 
 # Entorno
 PAPER_MODE = False   # Simulación: no llama endpoints privados ni coloca órdenes reales
 USE_TESTNET = False # Para operar en testnet cuando PAPER_MODE=False y tengas claves de testnet
+REST_FAPI_URL = None  # Override del endpoint REST de futuros (ej. 'http://127.0.0.1:8080/fapi' para mock_exchange.py)
+WS_FAPI_URL = None    # Override de la base de WebSocket de futuros (ej. 'ws://127.0.0.1:8080' para mock_exchange.py)
+WS_MODE = 'combined'  # 'combined' (/stream?streams=...), 'subscribe' (SUBSCRIBE en un socket) o 'separate' (un socket por stream)
+WS_RECONNECT_BASE_SECONDS = 0.5  # Primer reintento tras un error de WS (backoff exponencial con jitter)
+WS_RECONNECT_MAX_SECONDS = 30    # Tope del backoff; un cierre limpio reconecta sin espera
+LISTEN_KEY_KEEPALIVE_SECONDS = 30 * 60  # Keepalive del listenKey (vence a los 60 min sin keepalive)
 
 # Grid settings
 GRID_RANGE_MIN = 0.0033   # 6%
@@ -16,6 +29,10 @@ MIN_GRID_SPACING = 0.0011   # 0.3%
 MAX_GRID_SPACING = 0.0039  # 0.75%
 ORDER_USDT_SIZE = 10    # Capital por orden (se multiplica por leverage implícitamente)
 REBALANCE_SECONDS = 180
+REBALANCE_DEBOUNCE_SECONDS = 0.25  # Agrupa ráfagas de solicitudes de rebalanceo
+FILL_COALESCE_SECONDS = 0.1  # Ventana que agrupa los fills de una ráfaga en una sola actualización de TP/SL
+GRID_BATCH_SIZE = 5          # Órdenes por request batchOrders (máximo Binance: 5)
+GRID_BATCH_CONCURRENCY = 4   # Requests batchOrders en vuelo simultáneamente
 
 # Take profit
 MIN_PROFIT_THRESHOLD = 0.0027  # 0.30% target p
@@ -25,8 +42,78 @@ TP_OFFSET_HIGH = (0.0002, 0.0003)
 
 STOP_LOSS_PERCENTAGE = 0.039
 
+# Señal DUMP (flujo de trades en ventana deslizante)
+TRADE_WINDOW_MS = 2000          # Ventana de la señal
+TRADE_WINDOW_CAPACITY = 300     # Máximo de trades considerados en la ventana
+DUMP_MIN_TRADES_PER_SEC = 15    # Frecuencia mínima (trades/s) para DUMP
+DUMP_MIN_SELL_VOLUME = 10       # Volumen vendedor mínimo en la ventana para DUMP
+
+# Libro local (order_book.py)
+BOOK_MARGEN_NIVELES = 100  # Niveles por lado conservados más allá de la profundidad del snapshot
+
+# Barras OHLCV del stream @trade (barras.py) y volatilidad para spacing/rango
+BARRAS_INTERVALOS = (1, 60, 300)  # Barras de tiempo (segundos)
+BARRAS_VOLUMEN = 50               # Volumen (moneda base) por barra de volumen; 0 las desactiva
+BARRAS_CAPACIDAD = 300            # Barras cerradas guardadas por serie (buffer circular)
+BARRAS_VENTANA = 14               # Barras de la ATR (Wilder), la volatilidad realizada y el VWAP
+VOLATILIDAD_BARRA = 60            # Serie (segundos) cuya ATR relativa usan spacing y rango
+SPACING_ATR_MULT = 2.5            # Sin señal: spacing = mult × ATR/precio, acotado a [MIN, MAX]; 0 = punto medio
+RANGO_ATR_MULT = 10               # Sin señal: rango = mult × ATR/precio, acotado a [MIN, MAX]; 0 = punto medio
+
 MAKER_FEE_RATE = 0.0002
+TAKER_FEE_RATE = 0.0004
 
 SAFE_SPREAD = 0.001  # 0.1%: spread mínimo para que la orden de compra realmente mejore el promedio de entrada
 
 STATE_FILE = "state.json"
+STATE_JOURNAL_COMPACT_BYTES = 256 * 1024  # Tamaño del journal de fills que dispara la compactación
+STATE_JOURNAL_FSYNC = True                # fsync por fill (durabilidad ante crash)
+
+ACCOUNT_RESYNC_SECONDS = 300  # Cada cuánto se contrasta el espejo de cuenta (órdenes/posición/balance) con REST
+USER_GAP_MARGIN_MS = 1000     # Margen hacia atrás desde el último evento USER al pedir los fills perdidos (dedup por id)
+
+EXCHANGE_CACHE_FILE = "data/exchange_cache.json"  # Filtros del símbolo, rateLimits y leverage aplicado
+EXCHANGE_CACHE_TTL_SECONDS = 24 * 3600           # Vigencia del cache antes de volver a pedir exchangeInfo
+
+# Rate limits REST (se ajustan con los rateLimits de exchangeInfo al arrancar)
+RATE_LIMIT_WEIGHT_1M = 2400     # Peso de requests por minuto (X-MBX-USED-WEIGHT-1M)
+RATE_LIMIT_ORDERS_10S = 300     # Órdenes cada 10 segundos (X-MBX-ORDER-COUNT-10S)
+RATE_LIMIT_ORDERS_1M = 1200     # Órdenes por minuto (X-MBX-ORDER-COUNT-1M)
+RATE_LIMIT_USO_MAX = 0.9        # Fracción de cada límite que el bot se permite usar
+RATE_LIMIT_GRID_ESPERA_MAX = 5  # Segundos que una orden del grid espera margen antes de descartarse
+
+# Supervisor multiproceso (supervisor.py): ingest de streams, gateway REST y workers de grid
+SUPERVISOR_WORKERS = 0                 # Procesos de grid; 0 = uno por núcleo libre (sin pasar de un símbolo por worker)
+SUPERVISOR_IPC_DIR = "data/ipc"        # Sockets Unix entre procesos
+SUPERVISOR_CHECK_SECONDS = 2           # Periodo del chequeo de salud
+SUPERVISOR_HEARTBEAT_TIMEOUT = 20      # Segundos sin latido antes de matar y reiniciar un proceso
+SUPERVISOR_RESTART_BACKOFF_MAX = 60    # Espera máxima entre reinicios de un proceso que cae en bucle
+
+# Logs (data/log_estado*.json y data/historico*)
+LOG_FLUSH_SECONDS = 1.0   # Cada cuánto el escritor en segundo plano baja los logs a disco
+LOG_BATCH_MAX = 500       # Filas pendientes que adelantan el flush
+LOG_QUEUE_MAX = 10000     # Tope de la cola; con la cola llena se descartan filas del histórico
+
+# Métricas (GET /metrics en formato de texto de Prometheus)
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9108  # 0 desactiva el endpoint; los workers del supervisor usan METRICS_PORT + 1 + índice
+
+# Diagnóstico
+LOOP_LAG_CHECK_SECONDS = 0.5   # Periodo de muestreo del retraso del event loop
+LOOP_LAG_REPORT_SECONDS = 60   # Cada cuánto se imprime el retraso máximo observado
+
+
+def ajustes_simbolo(symbol):
+    """Constantes de este archivo para `symbol`, con SYMBOL_OVERRIDES aplicado encima."""
+    ajustes = {k: v for k, v in globals().items() if k.isupper()}
+    ajustes.update(SYMBOL_OVERRIDES.get(symbol, {}))
+    ajustes['SYMBOL'] = symbol
+    return SimpleNamespace(**ajustes)
+
+
+def ruta_simbolo(path, symbol):
+    """El par principal usa `path` tal cual; los demás agregan _<SYMBOL> al nombre."""
+    if symbol == SYMBOL:
+        return path
+    raiz, ext = os.path.splitext(path)
+    return f"{raiz}_{symbol}{ext}"
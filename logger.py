@@ -1,35 +1,421 @@
-import json
-import csv
-import os
-from datetime import datetime
-
-LOG_ESTADO_PATH = "data/log_estado.json"
-LOG_HISTORICO_PATH = "data/log_historico.csv"
-
-def guardar_estado_vivo(contexto):
-    with open(LOG_ESTADO_PATH, "w") as f:
-        json.dump(contexto, f, indent=2, default=str)
-
-def guardar_historico(contexto):
-    existe = os.path.exists(LOG_HISTORICO_PATH)
-    with open(LOG_HISTORICO_PATH, "a", newline="") as f:
-        writer = csv.writer(f)
-        if not existe:
-            # header
-            writer.writerow([
-                "timestamp","signal","last_price","position_qty","position_avg","fees",
-                "open_orders","take_profits","stop_loss","bot_version","symbol"
-            ])
-        writer.writerow([
-            contexto["timestamp"],
-            contexto.get("signal"),
-            contexto.get("last_price"),
-            contexto.get("position", {}).get("qty"),
-            contexto.get("position", {}).get("avg"),
-            contexto.get("position", {}).get("fees"),
-            json.dumps(contexto.get("open_orders", [])),
-            json.dumps(contexto.get("take_profits", [])),
-            contexto.get("stop_loss", {}).get("price"),
-            contexto.get("bot_version", "v1"),
-            contexto.get("symbol", "ETHUSDT"),
-        ])
\ No newline at end of file
+import atexit
+import json
+import os
+import queue
+import threading
+from array import array
+from datetime import datetime
+
+from config import SYMBOL, LOG_FLUSH_SECONDS, LOG_QUEUE_MAX, LOG_BATCH_MAX, ruta_simbolo
+
+LOG_ESTADO_PATH = "data/log_estado.json"
+LOG_HISTORICO_PATH = "data/log_historico.csv"  # formato anterior (sólo lectura en analyze_grid_log)
+HISTORICO_DIR = "data/historico"
+HISTORICO_CHUNK_SECONDS = 6 * 3600  # Cada chunk cubre una franja alineada de 6 horas
+
+# Columnas de ancho fijo: (nombre, typecode de array)
+COLUMNAS = (
+    ("ts", "q"),              # ms epoch
+    ("last_price", "d"),
+    ("position_qty", "d"),
+    ("position_avg", "d"),
+    ("fees", "d"),
+    ("stop_loss", "d"),       # NaN si no hay SL
+    ("signal", "B"),          # código de SENALES
+    ("signal_price", "d"),    # precio/volumen de SOPORTE, NaN si no aplica
+    ("signal_volume", "d"),
+    ("n_orders", "I"),
+    ("atr", "d"),             # ATR/precio de la serie de barras de la estrategia, NaN sin barras suficientes
+    ("volatilidad", "d"),     # volatilidad realizada por barra de esa serie
+    ("vwap", "d"),            # VWAP de la ventana de barras
+)
+# Tabla hija: una fila por orden abierta, referenciando la fila del chunk
+COLUMNAS_ORDENES = (
+    ("fila", "I"),
+    ("side", "B"),            # 0 BUY, 1 SELL
+    ("price", "d"),
+    ("qty", "d"),
+    ("reduce_only", "B"),
+)
+SENALES = (None, "DUMP", "SOPORTE")
+SENAL_OTRA = 255
+NAN = float("nan")
+
+
+def guardar_estado_vivo(contexto):
+    # Un archivo por símbolo: el principal conserva LOG_ESTADO_PATH
+    path = ruta_simbolo(LOG_ESTADO_PATH, contexto.get("symbol") or SYMBOL)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    _escribir_json_atomico(path, contexto)
+
+
+def _num(x):
+    try:
+        return NAN if x is None or x == "" else float(x)
+    except (TypeError, ValueError):
+        return NAN
+
+
+def _ts_ms(ts):
+    try:
+        return int(datetime.fromisoformat(str(ts)).timestamp() * 1000)
+    except ValueError:
+        return 0
+
+
+def _codificar_senal(signal):
+    if isinstance(signal, dict):
+        tipo = signal.get("tipo")
+        codigo = SENALES.index(tipo) if tipo in SENALES else SENAL_OTRA
+        return codigo, _num(signal.get("precio")), _num(signal.get("volumen"))
+    if signal in SENALES:
+        return SENALES.index(signal), NAN, NAN
+    return SENAL_OTRA, NAN, NAN
+
+
+def _escribir_json_atomico(path, data):
+    # Un lector nunca ve el archivo a medio escribir
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2, default=str)
+    os.replace(tmp, path)
+
+
+class HistoricoColumnar:
+    """
+    Histórico en columnas binarias de ancho fijo (una por archivo, append puro) y
+    órdenes normalizadas en una tabla hija. Los archivos se agrupan en chunks por
+    franja de tiempo; index.json lista los chunks para leer sólo el rango pedido.
+    """
+
+    def __init__(self, directorio=HISTORICO_DIR, chunk_seconds=HISTORICO_CHUNK_SECONDS):
+        self.directorio = directorio
+        self.chunk_ms = int(chunk_seconds * 1000)
+        self.index_path = os.path.join(directorio, "index.json")
+        self.chunk = None       # inicio (ms) del chunk abierto
+        self.filas = 0
+        self._archivos = {}
+        self._index = None
+
+    def _cargar_index(self):
+        if self._index is None:
+            self._index = leer_index(self.directorio)
+        return self._index
+
+    def _cerrar_chunk(self):
+        for f in self._archivos.values():
+            f.close()
+        self._archivos = {}
+        self.chunk = None
+
+    def _reparar_chunk(self, ruta):
+        """Recorta columnas desparejas y órdenes huérfanas que deja un crash a mitad de fila."""
+        tam = {c: array(t).itemsize for c, t in COLUMNAS}
+        paths = {c: os.path.join(ruta, c + ".bin") for c, _ in COLUMNAS}
+        if not os.path.exists(paths["ts"]):
+            return
+        # Columnas agregadas después de crear el chunk: vacías (NaN/0) para las filas ya escritas
+        filas_ts = os.path.getsize(paths["ts"]) // tam["ts"]
+        for c, t in COLUMNAS:
+            if not os.path.exists(paths[c]):
+                with open(paths[c], "wb") as f:
+                    f.write(array(t, [NAN if t == "d" else 0]).tobytes() * filas_ts)
+        n = min(os.path.getsize(p) // tam[c] if os.path.exists(p) else 0 for c, p in paths.items())
+        for c, p in paths.items():
+            if os.path.exists(p) and os.path.getsize(p) > n * tam[c]:
+                os.truncate(p, n * tam[c])
+        path_fila = os.path.join(ruta, "ordenes.fila.bin")
+        if not os.path.exists(path_fila):
+            return
+        filas = array("I")
+        with open(path_fila, "rb") as f:
+            filas.frombytes(f.read())
+        m = len(filas)
+        while m and filas[m - 1] >= n:
+            m -= 1
+        for c, t in COLUMNAS_ORDENES:
+            p = os.path.join(ruta, "ordenes." + c + ".bin")
+            size = array(t).itemsize
+            if os.path.exists(p) and os.path.getsize(p) > m * size:
+                os.truncate(p, m * size)
+
+    def _abrir_chunk(self, inicio, contexto):
+        self._cerrar_chunk()
+        nombre = str(inicio)
+        ruta = os.path.join(self.directorio, nombre)
+        os.makedirs(ruta, exist_ok=True)
+        self._reparar_chunk(ruta)
+        for col, _ in COLUMNAS:
+            self._archivos[col] = open(os.path.join(ruta, col + ".bin"), "ab")
+        for col, _ in COLUMNAS_ORDENES:
+            self._archivos["ordenes." + col] = open(os.path.join(ruta, "ordenes." + col + ".bin"), "ab")
+        # Reapertura tras reinicio: continuar la numeración de filas del chunk
+        self.filas = self._archivos["ts"].tell() // 8
+        self.chunk = inicio
+
+        index = self._cargar_index()
+        if not any(c["chunk"] == nombre for c in index["chunks"]):
+            index["chunks"].append({
+                "chunk": nombre,
+                "desde": inicio,
+                "hasta": inicio + self.chunk_ms,
+                "symbol": contexto.get("symbol"),
+                "bot_version": contexto.get("bot_version"),
+            })
+            index["chunks"].sort(key=lambda c: c["desde"])
+            _escribir_json_atomico(self.index_path, index)
+
+    def agregar(self, contexto):
+        self.agregar_lote([contexto])
+
+    def agregar_lote(self, contextos):
+        """Varias filas con un solo write por columna (y por chunk) en lugar de uno por fila."""
+        cols, cols_ordenes = self._buffers()
+        for contexto in contextos:
+            ts = _ts_ms(contexto.get("timestamp"))
+            inicio = ts - ts % self.chunk_ms
+            if self.chunk != inicio:
+                self._escribir(cols, cols_ordenes)
+                self._abrir_chunk(inicio, contexto)
+                cols, cols_ordenes = self._buffers()
+
+            position = contexto.get("position") or {}
+            volatilidad = contexto.get("volatilidad") or {}
+            signal, signal_price, signal_volume = _codificar_senal(contexto.get("signal"))
+            ordenes = contexto.get("open_orders") or []
+            fila = (
+                ts,
+                _num(contexto.get("last_price")),
+                _num(position.get("qty")),
+                _num(position.get("avg")),
+                _num(position.get("fees")),
+                _num((contexto.get("stop_loss") or {}).get("price")),
+                signal,
+                signal_price,
+                signal_volume,
+                len(ordenes),
+                _num(volatilidad.get("atr")),
+                _num(volatilidad.get("volatilidad")),
+                _num(volatilidad.get("vwap")),
+            )
+            for o in ordenes:
+                cols_ordenes["fila"].append(self.filas)
+                cols_ordenes["side"].append(1 if o.get("side") == "SELL" else 0)
+                cols_ordenes["price"].append(_num(o.get("price")))
+                cols_ordenes["qty"].append(_num(o.get("qty")))
+                cols_ordenes["reduce_only"].append(1 if o.get("reduceOnly") in (True, "true", "True") else 0)
+            for (col, _), valor in zip(COLUMNAS, fila):
+                cols[col].append(valor)
+            self.filas += 1
+        self._escribir(cols, cols_ordenes)
+
+    @staticmethod
+    def _buffers():
+        return {c: array(t) for c, t in COLUMNAS}, {c: array(t) for c, t in COLUMNAS_ORDENES}
+
+    def _escribir(self, cols, cols_ordenes):
+        if not len(cols["ts"]):
+            return
+        # Órdenes primero: un lector sólo ve la fila (columna ts) cuando sus órdenes ya están
+        for c, valores in cols_ordenes.items():
+            if len(valores):
+                f = self._archivos["ordenes." + c]
+                f.write(valores.tobytes())
+                f.flush()
+        for col, _ in reversed(COLUMNAS):
+            f = self._archivos[col]
+            f.write(cols[col].tobytes())
+            f.flush()
+
+    def close(self):
+        self._cerrar_chunk()
+
+
+_historicos = {}  # símbolo -> HistoricoColumnar (directorio propio por símbolo)
+
+
+def _historico(symbol):
+    historico = _historicos.get(symbol)
+    if historico is None:
+        historico = _historicos[symbol] = HistoricoColumnar(ruta_simbolo(HISTORICO_DIR, symbol))
+    return historico
+
+
+def guardar_historico(contexto):
+    _historico(contexto.get("symbol") or SYMBOL).agregar(contexto)
+
+
+class EscritorLogs:
+    """
+    Escritura de logs fuera del event loop: un hilo vacía cada `flush_seconds`
+    (o antes, si se juntan `batch_max` filas) una cola acotada. Del estado vivo
+    sólo importa el último contexto de cada símbolo; las filas del histórico se
+    agrupan en un append por columna. Con la cola llena se descartan filas nuevas
+    en lugar de bloquear al bot.
+    """
+
+    def __init__(self, flush_seconds=LOG_FLUSH_SECONDS, max_cola=LOG_QUEUE_MAX, batch_max=LOG_BATCH_MAX):
+        self.flush_seconds = float(flush_seconds)
+        self.batch_max = int(batch_max)
+        self._cola = queue.Queue(maxsize=max_cola)  # filas pendientes del histórico
+        self._estados = {}                          # símbolo -> último contexto sin escribir
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._detener = False
+        self._hilo = None
+        self.descartadas = 0
+        self.escritas = 0
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._run, name="escritor-logs", daemon=True)
+        self._hilo.start()
+        atexit.register(self.cerrar)
+
+    def encolar(self, contexto):
+        symbol = contexto.get("symbol") or SYMBOL
+        with self._lock:
+            self._estados[symbol] = contexto
+        try:
+            self._cola.put_nowait(contexto)
+        except queue.Full:
+            self.descartadas += 1
+        if self._cola.qsize() >= self.batch_max:
+            self._despertar.set()
+
+    def _run(self):
+        while not self._detener:
+            self._despertar.wait(self.flush_seconds)
+            self._despertar.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[LOG] Error al escribir logs: {e}")
+
+    def flush(self):
+        with self._lock:
+            estados, self._estados = self._estados, {}
+        filas = {}
+        while True:
+            try:
+                contexto = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            filas.setdefault(contexto.get("symbol") or SYMBOL, []).append(contexto)
+        # Primero el histórico (las filas ya salieron de la cola); cada escritura falla por separado
+        for symbol, contextos in filas.items():
+            try:
+                _historico(symbol).agregar_lote(contextos)
+                self.escritas += len(contextos)
+            except Exception as e:
+                print(f"[LOG] Error al escribir el histórico de {symbol} ({len(contextos)} filas): {e}")
+        for symbol, contexto in estados.items():
+            try:
+                guardar_estado_vivo(contexto)
+            except Exception as e:
+                print(f"[LOG] Error al escribir el estado vivo de {symbol}: {e}")
+
+    def cerrar(self):
+        if self._hilo is None:
+            return
+        self._detener = True
+        self._despertar.set()
+        self._hilo.join()
+        self._hilo = None
+        self.flush()
+        if self.descartadas:
+            print(f"[LOG] {self.descartadas} filas del histórico descartadas por cola llena")
+
+
+_escritor = None
+
+
+def registrar_contexto(contexto):
+    """Estado vivo + fila del histórico, escritos en segundo plano por EscritorLogs."""
+    global _escritor
+    if _escritor is None:
+        _escritor = EscritorLogs()
+        _escritor.iniciar()
+    _escritor.encolar(contexto)
+
+
+def cerrar_escritor():
+    global _escritor
+    escritor, _escritor = _escritor, None
+    if escritor is not None:
+        escritor.cerrar()
+
+
+# --- lectura ---
+def leer_index(directorio=HISTORICO_DIR):
+    path = os.path.join(directorio, "index.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"version": 1, "chunks": []}
+
+
+def _leer_columnas(ruta, columnas, prefijo=""):
+    import numpy as np
+    datos = {}
+    faltantes = []
+    for col, tipo in columnas:
+        path = os.path.join(ruta, prefijo + col + ".bin")
+        if os.path.exists(path):
+            datos[col] = np.fromfile(path, dtype=tipo)
+        else:
+            faltantes.append((col, tipo))
+    # Un crash a mitad de fila deja columnas desparejas: recortar a la más corta
+    n = min((len(v) for v in datos.values()), default=0)
+    datos = {c: v[:n] for c, v in datos.items()}
+    # Columnas que el chunk no tiene (anterior a ellas): NaN o 0
+    for col, tipo in faltantes:
+        datos[col] = np.full(n, np.nan) if tipo == "d" else np.zeros(n, dtype=tipo)
+    return {col: datos[col] for col, _ in columnas}
+
+
+def leer_historico(desde=None, hasta=None, directorio=HISTORICO_DIR):
+    """
+    Devuelve (filas, ordenes) como DataFrames con las filas de [desde, hasta)
+    (datetime o ms epoch). Sólo se abren los chunks que solapan el rango.
+    """
+    import numpy as np
+    import pandas as pd
+
+    def a_ms(x):
+        if x is None:
+            return None
+        if isinstance(x, datetime):
+            return int(x.timestamp() * 1000)
+        return int(x)
+
+    desde, hasta = a_ms(desde), a_ms(hasta)
+    partes, partes_ordenes = [], []
+    for c in leer_index(directorio)["chunks"]:
+        if desde is not None and c["hasta"] <= desde:
+            continue
+        if hasta is not None and c["desde"] >= hasta:
+            continue
+        ruta = os.path.join(directorio, c["chunk"])
+        filas = _leer_columnas(ruta, COLUMNAS)
+        ordenes = _leer_columnas(ruta, COLUMNAS_ORDENES, "ordenes.")
+        ts = filas["ts"]
+        # ts es creciente dentro del chunk: el rango se resuelve por búsqueda binaria
+        i0 = 0 if desde is None else int(np.searchsorted(ts, desde, side="left"))
+        i1 = len(ts) if hasta is None else int(np.searchsorted(ts, hasta, side="left"))
+        df = pd.DataFrame({k: v[i0:i1] for k, v in filas.items()})
+        df["chunk"] = c["chunk"]
+        df["fila"] = np.arange(i0, i1, dtype=np.uint32)
+        df["symbol"] = c.get("symbol")
+        df["bot_version"] = c.get("bot_version")
+        partes.append(df)
+        sel = (ordenes["fila"] >= i0) & (ordenes["fila"] < i1)
+        dfo = pd.DataFrame({k: v[sel] for k, v in ordenes.items()})
+        dfo["chunk"] = c["chunk"]
+        partes_ordenes.append(dfo)
+
+    filas = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=[c for c, _ in COLUMNAS])
+    ordenes = pd.concat(partes_ordenes, ignore_index=True) if partes_ordenes else pd.DataFrame(columns=[c for c, _ in COLUMNAS_ORDENES])
+    filas["timestamp"] = pd.to_datetime(filas["ts"], unit="ms", utc=True)
+    filas["signal_nombre"] = [SENALES[s] if s < len(SENALES) else "OTRA" for s in filas["signal"]]
+    ordenes["side"] = np.where(ordenes["side"] == 1, "SELL", "BUY") if len(ordenes) else ordenes["side"]
+    return filas, ordenes
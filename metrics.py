@@ -0,0 +1,197 @@
+"""
+Métricas del bot en memoria (histogramas, contadores, gauges) expuestas en
+formato de texto de Prometheus por un endpoint HTTP local: GET /metrics.
+Registrar es O(1) y sin I/O, se puede llamar desde cualquier handler.
+"""
+import asyncio
+import bisect
+import math
+
+from config import METRICS_HOST, METRICS_PORT
+
+# Límites (segundos) para latencias: de 0.5ms a 10s
+BUCKETS_LATENCIA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_ORDENES = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(nombres, valores):
+    if not nombres:
+        return ""
+    return "{" + ",".join(f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)) + "}"
+
+
+def _fmt(x):
+    if x == math.inf:
+        return "+Inf"
+    return repr(float(x)) if isinstance(x, float) else str(x)
+
+
+class _Metrica:
+    tipo = None
+    sufijo = ""  # Sufijo del nombre de la muestra, el mismo en HELP/TYPE
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.series = {}  # valores de etiquetas -> estado de la serie
+
+    def _clave(self, valores):
+        if len(valores) != len(self.etiquetas):
+            raise ValueError(f"{self.nombre}: se esperaban etiquetas {self.etiquetas}")
+        return tuple(valores)
+
+    def exponer(self):
+        familia = self.nombre + self.sufijo
+        lineas = [f"# HELP {familia} {self.ayuda}", f"# TYPE {familia} {self.tipo}"]
+        for clave in sorted(self.series, key=lambda c: tuple(map(str, c))):
+            lineas.extend(self._lineas(clave, self.series[clave]))
+        return lineas
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+    sufijo = "_total"
+
+    def inc(self, *valores, n=1):
+        clave = self._clave(valores)
+        self.series[clave] = self.series.get(clave, 0) + n
+
+    def valor(self, *valores):
+        return self.series.get(tuple(valores), 0)
+
+    def _lineas(self, clave, valor):
+        return [f"{self.nombre}{self.sufijo}{_etiquetas(self.etiquetas, clave)} {_fmt(valor)}"]
+
+
+class Gauge(_Metrica):
+    tipo = "gauge"
+
+    def set(self, valor, *valores):
+        self.series[self._clave(valores)] = valor
+
+    def _lineas(self, clave, valor):
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_fmt(valor)}"]
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets))
+
+    def observar(self, valor, *valores):
+        clave = self._clave(valores)
+        serie = self.series.get(clave)
+        if serie is None:
+            # Conteo por bucket (no acumulado) + [suma, cantidad]
+            serie = self.series[clave] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        serie[0][bisect.bisect_left(self.buckets, valor)] += 1
+        serie[1] += valor
+        serie[2] += 1
+
+    def cantidad(self, *valores):
+        serie = self.series.get(tuple(valores))
+        return serie[2] if serie else 0
+
+    def _lineas(self, clave, serie):
+        conteos, suma, cantidad = serie
+        nombres = self.etiquetas + ("le",)
+        lineas = []
+        acumulado = 0
+        for limite, n in zip(self.buckets + (math.inf,), conteos):
+            acumulado += n
+            lineas.append(f"{self.nombre}_bucket{_etiquetas(nombres, clave + (_fmt(limite),))} {acumulado}")
+        lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {_fmt(suma)}")
+        lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {cantidad}")
+        return lineas
+
+
+class Registro:
+    def __init__(self):
+        self.metricas = {}
+
+    def _agregar(self, cls, nombre, *args, **kwargs):
+        m = self.metricas.get(nombre)
+        if m is None:
+            m = self.metricas[nombre] = cls(nombre, *args, **kwargs)
+        return m
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._agregar(Contador, nombre, ayuda, etiquetas)
+
+    def gauge(self, nombre, ayuda, etiquetas=()):
+        return self._agregar(Gauge, nombre, ayuda, etiquetas)
+
+    def histograma(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA):
+        return self._agregar(Histograma, nombre, ayuda, etiquetas, buckets)
+
+    def exponer(self):
+        lineas = []
+        for m in self.metricas.values():
+            lineas.extend(m.exponer())
+        return "\n".join(lineas) + "\n"
+
+
+REGISTRO = Registro()
+
+LATENCIA_EVENTO = REGISTRO.histograma(
+    "snipo_evento_latencia_segundos", "Tiempo del evento en el exchange (T/E) hasta el handler", ("tipo", "symbol"))
+DURACION_HANDLER = REGISTRO.histograma(
+    "snipo_handler_duracion_segundos", "Duración del handler por stream", ("tipo", "symbol"))
+MENSAJES = REGISTRO.contador("snipo_mensajes", "Mensajes de stream recibidos", ("tipo", "symbol"))
+RECONEXIONES = REGISTRO.contador("snipo_ws_reconexiones", "Desconexiones de WebSocket", ("stream",))
+RECUPERACION_USER = REGISTRO.histograma(
+    "snipo_user_recuperacion_segundos", "De la reconexión del USER stream a estado y espejo de cuenta consistentes", ("symbol",))
+FILLS_RECUPERADOS = REGISTRO.contador(
+    "snipo_fills_recuperados", "Fills perdidos en un hueco del USER stream y recuperados por REST", ("symbol",))
+LISTEN_KEY_RENOVADO = REGISTRO.contador("snipo_listen_key_renovado", "listenKey renovado por motivo", ("motivo",))
+REST_RTT = REGISTRO.histograma("snipo_rest_rtt_segundos", "Round-trip de requests REST por endpoint", ("endpoint",))
+REST_ERRORES = REGISTRO.contador("snipo_rest_errores", "Errores de la API por endpoint y código", ("endpoint", "codigo"))
+RECHAZOS = REGISTRO.contador("snipo_ordenes_rechazadas", "Órdenes rechazadas por código de error", ("codigo",))
+COLA_LAG = REGISTRO.histograma(
+    "snipo_scheduler_lag_cola_segundos", "De la primera solicitud pendiente al inicio de la ejecución", ("scheduler", "symbol"))
+COALESCIDAS = REGISTRO.contador(
+    "snipo_scheduler_coalescidas", "Solicitudes absorbidas por una ejecución ya pendiente", ("scheduler", "symbol"))
+REBALANCE_DURACION = REGISTRO.histograma("snipo_rebalance_duracion_segundos", "Duración del rebalanceo", ("symbol",))
+REBALANCE_ORDENES = REGISTRO.histograma(
+    "snipo_rebalance_ordenes", "Órdenes creadas + canceladas por rebalanceo", ("symbol",), BUCKETS_ORDENES)
+FILL_A_TP = REGISTRO.histograma(
+    "snipo_fill_a_tp_segundos", "Tiempo del fill en el exchange hasta TP/SL colocados", ("symbol",))
+LAG_LOOP = REGISTRO.histograma("snipo_loop_lag_segundos", "Retraso del event loop por muestra")
+LAG_LOOP_MAX = REGISTRO.gauge("snipo_loop_lag_max_segundos", "Retraso máximo del event loop en la ventana actual")
+
+
+async def _atender(reader, writer):
+    try:
+        linea = await reader.readline()
+        # Descartar headers hasta la línea vacía
+        while (await reader.readline()).strip():
+            pass
+        partes = linea.decode(errors="replace").split()
+        if len(partes) >= 2 and partes[0] == "GET" and partes[1].split("?")[0] == "/metrics":
+            cuerpo = REGISTRO.exponer().encode()
+            estado = "200 OK"
+            tipo = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            cuerpo, estado, tipo = b"not found\n", "404 Not Found", "text/plain"
+        writer.write(f"HTTP/1.1 {estado}\r\nContent-Type: {tipo}\r\nContent-Length: {len(cuerpo)}\r\n"
+                     f"Connection: close\r\n\r\n".encode() + cuerpo)
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def servir(host=METRICS_HOST, port=METRICS_PORT):
+    """Endpoint /metrics en host:port hasta que se cancele la tarea."""
+    server = await asyncio.start_server(_atender, host, port)
+    print(f"[METRICS] http://{host}:{port}/metrics")
+    async with server:
+        await server.serve_forever()
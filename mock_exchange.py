@@ -0,0 +1,691 @@
+"""
+Exchange de futuros USD-M simulado (REST + WebSocket) para pruebas de carga y
+latencia sin Binance. Sirve los endpoints REST que usa AsyncBinanceClient y los
+streams de mercado y USER que usa WebSocketManager, con:
+
+- un MotorMatching por símbolo (prioridad precio-tiempo, TP/SL, eventos USER);
+- latencia inyectada configurable (REST y WS) y errores aleatorios opcionales;
+- límites de peso/órdenes con headers X-MBX-* y 429 + Retry-After al excederlos;
+- feed de mercado sintético (con ráfagas) o replay de una cinta grabada.
+
+Uso:
+  python mock_exchange.py --symbols ETHUSDT,BTCUSDT --precio ETHUSDT=2000,BTCUSDT=60000 --tps 100 --rafaga 400
+  python mock_exchange.py --replay eventos.jsonl --velocidad 10
+y en config.py: REST_FAPI_URL = 'http://127.0.0.1:8080/fapi', WS_FAPI_URL = 'ws://127.0.0.1:8080'.
+GET /mock/stats devuelve contadores y la latencia tick -> orden medida del lado del exchange.
+Fallas a demanda: POST /mock/cortar (cierra los WebSocket; ?limpio=0 sin close frame) y
+POST /mock/expirar (listenKeyExpired: los listenKeys dejan de recibir eventos).
+"""
+import argparse
+import ast
+import asyncio
+import itertools
+import json
+import random
+import secrets
+import time
+
+import numpy as np
+from aiohttp import web, WSMsgType
+
+from backtest import leer_eventos
+from binance_client import DEFAULT_FILTERS
+from config import SYMBOLS, LEVERAGE, RATE_LIMIT_WEIGHT_1M, RATE_LIMIT_ORDERS_10S, RATE_LIMIT_ORDERS_1M
+from order_book import LocalOrderBook
+from sim_exchange import MotorMatching, ErrorExchange
+
+NIVELES_DEPTH = 20           # Niveles por lado del libro sintético
+MAX_COLA_WS = 10000          # Mensajes pendientes por conexión antes de descartar (cliente lento)
+ERROR_INTERNO = (-1001, "Internal error; unable to process your request. Please try again.")
+
+
+def _fmt(x):
+    return f"{x:.8f}".rstrip('0').rstrip('.') or "0"
+
+
+def _ahora_ms():
+    return int(time.time() * 1000)
+
+
+class LimitesMock:
+    """Contadores de ventana fija como los de Binance: peso por minuto, órdenes por 10s y por minuto."""
+
+    def __init__(self, peso_1m=RATE_LIMIT_WEIGHT_1M, ordenes_10s=RATE_LIMIT_ORDERS_10S, ordenes_1m=RATE_LIMIT_ORDERS_1M):
+        # nombre del header -> [límite, periodo_s, ventana actual, usado]
+        self.contadores = {
+            'X-MBX-USED-WEIGHT-1M': [peso_1m, 60, 0, 0],
+            'X-MBX-ORDER-COUNT-10S': [ordenes_10s, 10, 0, 0],
+            'X-MBX-ORDER-COUNT-1M': [ordenes_1m, 60, 0, 0],
+        }
+        self.excedidos = 0
+
+    def rate_limits(self):
+        return [
+            {'rateLimitType': 'REQUEST_WEIGHT', 'interval': 'MINUTE', 'intervalNum': 1,
+             'limit': self.contadores['X-MBX-USED-WEIGHT-1M'][0]},
+            {'rateLimitType': 'ORDERS', 'interval': 'SECOND', 'intervalNum': 10,
+             'limit': self.contadores['X-MBX-ORDER-COUNT-10S'][0]},
+            {'rateLimitType': 'ORDERS', 'interval': 'MINUTE', 'intervalNum': 1,
+             'limit': self.contadores['X-MBX-ORDER-COUNT-1M'][0]},
+        ]
+
+    def consumir(self, peso, ordenes):
+        """Devuelve (headers, segundos de Retry-After o 0 si el request entra)."""
+        ahora = time.time()
+        headers = {}
+        retry = 0.0
+        for nombre, c in self.contadores.items():
+            limite, periodo = c[0], c[1]
+            ventana = int(ahora // periodo)
+            if ventana != c[2]:
+                c[2], c[3] = ventana, 0
+            c[3] += peso if nombre.endswith('WEIGHT-1M') else ordenes
+            headers[nombre] = str(c[3])
+            if c[3] > limite:
+                retry = max(retry, (ventana + 1) * periodo - ahora)
+        if retry:
+            self.excedidos += 1
+        return headers, retry
+
+
+class _Suscriptor:
+    """Una conexión WebSocket: cola propia para que un cliente lento no frene al resto."""
+
+    def __init__(self, ws, combinado, latencia_s, jitter_s):
+        self.ws = ws
+        self.combinado = combinado
+        self.latencia_s = latencia_s
+        self.jitter_s = jitter_s
+        self.cola = asyncio.Queue(maxsize=MAX_COLA_WS)
+        self.descartados = 0
+
+    def enviar(self, stream, raw):
+        payload = f'{{"stream":"{stream}","data":{raw}}}' if self.combinado else raw
+        salida = time.monotonic() + self.latencia_s + (random.uniform(0, self.jitter_s) if self.jitter_s else 0.0)
+        try:
+            self.cola.put_nowait((salida, payload))
+        except asyncio.QueueFull:
+            self.descartados += 1
+
+    async def run(self):
+        ultimo = 0.0
+        while True:
+            salida, payload = await self.cola.get()
+            # El jitter nunca reordena: cada mensaje sale después del anterior
+            salida = max(salida, ultimo)
+            espera = salida - time.monotonic()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            ultimo = salida
+            await self.ws.send_str(payload)
+
+
+class MockExchange:
+    def __init__(self, symbols=None, precios=None, balance=1000.0, latencia_ms=0.0, jitter_ms=0.0,
+                 ws_latencia_ms=0.0, error_rate=0.0, limites=None, seed=1):
+        self.symbols = [s.upper() for s in (symbols or SYMBOLS)]
+        self.precios = {s: float((precios or {}).get(s, 2000.0)) for s in self.symbols}
+        self.balance = float(balance)
+        self.latencia_s = latencia_ms / 1000
+        self.jitter_s = jitter_ms / 1000
+        self.ws_latencia_s = ws_latencia_ms / 1000
+        self.error_rate = float(error_rate)
+        self.limites = limites or LimitesMock()
+        self.rng = random.Random(seed)
+        self.motores = {}
+        self.libros = {}
+        for s in self.symbols:
+            motor = MotorMatching(s, dict(DEFAULT_FILTERS))
+            motor.emitir = self._evento_usuario
+            self.motores[s] = motor
+            self.libros[s] = LocalOrderBook(motor.filters['tickSize'])
+        self.leverage = {s: LEVERAGE for s in self.symbols}
+        self.listen_keys = set()
+        self.suscriptores = {}   # stream -> set de _Suscriptor
+        self.conexiones = {}     # WebSocketResponse abierta -> transporte (para cortarlas a demanda)
+        self._ids_trade = itertools.count(1)
+        self._ids_depth = {s: 0 for s in self.symbols}
+        self._niveles = {s: (set(), set()) for s in self.symbols}
+        self._ultimo_tick = {}   # símbolo -> monotonic del último trade publicado
+        self.tick_a_orden = {s: [] for s in self.symbols}  # segundos entre el último trade y cada orden recibida
+        self.requests = 0
+        self.errores_inyectados = 0
+        self.mensajes_ws = 0
+        self.rutas = {
+            ('GET', 'ping'): lambda p: {},
+            ('GET', 'time'): lambda p: {'serverTime': _ahora_ms()},
+            ('GET', 'exchangeInfo'): self._exchange_info,
+            ('POST', 'leverage'): self._leverage,
+            ('GET', 'account'): self._account,
+            ('GET', 'positionRisk'): self._position_risk,
+            ('POST', 'order'): self._crear_orden,
+            ('DELETE', 'order'): self._cancelar_orden,
+            ('PUT', 'order'): self._modificar_orden,
+            ('POST', 'algoOrder'): self._crear_algo,
+            ('DELETE', 'algoOrder'): self._cancelar_algo,
+            ('DELETE', 'algoOpenOrders'): self._cancelar_algos_todas,
+            ('GET', 'openAlgoOrders'): self._algos_abiertas,
+            ('POST', 'batchOrders'): self._crear_batch,
+            ('DELETE', 'batchOrders'): self._cancelar_batch,
+            ('DELETE', 'allOpenOrders'): self._cancelar_todas,
+            ('GET', 'openOrders'): self._ordenes_abiertas,
+            ('GET', 'userTrades'): self._trades_cuenta,
+            ('GET', 'ticker/price'): self._ticker,
+            ('GET', 'depth'): self._depth,
+            ('POST', 'listenKey'): self._nuevo_listen_key,
+            ('PUT', 'listenKey'): self._keepalive_listen_key,
+            ('DELETE', 'listenKey'): self._cerrar_listen_key,
+        }
+
+    # --- cuenta ---
+    def _wallet(self):
+        # Cada motor acumula en `balance` su PnL realizado menos fees
+        return self.balance + sum(m.balance for m in self.motores.values())
+
+    def _margen(self):
+        margen = 0.0
+        for s, m in self.motores.items():
+            ordenes = sum((o.origQty - o.executedQty) * o.price for o in m.ordenes.values()
+                          if o.type == 'LIMIT' and not o.reduceOnly)
+            margen += (abs(m.posicion) * m.entrada + ordenes) / self.leverage[s]
+        return margen
+
+    def _evento_usuario(self, evento):
+        if evento.get('e') == 'ACCOUNT_UPDATE':
+            wallet = _fmt(self._wallet())
+            evento['a']['B'] = [{'a': 'USDT', 'wb': wallet, 'cw': wallet, 'bc': '0'}]
+        raw = json.dumps(evento, separators=(',', ':'))
+        for lk in self.listen_keys:
+            self._publicar_raw(lk, raw)
+
+    # --- REST ---
+    def _motor(self, params):
+        s = str(params.get('symbol', '')).upper()
+        motor = self.motores.get(s)
+        if motor is None:
+            raise ErrorExchange(-1121, "Invalid symbol.")
+        motor.ahora_ms = _ahora_ms()
+        return motor
+
+    def _exchange_info(self, params):
+        return {
+            'timezone': 'UTC',
+            'serverTime': _ahora_ms(),
+            'rateLimits': self.limites.rate_limits(),
+            'symbols': [{
+                'symbol': s, 'status': 'TRADING', 'contractType': 'PERPETUAL',
+                'filters': [
+                    {'filterType': 'PRICE_FILTER', 'tickSize': _fmt(m.filters['tickSize'])},
+                    {'filterType': 'LOT_SIZE', 'stepSize': _fmt(m.filters['stepSize']), 'minQty': _fmt(m.filters['minQty'])},
+                ],
+            } for s, m in self.motores.items()],
+        }
+
+    def _leverage(self, params):
+        motor = self._motor(params)
+        self.leverage[motor.symbol] = int(params.get('leverage', LEVERAGE))
+        return {'symbol': motor.symbol, 'leverage': self.leverage[motor.symbol], 'maxNotionalValue': '1000000'}
+
+    def _account(self, params):
+        wallet = self._wallet()
+        disponible = wallet - self._margen()
+        return {
+            'totalWalletBalance': _fmt(wallet),
+            'availableBalance': _fmt(disponible),
+            'assets': [{'asset': 'USDT', 'walletBalance': _fmt(wallet), 'crossWalletBalance': _fmt(wallet),
+                        'availableBalance': _fmt(disponible)}],
+            'positions': self._position_risk({}),
+        }
+
+    def _position_risk(self, params):
+        s = str(params.get('symbol', '')).upper()
+        return [{
+            'symbol': m.symbol, 'positionAmt': _fmt(m.posicion), 'entryPrice': _fmt(m.entrada),
+            'markPrice': _fmt(m.ultimo_precio or 0), 'unRealizedProfit': _fmt(m.no_realizado()),
+            'leverage': str(self.leverage[m.symbol]), 'positionSide': 'BOTH',
+        } for m in self.motores.values() if not s or m.symbol == s]
+
+    def _registrar_tick_a_orden(self, symbol, n=1):
+        t = self._ultimo_tick.get(symbol)
+        if t is not None:
+            self.tick_a_orden[symbol].extend([time.monotonic() - t] * n)
+
+    def _crear_orden(self, params):
+        motor = self._motor(params)
+        self._registrar_tick_a_orden(motor.symbol)
+        return motor.crear_orden(params)
+
+    def _cancelar_orden(self, params):
+        motor = self._motor(params)
+        return motor.cancelar(params.get('orderId'), params.get('origClientOrderId'))
+
+    def _modificar_orden(self, params):
+        motor = self._motor(params)
+        return motor.modificar(params.get('orderId'), params.get('origClientOrderId'),
+                               params.get('price'), params.get('quantity'))
+
+    # STOP/TAKE_PROFIT van por el Algo Order API, como en Binance: responden con algoId
+    # (sin orderId), se listan sólo en openAlgoOrders y /order los rechaza con -4120
+    def _crear_algo(self, params):
+        motor = self._motor(params)
+        self._registrar_tick_a_orden(motor.symbol)
+        return motor.crear_algo(params)
+
+    def _cancelar_algo(self, params):
+        motor = self._motor(params)
+        return motor.cancelar_algo(params.get('algoId'), params.get('clientAlgoId'))
+
+    def _cancelar_algos_todas(self, params):
+        return self._motor(params).cancelar_algos_todas()
+
+    def _algos_abiertas(self, params):
+        if params.get('symbol'):
+            return self._motor(params).algos_abiertas()
+        return [a for m in self.motores.values() for a in m.algos_abiertas()]
+
+    @staticmethod
+    def _lista(valor):
+        # batchOrders llega como JSON (o repr de Python con comillas dobles, según la versión del cliente)
+        if isinstance(valor, list):
+            return valor
+        try:
+            return json.loads(valor)
+        except ValueError:
+            return ast.literal_eval(valor)
+
+    def _crear_batch(self, params):
+        ordenes = self._lista(params.get('batchOrders', '[]'))
+        out = []
+        for p in ordenes:
+            try:
+                motor = self._motor(p)
+                self._registrar_tick_a_orden(motor.symbol)
+                out.append(motor.crear_orden(p))
+            except ErrorExchange as e:
+                out.append({'code': e.code, 'msg': e.msg})
+        return out
+
+    def _cancelar_batch(self, params):
+        motor = self._motor(params)
+        out = []
+        for oid in self._lista(params.get('orderIdList') or params.get('orderidlist') or '[]'):
+            try:
+                out.append(motor.cancelar(oid))
+            except ErrorExchange as e:
+                out.append({'code': e.code, 'msg': e.msg})
+        return out
+
+    def _cancelar_todas(self, params):
+        return self._motor(params).cancelar_todas()
+
+    def _ordenes_abiertas(self, params):
+        if params.get('symbol'):
+            return self._motor(params).ordenes_abiertas()
+        return [o for m in self.motores.values() for o in m.ordenes_abiertas()]
+
+    def _trades_cuenta(self, params):
+        return self._motor(params).trades_cuenta(params.get('startTime'), params.get('fromId'), params.get('limit', 500))
+
+    def _ticker(self, params):
+        motor = self._motor(params)
+        return {'symbol': motor.symbol, 'price': _fmt(motor.ultimo_precio or self.precios[motor.symbol]), 'time': _ahora_ms()}
+
+    def _depth(self, params):
+        motor = self._motor(params)
+        libro = self.libros[motor.symbol]
+        limit = int(params.get('limit', 500))
+        return {
+            'lastUpdateId': libro.last_update_id or 0,
+            'E': _ahora_ms(), 'T': _ahora_ms(),
+            'bids': [[_fmt(p), _fmt(q)] for p, q in libro.top_bids(limit)],
+            'asks': [[_fmt(p), _fmt(q)] for p, q in libro.top_asks(limit)],
+        }
+
+    def _nuevo_listen_key(self, params):
+        lk = secrets.token_hex(32)
+        self.listen_keys.add(lk)
+        return {'listenKey': lk}
+
+    def _keepalive_listen_key(self, params):
+        if params.get('listenKey') not in self.listen_keys:
+            raise ErrorExchange(-1125, "This listenKey does not exist.")
+        return {'listenKey': params['listenKey']}
+
+    def _cerrar_listen_key(self, params):
+        self.listen_keys.discard(params.get('listenKey'))
+        return {}
+
+    @staticmethod
+    def _costo(metodo, ruta, params):
+        """(peso de IP, órdenes) como en la documentación de Binance."""
+        if (ruta == 'order' and metodo in ('POST', 'PUT')) or (ruta == 'algoOrder' and metodo == 'POST'):
+            return 0, 1
+        if ruta == 'batchOrders' and metodo == 'POST':
+            return 5, len(MockExchange._lista(params.get('batchOrders', '[]')))
+        if ruta in ('account', 'positionRisk', 'userTrades'):
+            return 5, 0
+        if ruta in ('openOrders', 'openAlgoOrders') and not params.get('symbol'):
+            return 40, 0
+        if ruta == 'depth':
+            limit = int(params.get('limit', 500))
+            return (2 if limit <= 50 else 5 if limit <= 100 else 10 if limit <= 500 else 20), 0
+        return 1, 0
+
+    async def _rest(self, request):
+        self.requests += 1
+        metodo = request.method
+        ruta = request.match_info['ruta']
+        params = dict(request.query)
+        if request.can_read_body:
+            params.update(await request.post())
+        try:
+            peso, ordenes = self._costo(metodo, ruta, params)
+        except (ValueError, SyntaxError):
+            peso, ordenes = 1, 0
+        headers, retry = self.limites.consumir(peso, ordenes)
+        if self.latencia_s or self.jitter_s:
+            await asyncio.sleep(self.latencia_s + self.rng.uniform(0, self.jitter_s))
+        if retry:
+            headers['Retry-After'] = str(int(retry) + 1)
+            return web.json_response({'code': -1003, 'msg': "Too many requests; current limit is exceeded."},
+                                     status=429, headers=headers)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.errores_inyectados += 1
+            return web.json_response({'code': ERROR_INTERNO[0], 'msg': ERROR_INTERNO[1]}, status=503, headers=headers)
+        accion = self.rutas.get((metodo, ruta))
+        if accion is None:
+            return web.json_response({'code': -5000, 'msg': f"Path /{ruta} not found"}, status=404, headers=headers)
+        try:
+            cuerpo = accion(params)
+        except ErrorExchange as e:
+            return web.json_response({'code': e.code, 'msg': e.msg}, status=400, headers=headers)
+        except (KeyError, TypeError, ValueError, SyntaxError) as e:
+            return web.json_response({'code': -1102, 'msg': f"Mandatory parameter missing or malformed: {e}"},
+                                     status=400, headers=headers)
+        return web.json_response(cuerpo, headers=headers)
+
+    # --- WebSocket ---
+    def _publicar_raw(self, stream, raw):
+        subs = self.suscriptores.get(stream)
+        if not subs:
+            return
+        self.mensajes_ws += len(subs)
+        for sub in subs:
+            sub.enviar(stream, raw)
+
+    def publicar(self, stream, data):
+        if self.suscriptores.get(stream):
+            self._publicar_raw(stream, json.dumps(data, separators=(',', ':')))
+
+    def _suscribir(self, sub, streams):
+        for stream in streams:
+            self.suscriptores.setdefault(stream, set()).add(sub)
+
+    async def _ws(self, request):
+        ws = web.WebSocketResponse(heartbeat=20, max_msg_size=0)
+        await ws.prepare(request)
+        combinado = request.path.startswith('/stream')
+        sub = _Suscriptor(ws, combinado, self.ws_latencia_s, self.jitter_s)
+        self.conexiones[ws] = request.transport
+        if combinado:
+            streams = [s for s in request.query.get('streams', '').split('/') if s]
+        else:
+            streams = [request.match_info['stream']]
+        self._suscribir(sub, streams)
+        emisor = asyncio.create_task(sub.run())
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    pedido = json.loads(msg.data)
+                except ValueError:
+                    continue
+                if pedido.get('method') == 'SUBSCRIBE':
+                    self._suscribir(sub, pedido.get('params', []))
+                elif pedido.get('method') == 'UNSUBSCRIBE':
+                    for stream in pedido.get('params', []):
+                        self.suscriptores.get(stream, set()).discard(sub)
+                await ws.send_str(json.dumps({'result': None, 'id': pedido.get('id')}))
+        finally:
+            self.conexiones.pop(ws, None)
+            emisor.cancel()
+            for subs in self.suscriptores.values():
+                subs.discard(sub)
+        return ws
+
+    # --- fallas a demanda ---
+    async def cortar(self, limpio=True):
+        """Cierra todas las conexiones WS: limpio con close frame 1001 (como el corte de 24h) o abrupto."""
+        conexiones = list(self.conexiones.items())
+        for ws, transporte in conexiones:
+            if limpio:
+                await ws.close(code=1001, message=b'going away')
+            elif transporte is not None:
+                transporte.abort()
+        return len(conexiones)
+
+    def expirar_listen_keys(self):
+        """listenKeyExpired en cada listenKey; desde ahí no reciben más eventos hasta pedir uno nuevo."""
+        vencidos = list(self.listen_keys)
+        for lk in vencidos:
+            self._publicar_raw(lk, json.dumps({'e': 'listenKeyExpired', 'E': _ahora_ms(), 'listenKey': lk}))
+        self.listen_keys.clear()
+        return vencidos
+
+    async def _cortar(self, request):
+        n = await self.cortar(request.query.get('limpio', '1') != '0')
+        return web.json_response({'cortadas': n})
+
+    async def _expirar(self, request):
+        return web.json_response({'expirados': len(self.expirar_listen_keys())})
+
+    # --- mercado ---
+    def trade(self, symbol, precio, qty, venta, ts=None):
+        ts = ts or _ahora_ms()
+        self.motores[symbol].on_trade(precio, qty, ts)
+        self.publicar(f"{symbol.lower()}@trade", {
+            'e': 'trade', 'E': ts, 'T': ts, 's': symbol, 't': next(self._ids_trade),
+            'p': _fmt(precio), 'q': _fmt(qty), 'X': 'MARKET', 'm': venta,
+        })
+        self._ultimo_tick[symbol] = time.monotonic()
+
+    def ticker(self, symbol, data=None):
+        precio = self.motores[symbol].ultimo_precio or self.precios[symbol]
+        data = data or {'e': '24hrMiniTicker', 's': symbol, 'c': _fmt(precio), 'o': _fmt(precio),
+                        'h': _fmt(precio), 'l': _fmt(precio), 'v': '0', 'q': '0'}
+        data['E'] = _ahora_ms()
+        self.publicar(f"{symbol.lower()}@miniTicker", data)
+
+    def depth(self, symbol, data):
+        libro = self.libros[symbol]
+        if libro.last_update_id is None:
+            libro.cargar_snapshot({'lastUpdateId': int(data['U']), 'bids': [], 'asks': []})
+        libro.aplicar_diff(data)
+        self.publicar(f"{symbol.lower()}@depth@100ms", data)
+
+    def _depth_sintetico(self, symbol):
+        """Diff de un libro de NIVELES_DEPTH niveles por lado centrado en el último precio."""
+        tick = self.motores[symbol].filters['tickSize']
+        centro = int(round((self.motores[symbol].ultimo_precio or self.precios[symbol]) / tick))
+        bids_prev, asks_prev = self._niveles[symbol]
+        bids = {centro - k for k in range(1, NIVELES_DEPTH + 1)}
+        asks = {centro + k for k in range(1, NIVELES_DEPTH + 1)}
+        b = [[_fmt(t * tick), _fmt(self.rng.uniform(0.1, 20))] for t in sorted(bids)]
+        b += [[_fmt(t * tick), '0'] for t in bids_prev - bids]
+        a = [[_fmt(t * tick), _fmt(self.rng.uniform(0.1, 20))] for t in sorted(asks)]
+        a += [[_fmt(t * tick), '0'] for t in asks_prev - asks]
+        self._niveles[symbol] = (bids, asks)
+        pu = self._ids_depth[symbol]
+        u = pu + len(b) + len(a)
+        self._ids_depth[symbol] = u
+        ts = _ahora_ms()
+        self.depth(symbol, {'e': 'depthUpdate', 'E': ts, 'T': ts, 's': symbol, 'U': pu + 1, 'u': u, 'pu': pu, 'b': b, 'a': a})
+
+    async def feed_sintetico(self, tps=50.0, rafaga=0, rafaga_cada=10.0, volatilidad=2, paso=0.01):
+        """
+        Trades en random walk (en ticks) a `tps` por símbolo, con una ráfaga vendedora
+        de `rafaga` trades cada `rafaga_cada` segundos; depth cada 100ms y ticker cada 1s.
+        """
+        precios = {s: int(round(p / self.motores[s].filters['tickSize'])) for s, p in self.precios.items()}
+        pendiente = 0.0
+        ahora = time.monotonic()
+        proxima_rafaga, proximo_depth, proximo_ticker = ahora + rafaga_cada, ahora, ahora
+        while True:
+            await asyncio.sleep(paso)
+            ahora = time.monotonic()
+            pendiente += tps * paso
+            n = int(pendiente)
+            pendiente -= n
+            en_rafaga = bool(rafaga) and ahora >= proxima_rafaga
+            if en_rafaga:
+                proxima_rafaga += rafaga_cada
+            for s in self.symbols:
+                tick = self.motores[s].filters['tickSize']
+                for _ in range(n):
+                    precios[s] = max(1, precios[s] + self.rng.randint(-volatilidad, volatilidad))
+                    self.trade(s, precios[s] * tick, round(self.rng.uniform(0.001, 2), 3), self.rng.random() < 0.5)
+                if en_rafaga:
+                    for _ in range(rafaga):
+                        precios[s] = max(1, precios[s] - self.rng.randint(0, volatilidad))
+                        self.trade(s, precios[s] * tick, round(self.rng.uniform(0.01, 5), 3), True)
+            if ahora >= proximo_depth:
+                proximo_depth += 0.1
+                for s in self.symbols:
+                    self._depth_sintetico(s)
+            if ahora >= proximo_ticker:
+                proximo_ticker += 1.0
+                for s in self.symbols:
+                    self.ticker(s)
+
+    async def feed_replay(self, path, velocidad=1.0, bucle=False):
+        """Reproduce una cinta (formato de backtest.py) a `velocidad`x con los timestamps llevados a ahora."""
+        while True:
+            t0_real = time.monotonic()
+            t0_cinta = None
+            for i, (tipo, data) in enumerate(leer_eventos(path)):
+                ts = int(data.get('T') or data.get('E') or 0)
+                if t0_cinta is None:
+                    t0_cinta = ts
+                espera = (ts - t0_cinta) / 1000 / velocidad - (time.monotonic() - t0_real)
+                if espera > 0:
+                    await asyncio.sleep(espera)
+                elif i % 100 == 0:
+                    await asyncio.sleep(0)
+                s = str(data.get('s') or self.symbols[0]).upper()
+                if s not in self.motores:
+                    continue
+                data = dict(data)
+                data['E'] = data['T'] = _ahora_ms()
+                if tipo == 'TRADE':
+                    self.trade(s, float(data['p']), float(data['q']), bool(data.get('m')), data['T'])
+                elif tipo == 'DEPTH':
+                    self.depth(s, data)
+                elif tipo == 'TICKER':
+                    self.ticker(s, data)
+                elif tipo == 'SNAPSHOT':
+                    self.libros[s].cargar_snapshot(data)
+            if not bucle:
+                return
+
+    # --- estadísticas ---
+    def stats(self):
+        lat = np.array([x for v in self.tick_a_orden.values() for x in v]) * 1000
+        return {
+            'requests': self.requests,
+            'rate_limited': self.limites.excedidos,
+            'errores_inyectados': self.errores_inyectados,
+            'mensajes_ws': self.mensajes_ws,
+            'descartados_ws': sum(sub.descartados for subs in self.suscriptores.values() for sub in subs),
+            'ordenes': {s: dict(m.contadores) for s, m in self.motores.items()},
+            'posiciones': {s: m.posicion for s, m in self.motores.items()},
+            'tick_a_orden_ms': {
+                'n': int(len(lat)),
+                'p50': round(float(np.percentile(lat, 50)), 3) if len(lat) else None,
+                'p90': round(float(np.percentile(lat, 90)), 3) if len(lat) else None,
+                'p99': round(float(np.percentile(lat, 99)), 3) if len(lat) else None,
+                'max': round(float(lat.max()), 3) if len(lat) else None,
+            },
+        }
+
+    async def _stats(self, request):
+        return web.json_response(self.stats())
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/mock/stats', self._stats)
+        app.router.add_post('/mock/cortar', self._cortar)
+        app.router.add_post('/mock/expirar', self._expirar)
+        app.router.add_get('/ws/{stream}', self._ws)
+        app.router.add_get('/stream', self._ws)
+        app.router.add_route('*', '/fapi/{version}/{ruta:.+}', self._rest)
+        return app
+
+
+async def servir(mock, host, port, feed):
+    runner = web.AppRunner(mock.app())
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError:
+        feed.close()
+        await runner.cleanup()
+        raise
+    print(f"[MOCK] REST http://{host}:{port}/fapi  WS ws://{host}:{port}  símbolos={', '.join(mock.symbols)}")
+    try:
+        await feed
+    finally:
+        await runner.cleanup()
+
+
+def _precios(texto):
+    out = {}
+    for par in filter(None, (texto or '').split(',')):
+        s, p = par.split('=')
+        out[s.strip().upper()] = float(p)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exchange de futuros simulado (REST + WS) para pruebas locales")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--symbols', default=','.join(SYMBOLS))
+    parser.add_argument('--precio', default='', help="Precio inicial por símbolo: ETHUSDT=2000,BTCUSDT=60000")
+    parser.add_argument('--balance', type=float, default=1000.0)
+    parser.add_argument('--latencia-ms', type=float, default=0.0, help="Latencia inyectada en cada request REST")
+    parser.add_argument('--ws-latencia-ms', type=float, default=0.0, help="Latencia inyectada en cada mensaje WS")
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fracción de requests que fallan con -1001")
+    parser.add_argument('--peso-1m', type=int, default=RATE_LIMIT_WEIGHT_1M)
+    parser.add_argument('--ordenes-10s', type=int, default=RATE_LIMIT_ORDERS_10S)
+    parser.add_argument('--ordenes-1m', type=int, default=RATE_LIMIT_ORDERS_1M)
+    parser.add_argument('--tps', type=float, default=50.0, help="Trades por segundo y símbolo (feed sintético)")
+    parser.add_argument('--rafaga', type=int, default=0, help="Trades vendedores por ráfaga (0: sin ráfagas)")
+    parser.add_argument('--rafaga-cada', type=float, default=10.0)
+    parser.add_argument('--volatilidad', type=int, default=2, help="Ticks máximos por trade del random walk")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--replay', help="Cinta de eventos (formato de backtest.py) en lugar del feed sintético")
+    parser.add_argument('--velocidad', type=float, default=1.0)
+    parser.add_argument('--bucle', action='store_true', help="Repetir la cinta al terminar")
+    args = parser.parse_args()
+
+    mock = MockExchange(
+        symbols=[s for s in args.symbols.split(',') if s], precios=_precios(args.precio), balance=args.balance,
+        latencia_ms=args.latencia_ms, jitter_ms=args.jitter_ms, ws_latencia_ms=args.ws_latencia_ms,
+        error_rate=args.error_rate, limites=LimitesMock(args.peso_1m, args.ordenes_10s, args.ordenes_1m), seed=args.seed,
+    )
+    if args.replay:
+        feed = mock.feed_replay(args.replay, args.velocidad, args.bucle)
+    else:
+        feed = mock.feed_sintetico(args.tps, args.rafaga, args.rafaga_cada, args.volatilidad)
+    try:
+        asyncio.run(servir(mock, args.host, args.port, feed))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(mock.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import asyncio
+import bisect
+import json
+import os
+import sys
+from array import array
+
+from config import BOOK_MARGEN_NIVELES
+
+
+class _BookSide:
+    """
+    Un lado del libro: precios en ticks (enteros) ordenados ascendentemente en un
+    array('q') con las cantidades en un array('d') paralelo.
+    """
+
+    def __init__(self):
+        self.ticks = array('q')
+        self.qtys = array('d')
+
+    def clear(self):
+        self.ticks = array('q')
+        self.qtys = array('d')
+
+    def set(self, tick, qty):
+        i = bisect.bisect_left(self.ticks, tick)
+        existe = i < len(self.ticks) and self.ticks[i] == tick
+        if qty <= 0.0:
+            if existe:
+                del self.ticks[i]
+                del self.qtys[i]
+        elif existe:
+            self.qtys[i] = qty
+        else:
+            self.ticks.insert(i, tick)
+            self.qtys.insert(i, qty)
+
+    def recortar(self, n, altos):
+        """Deja los `n` mejores niveles: los precios más altos (bids) o los más bajos (asks)."""
+        sobra = len(self.ticks) - n
+        if sobra <= 0:
+            return
+        if altos:
+            del self.ticks[:sobra]
+            del self.qtys[:sobra]
+        else:
+            del self.ticks[n:]
+            del self.qtys[n:]
+
+    def __len__(self):
+        return len(self.ticks)
+
+
+class LocalOrderBook:
+    """
+    Espejo local del libro de órdenes de futuros a partir del stream @depth@100ms.
+
+    Sigue las reglas de Binance USD-M: se toma un snapshot REST (lastUpdateId), se
+    descartan los diffs con u < lastUpdateId, el primer diff aplicado debe cumplir
+    U <= lastUpdateId <= u y cada diff siguiente debe tener pu == u anterior.
+    Ante un hueco se marca como no sincronizado y se resincroniza solo. Cada lado se
+    recorta a la profundidad del snapshot más `margen_niveles`: fuera de ella el libro
+    no es confiable y sin recorte crecería sin límite durante la sesión.
+    """
+
+    def __init__(self, tick_size, fetch_snapshot=None, max_buffer=2000, margen_niveles=BOOK_MARGEN_NIVELES):
+        self.tick_size = float(tick_size)
+        self.fetch_snapshot = fetch_snapshot  # coroutine function -> dict REST /fapi/v1/depth
+        self.max_buffer = max_buffer
+        self.margen_niveles = margen_niveles
+        self.max_niveles = margen_niveles
+        self.bids = _BookSide()
+        self.asks = _BookSide()
+        self.last_update_id = None
+        self.synced = False
+        self.resyncs = 0
+        self._buffer = []
+        self._resync_task = None
+
+    def _tick(self, price):
+        return int(round(float(price) / self.tick_size))
+
+    def _price(self, tick):
+        return round(tick * self.tick_size, 8)
+
+    # --- sincronización ---
+    def cargar_snapshot(self, snapshot):
+        self.bids.clear()
+        self.asks.clear()
+        for p, q in snapshot.get('bids', []):
+            self.bids.set(self._tick(p), float(q))
+        for p, q in snapshot.get('asks', []):
+            self.asks.set(self._tick(p), float(q))
+        self.max_niveles = max(len(self.bids), len(self.asks)) + self.margen_niveles
+        self.last_update_id = int(snapshot['lastUpdateId'])
+        self.synced = False
+        buffer, self._buffer = self._buffer, []
+        for msg in buffer:
+            if not self._aplicar_sincronizando(msg):
+                print("[BOOK] Snapshot desfasado respecto a los diffs, resincronizando")
+                self.invalidar()
+                self._programar_resync()
+                return
+
+    def _aplicar_niveles(self, msg):
+        for p, q in msg.get('b', []):
+            self.bids.set(self._tick(p), float(q))
+        for p, q in msg.get('a', []):
+            self.asks.set(self._tick(p), float(q))
+        self.bids.recortar(self.max_niveles, altos=True)
+        self.asks.recortar(self.max_niveles, altos=False)
+
+    def _aplicar_sincronizando(self, msg):
+        U = int(msg['U']); u = int(msg['u'])
+        if self.synced:
+            if int(msg.get('pu', -1)) != self.last_update_id:
+                return False
+        else:
+            if u < self.last_update_id:
+                return True  # diff viejo: ya incluido en el snapshot
+            if U > self.last_update_id:
+                return False
+            self.synced = True
+        self._aplicar_niveles(msg)
+        self.last_update_id = u
+        return True
+
+    def aplicar_diff(self, msg):
+        """Aplica un mensaje depthUpdate. Devuelve True si el libro queda sincronizado."""
+        if self.last_update_id is None:
+            if len(self._buffer) < self.max_buffer:
+                self._buffer.append(msg)
+            self._programar_resync()
+            return False
+        if not self._aplicar_sincronizando(msg):
+            print(f"[BOOK] Hueco de secuencia (pu={msg.get('pu')} esperado={self.last_update_id}), resincronizando")
+            self.invalidar()
+            self._buffer.append(msg)
+            self._programar_resync()
+            return False
+        return self.synced
+
+    def invalidar(self):
+        self.synced = False
+        self.last_update_id = None
+        self._buffer = []
+
+    def _programar_resync(self):
+        if self.fetch_snapshot is None:
+            return
+        if self._resync_task is not None and not self._resync_task.done():
+            return
+        try:
+            self._resync_task = asyncio.get_running_loop().create_task(self.sincronizar())
+        except RuntimeError:
+            pass
+
+    async def sincronizar(self):
+        try:
+            snapshot = await self.fetch_snapshot()
+        except Exception as e:
+            print(f"[BOOK] Error snapshot REST: {e}")
+            return
+        self.resyncs += 1
+        self.cargar_snapshot(snapshot)
+        print(f"[BOOK] Snapshot cargado lastUpdateId={snapshot.get('lastUpdateId')} synced={self.synced}")
+
+    # --- consultas O(N) ---
+    def best_bid(self):
+        if not self.synced or not len(self.bids):
+            return None
+        return self._price(self.bids.ticks[-1])
+
+    def best_ask(self):
+        if not self.synced or not len(self.asks):
+            return None
+        return self._price(self.asks.ticks[0])
+
+    def top_bids(self, n):
+        ticks, qtys = self.bids.ticks, self.bids.qtys
+        m = len(ticks)
+        return [(self._price(ticks[m - 1 - i]), qtys[m - 1 - i]) for i in range(min(n, m))]
+
+    def top_asks(self, n):
+        ticks, qtys = self.asks.ticks, self.asks.qtys
+        return [(self._price(ticks[i]), qtys[i]) for i in range(min(n, len(ticks)))]
+
+    def volumen_top(self, lado, n):
+        """Volumen acumulado en los n mejores niveles de 'bids' o 'asks'."""
+        qtys = self.bids.qtys if lado == 'bids' else self.asks.qtys
+        m = len(qtys)
+        n = min(n, m)
+        if lado == 'bids':
+            return sum(qtys[m - n:m])
+        return sum(qtys[:n])
+
+    def volumen_hasta(self, lado, precio):
+        """Volumen acumulado desde el mejor precio hasta `precio` (inclusive)."""
+        k = self._tick(precio)
+        if lado == 'bids':
+            i = bisect.bisect_left(self.bids.ticks, k)
+            return sum(self.bids.qtys[i:])
+        i = bisect.bisect_right(self.asks.ticks, k)
+        return sum(self.asks.qtys[:i])
+
+
+def reproducir(snapshot, diffs, tick_size, margen_niveles=BOOK_MARGEN_NIVELES):
+    """
+    Reproduce offline un snapshot REST + diffs grabados y devuelve el libro resultante.
+
+    `snapshot` puede ser None (los diffs se acumulan hasta el primer snapshot). Una
+    línea de `diffs` con lastUpdateId es un snapshot REST de resincronización: tras un
+    hueco los diffs se acumulan como en vivo y el snapshot los puentea.
+    """
+    book = LocalOrderBook(tick_size, margen_niveles=margen_niveles)
+    if snapshot is not None:
+        book.cargar_snapshot(snapshot)
+    for msg in diffs:
+        if 'lastUpdateId' in msg:
+            book.cargar_snapshot(msg)
+            continue
+        perdido = book.last_update_id is not None
+        book.aplicar_diff(msg)
+        if perdido and book.last_update_id is None:
+            print(f"[BOOK] Libro desincronizado en u={msg.get('u')}")
+    return book
+
+
+def verificar(directorio, niveles=5):
+    """
+    Reproduce cada caso de `directorio` (subcarpetas con eventos.jsonl + esperado.json)
+    y compara synced, lastUpdateId y el top del libro. Devuelve la lista de fallos.
+    """
+    fallos = []
+    for caso in sorted(os.listdir(directorio)):
+        ruta = os.path.join(directorio, caso)
+        if not os.path.isdir(ruta):
+            continue
+        with open(os.path.join(ruta, 'eventos.jsonl')) as f:
+            eventos = [json.loads(l) for l in f if l.strip()]
+        with open(os.path.join(ruta, 'esperado.json')) as f:
+            esperado = json.load(f)
+        b = reproducir(None, eventos, esperado.get('tickSize', 0.01), esperado.get('margenNiveles', BOOK_MARGEN_NIVELES))
+        obtenido = {
+            'synced': b.synced,
+            'lastUpdateId': b.last_update_id,
+            'top_bids': [list(x) for x in b.top_bids(niveles)],
+            'top_asks': [list(x) for x in b.top_asks(niveles)],
+        }
+        distintos = [k for k in obtenido if k in esperado and obtenido[k] != esperado[k]]
+        print(f"[BOOK] {caso}: {'FALLO ' + ', '.join(distintos) if distintos else 'OK'}")
+        for k in distintos:
+            print(f"    {k}: esperado={esperado[k]} obtenido={obtenido[k]}")
+            fallos.append((caso, k))
+    return fallos
+
+
+if __name__ == "__main__":
+    # Uso: python order_book.py snapshot.json diffs.jsonl [tickSize]
+    #      python order_book.py --verificar fixtures/order_book
+    if sys.argv[1] == '--verificar':
+        sys.exit(1 if verificar(sys.argv[2]) else 0)
+    with open(sys.argv[1]) as f:
+        snap = json.load(f)
+    with open(sys.argv[2]) as f:
+        msgs = [json.loads(l) for l in f if l.strip()]
+    tick = float(sys.argv[3]) if len(sys.argv) > 3 else 0.01
+    b = reproducir(snap, msgs, tick)
+    print(f"synced={b.synced} lastUpdateId={b.last_update_id} bids={len(b.bids)} asks={len(b.asks)}")
+    print("Top bids:", b.top_bids(5))
+    print("Top asks:", b.top_asks(5))
@@ -1,13 +1,33 @@
 ORDER_TYPE_STOP_MARKET = "STOP_MARKET"
 
-from binance_client import BinanceClient
-from config import SYMBOL
+from binance_client import AsyncBinanceClient
+from config import SYMBOL, GRID_BATCH_SIZE, GRID_BATCH_CONCURRENCY
+from metrics import RECHAZOS
 
-import time
+import asyncio
+import bisect
+import math
+import reloj
 
 class OrderManager:
-    def __init__(self, client: BinanceClient):
+    def __init__(self, client: AsyncBinanceClient, cuenta=None):
         self.client = client
+        self.cuenta = cuenta  # AccountMirror: órdenes abiertas sin ir a REST
+
+    def _registrar(self, r):
+        if isinstance(r, dict) and r.get('code'):
+            RECHAZOS.inc(r['code'])
+        if self.cuenta is not None:
+            self.cuenta.registrar_respuesta(r)
+        return r
+
+    def _quitar(self, order_id):
+        if self.cuenta is not None:
+            self.cuenta.quitar(order_id)
+
+    def _quitar_algo(self, algo_id):
+        if self.cuenta is not None:
+            self.cuenta.quitar_algo(algo_id)
 
     def calcular_cantidad(self, precio, usdt_size, leverage):
         if precio is None or precio == 0:
@@ -16,111 +36,305 @@ class OrderManager:
         qty = (usdt_size * leverage) / precio
         return self.client.round_qty(qty)
 
-    def place_grid_buy(self, price, qty, index):
-        price = self.client.round_price(price)
-        qty = self.client.round_qty(qty)
-        # Usar un client order id único (timestamp)
-        cId = f"GRID_BUY_{index}_{int(time.time()*1000)}"
-        return self.client.place_limit('BUY', price, qty, reduce_only=False, newClientOrderId=cId)
+    # El redondeo a tick/step se hace una sola vez, en _limit_params/_stop_params del cliente
+    async def place_tp_sell(self, price, qty, tag):
+        cId = f"TP_{tag}_{reloj.ahora_ms()}"
+        return self._registrar(await self.client.place_limit('SELL', price, qty, reduce_only=True, newClientOrderId=cId))
 
-    def place_tp_sell(self, price, qty, tag):
-        price = self.client.round_price(price)
-        qty = self.client.round_qty(qty)
-        cId = f"TP_{tag}_{int(time.time()*1000)}"
-        return self.client.place_limit('SELL', price, qty, reduce_only=True, newClientOrderId=cId)
+    async def place_sl_close_position(self, stop_price):
+        return self._registrar(await self.client.place_stop_market_close_position(stop_price))
 
-    def place_sl_close_position(self, stop_price):
-        stop_price = self.client.round_price(stop_price)
-        return self.client.place_stop_market_close_position(stop_price)
+    async def colocar_stop_loss_close_position(self, stop_price):
+        return self._registrar(await self.client.place_stop_market_close_position(stop_price))
 
-    def colocar_stop_loss_close_position(self, stop_price):
-        stop_price = self.client.round_price(stop_price)
-        return self.client.place_stop_market_close_position(stop_price)
-
-    def get_open_orders(self):
-        return self.client.get_open_orders() or []
-
-    def cancel_order(self, orderId):
-        return self.client.cancel_order(orderId)
-
-    def cancel_all(self):
-        return self.client.cancel_all()
-
-    def colocar_orden_limit(self, side, price, qty, reduce_only=False, newClientOrderId=None):
-        price = self.client.round_price(price)
-        qty = self.client.round_qty(qty)
-        if not newClientOrderId:
-            newClientOrderId = f"ORDER_{side}_{int(time.time()*1000)}"
-        return self.client.place_limit(
-            side,
-            price,
-            qty,
-            reduce_only=reduce_only,
-            newClientOrderId=newClientOrderId
-        )
-
-    def reconcile_grid(self, desired_levels: list, qty, price_tolerance=0.5):
-        open_orders = self.get_open_orders()
-        buy_orders = [o for o in open_orders if o.get('side') == 'BUY']
-        to_create = []
-        matched_ids = set()
-
-        for i, level in enumerate(desired_levels):
-            found = None
-            for o in buy_orders:
-                try:
-                    op = float(o.get('price') or o.get('origPrice') or 0)
-                except Exception:
-                    op = 0
-                if abs(op - level) <= price_tolerance and o.get('status','NEW') in ('NEW','PARTIALLY_FILLED'):
-                    found = o
-                    matched_ids.add(o['orderId'])
-                    break
-            if not found:
-                to_create.append((i, level))
+    async def modificar_orden(self, orderId, side, price, qty):
+        return self._registrar(await self.client.modify_limit(orderId, side, price, qty))
 
-        to_cancel = [o for o in buy_orders if o.get('orderId') not in matched_ids]
-        for o in to_cancel:
-            try:
-                self.cancel_order(o['orderId'])
-            except Exception:
-                pass
+    async def get_open_orders(self):
+        if self.cuenta is not None and self.cuenta.sincronizado:
+            return self.cuenta.ordenes_abiertas()
+        return await self.client.get_open_orders() or []
+
+    async def get_open_algo_orders(self):
+        """Órdenes algo abiertas (SL STOP_MARKET): Binance no las lista en openOrders."""
+        if self.cuenta is not None and self.cuenta.sincronizado:
+            return self.cuenta.algos_abiertas()
+        return await self.client.get_open_algo_orders() or []
+
+    async def cancel_order(self, orderId):
+        res = await self.client.cancel_order(orderId)
+        if isinstance(res, dict) and not res.get('code') and res.get('status') != 'ERROR':
+            self._quitar(orderId)
+        return res
+
+    async def cancel_algo_order(self, algoId):
+        res = await self.client.cancel_algo_order(algoId)
+        if _algo_cancelada(res):
+            self._quitar_algo(algoId)
+        return res
+
+    async def cancelar_algos(self, algo_ids):
+        """Cancela órdenes algo (no hay batch para algoOrder). Devuelve los algoId cancelados."""
+        res = await asyncio.gather(*(self.cancel_algo_order(aid) for aid in algo_ids))
+        return [aid for aid, r in zip(algo_ids, res) if _algo_cancelada(r)]
+
+    async def cancel_all(self):
+        res = await self.client.cancel_all()
+        if self.cuenta is not None and isinstance(res, dict) and int(res.get('code', 0) or 0) == 200:
+            self.cuenta.limpiar_ordenes()
+        return res
+
+    async def colocar_grid_batch(self, niveles, batch_size=GRID_BATCH_SIZE, concurrencia=GRID_BATCH_CONCURRENCY):
+        """
+        Coloca órdenes BUY del grid en lotes batchOrders (hasta 5 por request),
+        con un máximo de `concurrencia` requests en vuelo.
+        niveles: lista de (precio, qty). Devuelve un resultado por orden, en el mismo orden.
+        """
+        batch_size = max(1, min(int(batch_size), 5))
+        ts = reloj.ahora_ms()
+        params_list = []
+        for i, (price, qty) in enumerate(niveles):
+            cId = f"GRID_BUY_{i}_{ts}"
+            params_list.append(self.client._limit_params('BUY', price, qty, False, cId))
+
+        resultados = [None] * len(params_list)
+        validos = [i for i, p in enumerate(params_list) if p is not None]
+        for i, p in enumerate(params_list):
+            if p is None:
+                resultados[i] = {'ok': False, 'price': niveles[i][0], 'qty': niveles[i][1], 'error': 'price or qty zero'}
+
+        sem = asyncio.Semaphore(max(1, int(concurrencia)))
+
+        async def enviar(indices):
+            async with sem:
+                res = await self.client.place_limit_batch([params_list[i] for i in indices])
+            if not isinstance(res, list):
+                res = [res] * len(indices)
+            for i, r in zip(indices, res):
+                p = params_list[i]
+                ok = _confirmada(r)
+                item = {'ok': ok, 'price': p['price'], 'qty': p['quantity'], 'clientOrderId': p.get('newClientOrderId')}
+                if ok:
+                    item['orderId'] = r.get('orderId')
+                    self._registrar(r)
+                else:
+                    if isinstance(r, dict) and r.get('code'):
+                        RECHAZOS.inc(r['code'])
+                    item['error'] = (r.get('msg') or r.get('error')) if isinstance(r, dict) else str(r)
+                resultados[i] = item
+
+        lotes = [validos[j:j + batch_size] for j in range(0, len(validos), batch_size)]
+        await asyncio.gather(*(enviar(l) for l in lotes))
+        return resultados
+
+    def _tick_key(self, price):
+        return self.client.escala.a_ticks(price)
+
+    async def cancelar_ordenes_batch(self, order_ids, concurrencia=GRID_BATCH_CONCURRENCY):
+        """Cancela por lotes de hasta 10 orderIds (DELETE batchOrders). Devuelve los ids confirmados."""
+        lotes = [order_ids[j:j + 10] for j in range(0, len(order_ids), 10)]
+        sem = asyncio.Semaphore(max(1, int(concurrencia)))
+        confirmados = []
+
+        async def enviar(ids):
+            async with sem:
+                res = await self.client.cancel_orders_batch(ids)
+            for oid, r in zip(ids, res if isinstance(res, list) else []):
+                if isinstance(r, dict) and not r.get('code') and r.get('status') != 'ERROR':
+                    confirmados.append(oid)
+                    self._quitar(oid)
+                else:
+                    print(f"[ERROR] cancelar orden {oid}: {(r.get('msg') or r.get('error')) if isinstance(r, dict) else r}")
+
+        await asyncio.gather(*(enviar(l) for l in lotes))
+        return confirmados
 
-        for i, price in to_create:
+    def diff_grid(self, niveles, open_orders, tolerancia_ticks=0):
+        """
+        Calcula el diff mínimo entre el grid deseado y las BUY del grid en el libro.
+        niveles: lista de (precio, qty) ya filtrada por SAFE_SPREAD/avg_entry.
+        Las órdenes en reposo se indexan por precio en ticks (lista ordenada + bisect),
+        así cada nivel se resuelve en O(log n) en vez de recorrer todas las órdenes.
+        Devuelve (keep, cancel, place): órdenes a mantener, órdenes a cancelar y (precio, qty) a crear.
+        """
+        step = self.client.filters['stepSize']
+        en_libro = {}
+        for o in open_orders:
+            if o.get('side') != 'BUY' or o.get('reduceOnly') in (True, 'true', 'True'):
+                continue
+            if o.get('status', 'NEW') not in ('NEW', 'PARTIALLY_FILLED'):
+                continue
             try:
-                self.place_grid_buy(price, qty, i)
+                k = self._tick_key(o.get('price') or 0)
             except Exception:
-                pass
+                continue
+            en_libro.setdefault(k, []).append(o)
+        ticks = sorted(en_libro)
+
+        keep, place = [], []
+        usados = set()
+        for price, qty in niveles:
+            k = self._tick_key(price)
+            i = bisect.bisect_left(ticks, k - tolerancia_ticks)
+            found = None
+            while i < len(ticks) and ticks[i] <= k + tolerancia_ticks:
+                for o in en_libro[ticks[i]]:
+                    if o['orderId'] in usados:
+                        continue
+                    # Una orden con otra cantidad no sirve: se reemplaza
+                    if abs(float(o.get('origQty') or 0) - float(qty)) < step / 2:
+                        found = o
+                        break
+                if found:
+                    break
+                i += 1
+            if found:
+                usados.add(found['orderId'])
+                keep.append(found)
+            else:
+                place.append((price, qty))
+
+        cancel = [o for k in ticks for o in en_libro[k] if o['orderId'] not in usados]
+        return keep, cancel, place
+
+    def capacidad_grid(self):
+        """Órdenes de grid que entran ya en el rate limit (None si el cliente no tiene governor)."""
+        governor = getattr(self.client, 'governor', None)
+        if governor is None:
+            return None
+        # batchOrders pesa 5 por lote de GRID_BATCH_SIZE órdenes
+        return governor.capacidad(peso_por_orden=5 / GRID_BATCH_SIZE)
+
+    async def reconcile_grid(self, niveles, open_orders=None, tolerancia_ticks=0):
+        """
+        Lleva las BUY del grid al conjunto deseado tocando sólo lo que cambia:
+        cancela lo que sobra, coloca lo que falta y deja intactas (con su prioridad
+        en la cola) las que ya están en el precio y cantidad correctos. TP/SL no se tocan.
+        Si el rate limit no alcanza, coloca primero los niveles más cercanos al precio
+        y difiere el resto al próximo rebalanceo.
+        """
+        if open_orders is None:
+            open_orders = await self.get_open_orders()
+        keep, cancel, place = self.diff_grid(niveles, open_orders, tolerancia_ticks)
+        diferidas = 0
+        capacidad = self.capacidad_grid()
+        if capacidad is not None and len(place) > capacidad:
+            place = sorted(place, key=lambda n: -n[0])
+            diferidas = len(place) - capacidad
+            place = place[:capacidad]
+
+        cancelados = []
+        if cancel:
+            cancelados = await self.cancelar_ordenes_batch([o['orderId'] for o in cancel])
+        resultados = []
+        if place:
+            resultados = await self.colocar_grid_batch(place)
 
-        return {'created': len(to_create), 'canceled': len(to_cancel), 'kept': len(matched_ids)}
+        # Requests: cancel-all + recrear todo en lotes vs. sólo el diff
+        requests_full = 1 + math.ceil(len(niveles) / GRID_BATCH_SIZE)
+        requests_diff = math.ceil(len(cancel) / 10) + math.ceil(len(place) / GRID_BATCH_SIZE)
+        return {
+            'kept': len(keep),
+            'canceled': len(cancelados),
+            'cancel_failed': len(cancel) - len(cancelados),
+            'created': sum(1 for r in resultados if r['ok']),
+            'failed': [r for r in resultados if not r['ok']],
+            'deferred': diferidas,
+            'requests': requests_diff,
+            'requests_saved': requests_full - requests_diff,
+        }
 
-    def ensure_take_profits(self, avg_entry, qty, open_orders, offset=0.0002):
+    @staticmethod
+    def _es_tp(o):
+        return o.get('side') == 'SELL' and o.get('reduceOnly') in (True, 'true', 'True') and o.get('type', 'LIMIT') == 'LIMIT'
+
+    async def ensure_take_profits(self, avg_entry, qty, open_orders, offset=0.0002):
         """
-        Establece TP a +0.3% sobre el precio promedio de entrada.
-        Solo crea TP si no existe en rango y mejora el promedio.
+        Un solo TP a +0.3% sobre el precio promedio de entrada por toda la posición.
+        Si ya hay uno y cambió el precio o la cantidad se modifica en el lugar (PUT order);
+        los TP sobrantes se cancelan. Sólo sin TP (o si no se pudo modificar) se coloca uno nuevo.
         """
         tp_price = self.client.round_price(avg_entry * 1.003)
-        qty = self.client.round_qty(qty)
-        tp_orders = [o for o in open_orders if o.get('side') == 'SELL' and o.get('reduceOnly')]
-        def is_tp_near(price, target):
-            return abs(price - target) / target <= offset
-        tp_exists = any(is_tp_near(float(o.get('price')), tp_price) for o in tp_orders if o.get('price'))
-        if not tp_exists and tp_price > avg_entry:
-            self.place_tp_sell(tp_price, qty, "AUTO_TP")
-
-    def ensure_stop_loss(self, stop_price):
+        # La posición es un múltiplo exacto del step: al más cercano, no truncado (0.1 * 10 = 0.9999999999999999)
+        escala = self.client.escala
+        qty = escala.cantidad(round(qty / escala.step))
+        if not tp_price or not qty or tp_price <= avg_entry:
+            return {}
+        res = {}
+        tps = [o for o in open_orders if self._es_tp(o)]
+        if len(tps) > 1:
+            # Queda el que más ejecutó (y entre iguales el más viejo)
+            tps.sort(key=lambda o: (-float(o.get('executedQty') or 0), int(o.get('orderId') or 0)))
+            res['canceled'] = len(await self.cancelar_ordenes_batch([o['orderId'] for o in tps[1:]]))
+        if tps:
+            tp = tps[0]
+            # Un TP parcialmente llenado ya redujo la posición: su cantidad total es lo ejecutado + lo que queda
+            objetivo = escala.cantidad(round((float(tp.get('executedQty') or 0) + qty) / escala.step))
+            precio = float(tp.get('price') or 0)
+            if (precio and abs(precio - tp_price) / tp_price <= offset
+                    and abs(float(tp.get('origQty') or 0) - objetivo) < escala.step / 2):
+                res['kept'] = True
+                return res
+            if _confirmada(await self.modificar_orden(tp['orderId'], 'SELL', tp_price, objetivo)):
+                res['modified'] = True
+                return res
+            # Ya no se puede modificar (llenada o cancelada mientras tanto): reemplazar
+            await self.cancel_order(tp['orderId'])
+        await self.place_tp_sell(tp_price, qty, "AUTO_TP")
+        res['created'] = True
+        return res
+
+    @staticmethod
+    def es_stop_loss(a):
+        return a.get('orderType') in (ORDER_TYPE_STOP_MARKET, 'STOP') and a.get('closePosition') in (True, 'true', 'True')
+
+    async def ensure_stop_loss(self, stop_price, stops=None):
+        """
+        Un solo SL closePosition (orden algo, por algoId). Se conserva si su precio está dentro
+        de la tolerancia; si cambió se reemplaza (un STOP_MARKET no se puede modificar). Binance
+        rechaza un segundo closePosition en el mismo lado (-4130), así que primero se cancela el
+        viejo y después se crea el nuevo; si la cancelación falla el nuevo es rechazado y queda
+        el viejo. Los duplicados se cancelan. `stops`: órdenes algo abiertas (openAlgoOrders).
+        """
         stop_price = self.client.round_price(stop_price)
-        open_orders = self.get_open_orders()
-        sls = [o for o in open_orders if o.get('type') in (ORDER_TYPE_STOP_MARKET,'STOP') and o.get('closePosition') in (True,'true','True')]
+        if not stop_price:
+            return {}
+        if stops is None:
+            stops = await self.get_open_algo_orders()
+        sls = [a for a in stops if self.es_stop_loss(a)]
         tolerance = 0.002
+        vigente = None
         for o in sls:
             try:
-                sp = float(o.get('stopPrice') or 0)
+                sp = float(o.get('triggerPrice') or 0)
             except Exception:
                 sp = 0
             if abs(sp - stop_price)/stop_price <= tolerance:
-                return {'kept': True}
-            else:
-                self.cancel_order(o['orderId'])
-        self.place_sl_close_position(stop_price)
-        return {'created': True}
\ No newline at end of file
+                vigente = o
+                break
+        res = {'kept': vigente is not None}
+        if vigente is None:
+            if sls:
+                res['canceled'] = len(await self.cancelar_algos([o['algoId'] for o in sls]))
+            res['created'] = _confirmada_algo(await self.place_sl_close_position(stop_price))
+            if not res['created']:
+                print(f"[WARN] SL en {stop_price} no colocado: se reintenta en el próximo ajuste")
+            return res
+        sobrantes = [o['algoId'] for o in sls if o is not vigente]
+        if sobrantes:
+            res['canceled'] = len(await self.cancelar_algos(sobrantes))
+        return res
+
+
+def _confirmada(r):
+    return isinstance(r, dict) and 'orderId' in r and not r.get('code') and r.get('status') != 'ERROR'
+
+
+def _confirmada_algo(r):
+    # POST algoOrder responde con algoId/clientAlgoId, sin orderId
+    return isinstance(r, dict) and 'algoId' in r and not r.get('code') and r.get('status') != 'ERROR'
+
+
+def _algo_cancelada(r):
+    # DELETE algoOrder responde {"algoId": ..., "code": "200", "msg": "success"}
+    return isinstance(r, dict) and 'algoId' in r and str(r.get('code', 200)) == '200' and r.get('status') != 'ERROR'
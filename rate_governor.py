@@ -0,0 +1,169 @@
+import asyncio
+
+import reloj
+from config import (
+    RATE_LIMIT_WEIGHT_1M, RATE_LIMIT_ORDERS_10S, RATE_LIMIT_ORDERS_1M,
+    RATE_LIMIT_USO_MAX, RATE_LIMIT_GRID_ESPERA_MAX
+)
+
+# Carriles: menor número = más prioridad
+PROTECCION = 0   # SL, TP, cancelaciones, listenKey
+INFO = 1         # lecturas (órdenes abiertas, cuenta, posición, libro)
+GRID = 2         # colocación de BUY del grid
+# Fracción de cada límite que puede ocupar un carril: lo que queda por encima es reserva de los más prioritarios
+UMBRAL = {PROTECCION: 1.0, INFO: 0.85, GRID: 0.6}
+BAN_DEFAULT_S = {429: 60.0, 418: 120.0}
+
+
+class LimiteDiferido(Exception):
+    """Trabajo de baja prioridad descartado por falta de margen de rate limit."""
+
+
+class TokenBucket:
+    def __init__(self, nombre, capacidad, periodo_s):
+        self.nombre = nombre
+        self.configurar(capacidad, periodo_s)
+
+    def configurar(self, capacidad, periodo_s):
+        self.capacidad = float(capacidad)
+        self.periodo_s = float(periodo_s)
+        self.tasa = self.capacidad / self.periodo_s
+        self.tokens = self.capacidad
+        self._t = reloj.monotonic()
+
+    def _recargar(self):
+        ahora = reloj.monotonic()
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self._t) * self.tasa)
+        self._t = ahora
+
+    def disponibles(self, umbral=1.0):
+        """Tokens utilizables sin invadir la reserva por encima de `umbral`."""
+        self._recargar()
+        return self.tokens - self.capacidad * (1.0 - umbral)
+
+    def espera(self, n, umbral=1.0):
+        falta = n - self.disponibles(umbral)
+        return 0.0 if falta <= 0 else falta / self.tasa
+
+    def consumir(self, n):
+        self._recargar()
+        self.tokens -= n
+
+    def sincronizar(self, usado):
+        """El header del exchange manda: nunca creer que queda más de lo que él cuenta."""
+        self._recargar()
+        self.tokens = min(self.tokens, self.capacidad - float(usado))
+
+
+class RateGovernor:
+    """
+    Gobernador de rate limits del lado cliente. Un token bucket por límite
+    (peso/minuto, órdenes/10s, órdenes/minuto) sincronizado con los headers
+    X-MBX-USED-WEIGHT-1M / X-MBX-ORDER-COUNT-*; cada request reserva sus tokens
+    antes de salir según su carril. Con presión, GRID se difiere o descarta
+    mientras SL/TP y cancelaciones siguen pasando; tras un 429/418 se respeta
+    Retry-After y sólo esperan los carriles que no se pueden descartar.
+    """
+
+    def __init__(self, peso_1m=RATE_LIMIT_WEIGHT_1M, ordenes_10s=RATE_LIMIT_ORDERS_10S,
+                 ordenes_1m=RATE_LIMIT_ORDERS_1M, uso_max=RATE_LIMIT_USO_MAX):
+        self.uso_max = float(uso_max)
+        self.peso = TokenBucket('weight_1m', peso_1m * self.uso_max, 60)
+        self.ordenes_10s = TokenBucket('orders_10s', ordenes_10s * self.uso_max, 10)
+        self.ordenes_1m = TokenBucket('orders_1m', ordenes_1m * self.uso_max, 60)
+        self.baneado_hasta = 0.0
+        self.diferidas = 0
+        self.esperas = 0
+        self.baneos = 0
+
+    def configurar(self, rate_limits):
+        """Ajusta las capacidades con los rateLimits de exchangeInfo."""
+        for rl in rate_limits or []:
+            tipo, intervalo = rl.get('rateLimitType'), rl.get('interval')
+            periodo = {'SECOND': 1, 'MINUTE': 60}.get(intervalo, 0) * int(rl.get('intervalNum', 1))
+            limite = float(rl.get('limit', 0)) * self.uso_max
+            if tipo == 'REQUEST_WEIGHT' and periodo == 60:
+                self.peso.configurar(limite, periodo)
+            elif tipo == 'ORDERS' and periodo == 10:
+                self.ordenes_10s.configurar(limite, periodo)
+            elif tipo == 'ORDERS' and periodo == 60:
+                self.ordenes_1m.configurar(limite, periodo)
+
+    def _necesidad(self, peso, ordenes):
+        return ((self.peso, peso), (self.ordenes_10s, ordenes), (self.ordenes_1m, ordenes))
+
+    def _espera(self, peso, ordenes, prioridad):
+        umbral = UMBRAL[prioridad]
+        espera = max(b.espera(n, umbral) for b, n in self._necesidad(peso, ordenes) if n)
+        return max(espera, self.baneado_hasta - reloj.monotonic())
+
+    async def adquirir(self, peso=1, ordenes=0, prioridad=INFO, espera_max=None):
+        """Reserva tokens para un request; GRID espera como mucho `espera_max` y si no, se descarta."""
+        if espera_max is None:
+            espera_max = RATE_LIMIT_GRID_ESPERA_MAX if prioridad == GRID else float('inf')
+        esperado = 0.0
+        while True:
+            espera = self._espera(peso, ordenes, prioridad)
+            if espera <= 0:
+                break
+            if esperado + espera > espera_max:
+                self.diferidas += 1
+                raise LimiteDiferido(f"rate limit: sin margen para peso={peso} ordenes={ordenes}")
+            self.esperas += 1
+            await asyncio.sleep(espera)
+            esperado += espera
+        for b, n in self._necesidad(peso, ordenes):
+            if n:
+                b.consumir(n)
+
+    def registrar_headers(self, headers):
+        if not headers:
+            return
+        for k, v in headers.items():
+            k = k.lower()
+            try:
+                if k == 'x-mbx-used-weight-1m':
+                    self.peso.sincronizar(int(v))
+                elif k == 'x-mbx-order-count-10s':
+                    self.ordenes_10s.sincronizar(int(v))
+                elif k == 'x-mbx-order-count-1m':
+                    self.ordenes_1m.sincronizar(int(v))
+            except ValueError:
+                continue
+
+    def registrar_error(self, status, headers=None):
+        if status not in BAN_DEFAULT_S:
+            return
+        retry = None
+        for k, v in (headers or {}).items():
+            if k.lower() == 'retry-after':
+                try:
+                    retry = float(v)
+                except ValueError:
+                    pass
+        hasta = reloj.monotonic() + (retry if retry is not None else BAN_DEFAULT_S[status])
+        if hasta > self.baneado_hasta:
+            self.baneado_hasta = hasta
+            self.baneos += 1
+            print(f"[RATE] HTTP {status}: pausa de requests {hasta - reloj.monotonic():.0f}s")
+        # Tras un 429 el presupuesto del minuto está agotado
+        self.peso.sincronizar(self.peso.capacidad / self.uso_max)
+
+    def capacidad(self, peso_por_orden=1.0, prioridad=GRID):
+        """Órdenes que el carril puede enviar ya sin esperar (para dimensionar el rebalanceo)."""
+        if self.baneado_hasta > reloj.monotonic():
+            return 0
+        umbral = UMBRAL[prioridad]
+        por_peso = self.peso.disponibles(umbral) / peso_por_orden if peso_por_orden else float('inf')
+        n = min(por_peso, self.ordenes_10s.disponibles(umbral), self.ordenes_1m.disponibles(umbral))
+        return max(0, int(n))
+
+    def estado(self):
+        return {
+            'weight_1m': round(self.peso.capacidad - self.peso.disponibles(), 1),
+            'orders_10s': round(self.ordenes_10s.capacidad - self.ordenes_10s.disponibles(), 1),
+            'orders_1m': round(self.ordenes_1m.capacidad - self.ordenes_1m.disponibles(), 1),
+            'baneado': self.baneado_hasta > reloj.monotonic(),
+            'diferidas': self.diferidas,
+            'esperas': self.esperas,
+        }
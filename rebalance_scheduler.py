@@ -0,0 +1,113 @@
+import asyncio
+
+import metrics
+import reloj
+
+from config import REBALANCE_SECONDS, REBALANCE_DEBOUNCE_SECONDS
+
+
+class RebalanceScheduler:
+    """
+    Tarea dedicada que ejecuta el rebalanceo fuera de los handlers de stream.
+
+    Los handlers sólo llaman a `solicitar()` (O(1), sin await). Las solicitudes se
+    coalescen en una sola ejecución, nunca corren dos rebalanceos a la vez y entre
+    rebalanceos exitosos se respeta `intervalo`; tras una ejecución sin efecto la
+    siguiente espera un backoff exponencial (de `debounce` hasta `intervalo`).
+    `debounce` agrupa ráfagas de solicitudes; `forzar` ignora el intervalo y
+    `deadline` (segundos) acota la espera.
+    """
+
+    def __init__(self, accion, intervalo=REBALANCE_SECONDS, debounce=REBALANCE_DEBOUNCE_SECONDS, nombre="rebalanceo", symbol=""):
+        self.accion = accion  # coroutine -> True si efectivamente rebalanceó
+        self.nombre = nombre
+        self.symbol = symbol
+        self.intervalo = float(intervalo)
+        self.debounce = float(debounce)
+        self._evento = asyncio.Event()
+        self._urgente = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._pendiente_desde = None
+        self._forzado = False
+        self._deadline = None
+        self._no_antes_de = 0.0
+        self._backoff = 0.0
+        self._stop = False
+        self.ejecuciones = 0  # llamadas a `accion`, con o sin efecto
+        self.exitosas = 0
+        self.lag_ultimo = 0.0  # segundos entre la primera solicitud y el inicio del rebalanceo
+
+    def solicitar(self, forzar=False, deadline=None):
+        if self._pendiente_desde is None:
+            self._pendiente_desde = reloj.monotonic()
+            self._evento.set()
+        else:
+            metrics.COALESCIDAS.inc(self.nombre, self.symbol)
+        if forzar or deadline is not None:
+            if forzar:
+                self._forzado = True
+            if deadline is not None:
+                limite = reloj.monotonic() + deadline
+                if self._deadline is None or limite < self._deadline:
+                    self._deadline = limite
+            self._urgente.set()
+
+    def _espera(self):
+        objetivo = self._pendiente_desde + self.debounce
+        if not self._forzado:
+            objetivo = max(objetivo, self._no_antes_de)
+        if self._deadline is not None:
+            objetivo = min(objetivo, self._deadline)
+        return objetivo - reloj.monotonic()
+
+    async def run(self):
+        while not self._stop:
+            await self._evento.wait()
+            if self._stop:
+                return
+            if self._pendiente_desde is None:
+                self._evento.clear()
+                continue
+            while True:
+                espera = self._espera()
+                if espera <= 0:
+                    break
+                self._urgente.clear()
+                try:
+                    await asyncio.wait_for(self._urgente.wait(), espera)
+                except asyncio.TimeoutError:
+                    pass
+                if self._stop:
+                    return
+
+            self.lag_ultimo = reloj.monotonic() - self._pendiente_desde
+            metrics.COLA_LAG.observar(self.lag_ultimo, self.nombre, self.symbol)
+            self._evento.clear()
+            self._pendiente_desde = None
+            self._forzado = False
+            self._deadline = None
+            await self.ejecutar()
+
+    async def ejecutar(self):
+        async with self._lock:
+            self.ejecuciones += 1
+            try:
+                ok = await self.accion()
+            except Exception as e:
+                print(f"[SCHED] Error en {self.nombre}: {e}")
+                ok = False
+        if ok:
+            self.exitosas += 1
+            self._backoff = 0.0
+            self._no_antes_de = reloj.monotonic() + self.intervalo
+        else:
+            # Sin efecto (precio inválido, grid hundido...): no reintentar a cada debounce
+            self._backoff = min(self.intervalo, max(self.debounce, 2 * self._backoff))
+            self._no_antes_de = reloj.monotonic() + self._backoff
+        return ok
+
+    def stop(self):
+        # Despierta a run() tanto si espera una solicitud como si está en el debounce
+        self._stop = True
+        self._evento.set()
+        self._urgente.set()
@@ -0,0 +1,29 @@
+"""
+Fuentes de tiempo del bot. En producción son el reloj de pared y el reloj del
+event loop; el backtest reemplaza ambas por tiempo simulado (ver backtest.py).
+"""
+import asyncio
+import time
+
+_fuente = time.time
+
+
+def ahora():
+    return _fuente()
+
+
+def ahora_ms():
+    return int(_fuente() * 1000)
+
+
+def usar_fuente(fuente=None):
+    global _fuente
+    _fuente = fuente or time.time
+
+
+def monotonic():
+    # El tiempo del event loop: monotónico en producción, simulado en el backtest
+    try:
+        return asyncio.get_running_loop().time()
+    except RuntimeError:
+        return time.monotonic()
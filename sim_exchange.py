@@ -0,0 +1,683 @@
+import asyncio
+import bisect
+import itertools
+import types
+from collections import deque
+
+from binance_client import _SymbolRounding, DEFAULT_FILTERS
+from config import SYMBOL, MAKER_FEE_RATE, TAKER_FEE_RATE
+
+MAX_TRADES = 10000  # Fills recordados para userTrades
+# Tipos que Binance sólo acepta por el Algo Order API (POST /algoOrder), no por /order
+TIPOS_CONDICIONALES = ('STOP', 'STOP_MARKET', 'TAKE_PROFIT', 'TAKE_PROFIT_MARKET', 'TRAILING_STOP_MARKET')
+
+
+class ErrorExchange(Exception):
+    """Rechazo del exchange simulado con el mismo code/msg que devolvería Binance."""
+
+    def __init__(self, code, msg):
+        super().__init__(f"APIError(code={code}): {msg}")
+        self.code = code
+        self.msg = msg
+
+
+class Orden:
+    __slots__ = ('orderId', 'clientOrderId', 'side', 'type', 'price', 'tick', 'origQty', 'executedQty',
+                 'cumQuote', 'stopPrice', 'reduceOnly', 'closePosition', 'status', 'time', 'updateTime')
+
+    def a_rest(self, symbol):
+        return {
+            'orderId': self.orderId,
+            'clientOrderId': self.clientOrderId,
+            'symbol': symbol,
+            'side': self.side,
+            'type': self.type,
+            'price': f"{self.price:.8f}".rstrip('0').rstrip('.') if self.price else "0",
+            'origQty': f"{self.origQty:.8f}".rstrip('0').rstrip('.'),
+            'executedQty': f"{self.executedQty:.8f}".rstrip('0').rstrip('.') or "0",
+            'avgPrice': f"{(self.cumQuote / self.executedQty) if self.executedQty else 0:.8f}",
+            'stopPrice': f"{self.stopPrice or 0}",
+            'reduceOnly': self.reduceOnly,
+            'closePosition': self.closePosition,
+            'status': self.status,
+            'timeInForce': 'GTC',
+            'time': self.time,
+            'updateTime': self.updateTime,
+        }
+
+
+class OrdenAlgo:
+    """Orden condicional del Algo Order API: tiene su propio algoId y no es una orden hasta dispararse."""
+    __slots__ = ('algoId', 'clientAlgoId', 'side', 'orderType', 'triggerPrice', 'quantity', 'reduceOnly',
+                 'closePosition', 'status', 'actualOrderId', 'time', 'updateTime', 'triggerTime')
+
+    def a_rest(self, symbol):
+        return {
+            'algoId': self.algoId,
+            'clientAlgoId': self.clientAlgoId,
+            'algoType': 'CONDITIONAL',
+            'orderType': self.orderType,
+            'symbol': symbol,
+            'side': self.side,
+            'positionSide': 'BOTH',
+            'timeInForce': 'GTC',
+            'quantity': f"{self.quantity:.8f}".rstrip('0').rstrip('.') or "0",
+            'algoStatus': self.status,
+            'actualOrderId': str(self.actualOrderId or ''),
+            'triggerPrice': f"{self.triggerPrice}",
+            'price': "0",
+            'workingType': 'CONTRACT_PRICE',
+            'closePosition': self.closePosition,
+            'reduceOnly': self.reduceOnly,
+            'createTime': self.time,
+            'updateTime': self.updateTime,
+            'triggerTime': self.triggerTime,
+        }
+
+
+class MotorMatching:
+    """
+    Motor de matching de un símbolo para backtest y mock del exchange.
+
+    Las órdenes LIMIT en reposo se ordenan por precio (ticks enteros) y, dentro de
+    cada precio, por llegada (prioridad precio-tiempo). Cada trade de la cinta
+    consume su volumen contra las órdenes que cruza. Como en Binance, los STOP_MARKET
+    son órdenes algo aparte (algoId, openAlgoOrders): al tocar el trigger se convierten
+    en una orden MARKET. Cada cambio se emite como evento del USER stream
+    (ORDER_TRADE_UPDATE / ALGO_UPDATE / ACCOUNT_UPDATE) a través de `emitir`.
+    """
+
+    def __init__(self, symbol=SYMBOL, filters=None, maker_fee=MAKER_FEE_RATE, taker_fee=TAKER_FEE_RATE,
+                 emitir=None, trade_through=False):
+        self.symbol = symbol
+        self.filters = dict(filters or DEFAULT_FILTERS)
+        self.maker_fee = maker_fee
+        self.taker_fee = taker_fee
+        self.emitir = emitir or (lambda evento: None)
+        self.trade_through = trade_through  # True: sólo llena si el trade atraviesa el precio
+        self._ids = itertools.count(1)
+        self._ids_algo = itertools.count(1)
+        self.ordenes = {}        # orderId -> Orden abierta
+        self.por_client_id = {}  # clientOrderId -> Orden abierta
+        self.bids = {}           # tick -> deque[Orden]
+        self.bid_ticks = []      # ascendente
+        self.asks = {}
+        self.ask_ticks = []
+        self.algos = {}          # algoId -> OrdenAlgo sin disparar
+        self.algos_por_client_id = {}
+        self.posicion = 0.0
+        self.entrada = 0.0
+        self.realizado = 0.0
+        self.fees = 0.0
+        self.balance = 0.0       # USDT de la cuenta (para availableBalance)
+        self.ultimo_precio = None
+        self.ahora_ms = 0
+        self.contadores = {'creadas': 0, 'canceladas': 0, 'modificadas': 0, 'rechazadas': 0, 'fills': 0, 'llenadas': 0}
+        self.trades = deque(maxlen=MAX_TRADES)  # fills con el formato de GET userTrades (id = 't' del evento)
+
+    # --- utilidades ---
+    def _tick(self, price):
+        return int(round(float(price) / self.filters['tickSize']))
+
+    def _es_multiplo(self, valor, paso):
+        n = float(valor) / paso
+        return abs(n - round(n)) < 1e-6
+
+    def _libro(self, side):
+        return (self.bids, self.bid_ticks) if side == 'BUY' else (self.asks, self.ask_ticks)
+
+    def _insertar(self, o):
+        libro, ticks = self._libro(o.side)
+        cola = libro.get(o.tick)
+        if cola is None:
+            cola = libro[o.tick] = deque()
+            bisect.insort(ticks, o.tick)
+        cola.append(o)
+
+    def _quitar_del_libro(self, o):
+        libro, ticks = self._libro(o.side)
+        cola = libro.get(o.tick)
+        if cola is None:
+            return
+        try:
+            cola.remove(o)
+        except ValueError:
+            return
+        if not cola:
+            del libro[o.tick]
+            i = bisect.bisect_left(ticks, o.tick)
+            if i < len(ticks) and ticks[i] == o.tick:
+                del ticks[i]
+
+    def _cerrar(self, o, status):
+        o.status = status
+        o.updateTime = self.ahora_ms
+        self.ordenes.pop(o.orderId, None)
+        self.por_client_id.pop(o.clientOrderId, None)
+
+    # --- API de órdenes ---
+    def _rechazar(self, code, msg):
+        self.contadores['rechazadas'] += 1
+        raise ErrorExchange(code, msg)
+
+    def _validar_cantidad(self, side, qty, reduce_only, close_position):
+        if not close_position:
+            if not self._es_multiplo(qty, self.filters['stepSize']):
+                self._rechazar(-1111, "Precision is over the maximum defined for this asset.")
+            if qty < self.filters['minQty']:
+                self._rechazar(-4003, "Quantity less than or equal to zero.")
+        if reduce_only and side == 'SELL' and self.posicion <= 0:
+            self._rechazar(-2022, "ReduceOnly Order is rejected.")
+
+    def _nueva_orden(self, cid, side, tipo, price, qty, reduce_only, close_position, stop=0.0):
+        o = Orden()
+        o.orderId = next(self._ids)
+        o.clientOrderId = cid
+        o.side = side
+        o.type = tipo
+        o.price = price
+        o.tick = self._tick(price) if price else 0
+        o.origQty = qty
+        o.executedQty = 0.0
+        o.cumQuote = 0.0
+        o.stopPrice = stop
+        o.reduceOnly = reduce_only
+        o.closePosition = close_position
+        o.status = 'NEW'
+        o.time = o.updateTime = self.ahora_ms
+        self.ordenes[o.orderId] = o
+        self.por_client_id[cid] = o
+        self._emitir_orden(o, 'NEW', 0.0, 0.0, 0.0)
+        return o
+
+    def crear_orden(self, params):
+        side = params.get('side')
+        tipo = params.get('type')
+        if tipo in TIPOS_CONDICIONALES:
+            self._rechazar(-4120, "Order type not supported for this endpoint. Please use the Algo Order API endpoints instead.")
+        if side not in ('BUY', 'SELL') or tipo not in ('LIMIT', 'MARKET'):
+            self._rechazar(-1116, "Invalid orderType.")
+        reduce_only = str(params.get('reduceOnly', False)).lower() == 'true'
+        close_position = str(params.get('closePosition', False)).lower() == 'true'
+        qty = float(params.get('quantity') or 0)
+        price = float(params.get('price') or 0)
+        if tipo == 'LIMIT' and not self._es_multiplo(price, self.filters['tickSize']):
+            self._rechazar(-4014, "Price not increased by tick size.")
+        self._validar_cantidad(side, qty, reduce_only, close_position)
+        cid = params.get('newClientOrderId') or f"sim_{next(self._ids)}"
+        if cid in self.por_client_id:
+            self._rechazar(-4015, "Client order id is not valid.")
+
+        self.contadores['creadas'] += 1
+        o = self._nueva_orden(cid, side, tipo, price, qty, reduce_only, close_position)
+        if tipo == 'MARKET':
+            self._ejecutar_mercado(o)
+        elif self.ultimo_precio is not None and (
+                (side == 'BUY' and price >= self.ultimo_precio) or (side == 'SELL' and price <= self.ultimo_precio)):
+            # Cruza el mercado al colocarse: se ejecuta como taker al último precio
+            self._llenar(o, o.origQty, self.ultimo_precio, maker=False)
+        else:
+            self._insertar(o)
+        return o.a_rest(self.symbol)
+
+    def crear_algo(self, params):
+        """POST algoOrder: STOP_MARKET condicional (algoType CONDITIONAL, triggerPrice)."""
+        side = params.get('side')
+        tipo = params.get('type')
+        if str(params.get('algoType', '')).upper() != 'CONDITIONAL':
+            self._rechazar(-1116, "Invalid algoType.")
+        if side not in ('BUY', 'SELL') or tipo != 'STOP_MARKET':
+            self._rechazar(-1116, "Invalid orderType.")
+        trigger = float(params.get('triggerPrice') or 0)
+        if trigger <= 0 or not self._es_multiplo(trigger, self.filters['tickSize']):
+            self._rechazar(-4014, "Price not increased by tick size.")
+        reduce_only = str(params.get('reduceOnly', False)).lower() == 'true'
+        close_position = str(params.get('closePosition', False)).lower() == 'true'
+        qty = float(params.get('quantity') or 0)
+        self._validar_cantidad(side, qty, reduce_only, close_position)
+        caid = params.get('clientAlgoId')
+        if caid in self.algos_por_client_id:
+            self._rechazar(-4015, "Client order id is not valid.")
+        if close_position and any(o.closePosition and o.side == side for o in self.algos.values()):
+            self._rechazar(-4130, "An open stop or take profit order with GTE and closePosition in the direction is existing.")
+
+        a = OrdenAlgo()
+        a.algoId = next(self._ids_algo)
+        caid = caid or f"sim_algo_{a.algoId}"
+        a.clientAlgoId = caid
+        a.side = side
+        a.orderType = tipo
+        a.triggerPrice = trigger
+        a.quantity = qty
+        a.reduceOnly = reduce_only
+        a.closePosition = close_position
+        a.status = 'NEW'
+        a.actualOrderId = None
+        a.time = a.updateTime = self.ahora_ms
+        a.triggerTime = 0
+        self.contadores['creadas'] += 1
+        self.algos[a.algoId] = a
+        self.algos_por_client_id[caid] = a
+        self._emitir_algo(a)
+        return a.a_rest(self.symbol)
+
+    def _cerrar_algo(self, a, status):
+        a.status = status
+        a.updateTime = self.ahora_ms
+        self.algos.pop(a.algoId, None)
+        self.algos_por_client_id.pop(a.clientAlgoId, None)
+
+    def cancelar_algo(self, algo_id=None, client_algo_id=None):
+        a = self.algos.get(int(algo_id)) if algo_id is not None else self.algos_por_client_id.get(client_algo_id)
+        if a is None:
+            raise ErrorExchange(-2011, "Unknown order sent.")
+        self._cerrar_algo(a, 'CANCELED')
+        self.contadores['canceladas'] += 1
+        self._emitir_algo(a)
+        return {'algoId': a.algoId, 'clientAlgoId': a.clientAlgoId, 'code': '200', 'msg': 'success'}
+
+    def cancelar_algos_todas(self):
+        for aid in list(self.algos):
+            self.cancelar_algo(aid)
+        return {'code': 200, 'msg': 'The operation of cancel all open order is done.'}
+
+    def algos_abiertas(self):
+        return [a.a_rest(self.symbol) for a in self.algos.values()]
+
+    def _disparar(self, a):
+        # El trigger convierte el algo en una orden MARKET real (actualOrderId) que se ejecuta ya
+        self._cerrar_algo(a, 'TRIGGERED')
+        a.triggerTime = self.ahora_ms
+        o = self._nueva_orden(a.clientAlgoId, a.side, 'MARKET', 0.0, a.quantity, a.reduceOnly, a.closePosition,
+                              stop=a.triggerPrice)
+        a.actualOrderId = o.orderId
+        self._emitir_algo(a)
+        self._ejecutar_mercado(o)
+        a.status = 'FINISHED'
+        self._emitir_algo(a)
+
+    def cancelar(self, order_id=None, client_order_id=None):
+        o = self.ordenes.get(int(order_id)) if order_id is not None else self.por_client_id.get(client_order_id)
+        if o is None:
+            raise ErrorExchange(-2011, "Unknown order sent.")
+        if o.type == 'LIMIT':
+            self._quitar_del_libro(o)
+        self._cerrar(o, 'CANCELED')
+        self.contadores['canceladas'] += 1
+        self._emitir_orden(o, 'CANCELED', 0.0, 0.0, 0.0)
+        return o.a_rest(self.symbol)
+
+    def modificar(self, order_id=None, client_order_id=None, price=None, qty=None):
+        """
+        PUT order: nuevo precio/cantidad de una LIMIT abierta. Conserva la prioridad en
+        la cola sólo si baja la cantidad en el mismo precio.
+        """
+        o = self.ordenes.get(int(order_id)) if order_id is not None else self.por_client_id.get(client_order_id)
+        if o is None:
+            raise ErrorExchange(-2013, "Order does not exist.")
+        if o.type != 'LIMIT':
+            raise ErrorExchange(-1116, "Invalid orderType.")
+        price = float(price or 0)
+        qty = float(qty or 0)
+        if not self._es_multiplo(price, self.filters['tickSize']):
+            raise ErrorExchange(-4014, "Price not increased by tick size.")
+        if not self._es_multiplo(qty, self.filters['stepSize']):
+            raise ErrorExchange(-1111, "Precision is over the maximum defined for this asset.")
+        if qty <= o.executedQty or qty < self.filters['minQty']:
+            raise ErrorExchange(-4003, "Quantity less than or equal to zero.")
+        tick = self._tick(price)
+        if tick == o.tick and abs(qty - o.origQty) < 1e-12:
+            raise ErrorExchange(-5027, "No need to modify the order.")
+        pierde_prioridad = tick != o.tick or qty > o.origQty
+        if pierde_prioridad:
+            self._quitar_del_libro(o)
+        o.price = price
+        o.tick = tick
+        o.origQty = qty
+        o.updateTime = self.ahora_ms
+        self.contadores['modificadas'] += 1
+        self._emitir_orden(o, o.status, 0.0, 0.0, 0.0, ejecucion='AMENDMENT')
+        if pierde_prioridad:
+            if self.ultimo_precio is not None and (
+                    (o.side == 'BUY' and price >= self.ultimo_precio) or (o.side == 'SELL' and price <= self.ultimo_precio)):
+                self._llenar(o, o.origQty - o.executedQty, self.ultimo_precio, maker=False)
+            else:
+                self._insertar(o)
+        return o.a_rest(self.symbol)
+
+    def cancelar_todas(self):
+        for oid in list(self.ordenes):
+            self.cancelar(oid)
+        return {'code': 200, 'msg': 'The operation of cancel all open order is done.'}
+
+    def ordenes_abiertas(self):
+        return [o.a_rest(self.symbol) for o in self.ordenes.values()]
+
+    def trades_cuenta(self, start_time=None, from_id=None, limit=500):
+        """GET userTrades: fills ascendentes por id desde fromId o desde startTime."""
+        out = []
+        for t in self.trades:
+            if (from_id is not None and t['id'] < int(from_id)) or (start_time is not None and t['time'] < int(start_time)):
+                continue
+            out.append(t)
+            if len(out) >= int(limit):
+                break
+        return out
+
+    # --- cinta de trades ---
+    def on_trade(self, precio, qty, ts_ms):
+        self.ultimo_precio = precio
+        self.ahora_ms = ts_ms
+        # Stops primero: un SL se dispara aunque haya límites en el mismo precio
+        if self.algos:
+            for a in list(self.algos.values()):
+                if (a.side == 'SELL' and precio <= a.triggerPrice) or (a.side == 'BUY' and precio >= a.triggerPrice):
+                    self._disparar(a)
+
+        tick = self._tick(precio)
+        restante = qty
+        # BUY en reposo con precio >= trade (o > si trade_through)
+        while restante > 0 and self.bid_ticks:
+            top = self.bid_ticks[-1]
+            if top < tick or (self.trade_through and top == tick):
+                break
+            restante = self._consumir_nivel(self.bids[top], restante)
+        while restante > 0 and self.ask_ticks:
+            top = self.ask_ticks[0]
+            if top > tick or (self.trade_through and top == tick):
+                break
+            restante = self._consumir_nivel(self.asks[top], restante)
+
+    def _consumir_nivel(self, cola, restante):
+        while restante > 0 and cola:
+            o = cola[0]
+            pendiente = o.origQty - o.executedQty
+            if o.reduceOnly and o.side == 'SELL':
+                pendiente = min(pendiente, max(0.0, self.posicion))
+                if pendiente <= 0:
+                    cola.popleft()
+                    self._cerrar(o, 'EXPIRED')
+                    self._emitir_orden(o, 'EXPIRED', 0.0, 0.0, 0.0)
+                    self._limpiar_nivel(o)
+                    continue
+            llenar = min(pendiente, restante)
+            restante -= llenar
+            self._llenar(o, llenar, o.price, maker=True)
+        return restante
+
+    def _limpiar_nivel(self, o):
+        libro, ticks = self._libro(o.side)
+        cola = libro.get(o.tick)
+        if cola is not None and not cola:
+            del libro[o.tick]
+            i = bisect.bisect_left(ticks, o.tick)
+            if i < len(ticks) and ticks[i] == o.tick:
+                del ticks[i]
+
+    def _ejecutar_mercado(self, o):
+        qty = o.origQty
+        if o.closePosition or o.reduceOnly:
+            qty = abs(self.posicion) if o.closePosition else min(qty, abs(self.posicion))
+        if qty <= 0 or self.ultimo_precio is None:
+            self._cerrar(o, 'EXPIRED')
+            self._emitir_orden(o, 'EXPIRED', 0.0, 0.0, 0.0)
+            return
+        if o.closePosition:
+            o.origQty = qty
+        self._llenar(o, qty, self.ultimo_precio, maker=False)
+
+    def _llenar(self, o, qty, precio, maker):
+        fee = precio * qty * (self.maker_fee if maker else self.taker_fee)
+        o.executedQty += qty
+        o.cumQuote += precio * qty
+        o.updateTime = self.ahora_ms
+        self.fees += fee
+        signo = 1 if o.side == 'BUY' else -1
+        realizado = self.realizado
+        self._actualizar_posicion(signo * qty, precio)
+        self.balance -= fee
+        self.contadores['fills'] += 1
+        self.trades.append({
+            'id': self.contadores['fills'], 'orderId': o.orderId, 'symbol': self.symbol, 'side': o.side,
+            'price': f"{precio}", 'qty': f"{qty}", 'quoteQty': f"{precio * qty}", 'commission': f"{fee}",
+            'commissionAsset': 'USDT', 'realizedPnl': f"{self.realizado - realizado}", 'maker': maker,
+            'buyer': o.side == 'BUY', 'positionSide': 'BOTH', 'time': self.ahora_ms,
+        })
+        lleno = o.executedQty >= o.origQty - 1e-12
+        if lleno:
+            if o.type == 'LIMIT':
+                libro, _ = self._libro(o.side)
+                cola = libro.get(o.tick)
+                if cola and cola[0] is o:
+                    cola.popleft()
+                    self._limpiar_nivel(o)
+                else:
+                    self._quitar_del_libro(o)
+            self._cerrar(o, 'FILLED')
+            self.contadores['llenadas'] += 1
+        self._emitir_orden(o, 'FILLED' if lleno else 'PARTIALLY_FILLED', qty, precio, fee, maker)
+        self._emitir_cuenta()
+
+    def _actualizar_posicion(self, delta, precio):
+        pos = self.posicion
+        if pos == 0 or (pos > 0) == (delta > 0):
+            nueva = pos + delta
+            self.entrada = (abs(pos) * self.entrada + abs(delta) * precio) / abs(nueva)
+            self.posicion = nueva
+            return
+        cerrar = min(abs(delta), abs(pos))
+        pnl = cerrar * (precio - self.entrada) * (1 if pos > 0 else -1)
+        self.realizado += pnl
+        self.balance += pnl
+        nueva = pos + delta
+        if abs(nueva) < 1e-12:
+            self.posicion = 0.0
+            self.entrada = 0.0
+        elif (nueva > 0) != (pos > 0):
+            self.posicion = nueva
+            self.entrada = precio
+        else:
+            self.posicion = nueva
+
+    def no_realizado(self, precio=None):
+        precio = precio if precio is not None else self.ultimo_precio
+        if not self.posicion or precio is None:
+            return 0.0
+        return self.posicion * (precio - self.entrada)
+
+    # --- eventos USER stream ---
+    def _emitir_orden(self, o, estado, qty, precio, fee, maker=False, ejecucion=None):
+        self.emitir({
+            'e': 'ORDER_TRADE_UPDATE', 'E': self.ahora_ms, 'T': self.ahora_ms,
+            'o': {
+                's': self.symbol, 'c': o.clientOrderId, 'S': o.side, 'o': o.type, 'f': 'GTC',
+                'q': f"{o.origQty}", 'p': f"{o.price}", 'ap': f"{(o.cumQuote / o.executedQty) if o.executedQty else 0}",
+                'sp': f"{o.stopPrice or 0}", 'x': 'TRADE' if qty else (ejecucion or estado), 'X': estado, 'i': o.orderId,
+                'l': f"{qty}", 'z': f"{o.executedQty}", 'L': f"{precio}", 'N': 'USDT', 'n': f"{fee}",
+                'T': self.ahora_ms, 't': self.contadores['fills'] if qty else 0, 'm': maker,
+                'R': o.reduceOnly, 'cp': o.closePosition, 'ps': 'BOTH', 'rp': '0',
+            },
+        })
+
+    def _emitir_algo(self, a):
+        self.emitir({
+            'e': 'ALGO_UPDATE', 'E': self.ahora_ms, 'T': self.ahora_ms,
+            'o': {
+                'caid': a.clientAlgoId, 'aid': a.algoId, 'at': 'CONDITIONAL', 'o': a.orderType, 's': self.symbol,
+                'S': a.side, 'ps': 'BOTH', 'f': 'GTC', 'q': f"{a.quantity}", 'X': a.status,
+                'ai': str(a.actualOrderId or ''), 'tp': f"{a.triggerPrice}", 'p': '0', 'wt': 'CONTRACT_PRICE',
+                'cp': a.closePosition, 'R': a.reduceOnly, 'tt': a.triggerTime,
+            },
+        })
+
+    def _emitir_cuenta(self):
+        self.emitir({
+            'e': 'ACCOUNT_UPDATE', 'E': self.ahora_ms, 'T': self.ahora_ms,
+            'a': {
+                'm': 'ORDER',
+                'B': [{'a': 'USDT', 'wb': f"{self.balance}", 'cw': f"{self.balance}", 'bc': '0'}],
+                'P': [{'s': self.symbol, 'pa': f"{self.posicion}", 'ep': f"{self.entrada}",
+                       'up': f"{self.no_realizado()}", 'mt': 'cross', 'iw': '0', 'ps': 'BOTH'}],
+            },
+        })
+
+
+class SimClient(_SymbolRounding):
+    """
+    Cliente con la misma interfaz que AsyncBinanceClient pero contra un MotorMatching
+    en memoria. Los eventos del USER stream quedan en `eventos` (asyncio.Queue).
+    """
+
+    def __init__(self, motor: MotorMatching):
+        self.motor = motor
+        self.symbol = motor.symbol
+        self.filters = dict(motor.filters)
+        self.client = types.SimpleNamespace(testnet=False)
+        self.eventos = asyncio.Queue()
+        self.libro = None  # LocalOrderBook con la profundidad grabada (para snapshots)
+        self.requests = 0
+        motor.emitir = self.eventos.put_nowait
+
+    async def close(self):
+        return None
+
+    def _error(self, e):
+        return {'status': 'ERROR', 'error': str(e), 'code': getattr(e, 'code', None), 'msg': getattr(e, 'msg', str(e))}
+
+    async def futures_account(self):
+        self.requests += 1
+        bal = f"{self.motor.balance}"
+        return {'assets': [{'asset': 'USDT', 'availableBalance': bal, 'walletBalance': bal}]}
+
+    async def get_available_balance(self, asset='USDT'):
+        acc = await self.futures_account()
+        for a in acc.get('assets', []):
+            if a['asset'] == asset:
+                return float(a['availableBalance'])
+        return 0.0
+
+    async def futures_position_information(self):
+        self.requests += 1
+        m = self.motor
+        return [{'symbol': m.symbol, 'positionAmt': f"{m.posicion}", 'entryPrice': f"{m.entrada}"}]
+
+    async def futures_create_order(self, **kwargs):
+        self.requests += 1
+        if kwargs.get('type') in TIPOS_CONDICIONALES:
+            # Como python-binance: los condicionales van al Algo Order API
+            kwargs = dict(kwargs, algoType='CONDITIONAL')
+            if 'stopPrice' in kwargs and 'triggerPrice' not in kwargs:
+                kwargs['triggerPrice'] = kwargs.pop('stopPrice')
+            return self.motor.crear_algo(kwargs)
+        return self.motor.crear_orden(kwargs)
+
+    async def futures_symbol_ticker(self):
+        self.requests += 1
+        return {'symbol': self.motor.symbol, 'price': f"{self.motor.ultimo_precio or 0}"}
+
+    async def futures_order_book(self, limit=1000):
+        self.requests += 1
+        if self.libro is None or self.libro.last_update_id is None:
+            return {'lastUpdateId': 0, 'bids': [], 'asks': []}
+        return {
+            'lastUpdateId': self.libro.last_update_id,
+            'bids': [[str(p), str(q)] for p, q in self.libro.top_bids(limit)],
+            'asks': [[str(p), str(q)] for p, q in self.libro.top_asks(limit)],
+        }
+
+    async def futures_get_open_orders(self):
+        self.requests += 1
+        return self.motor.ordenes_abiertas()
+
+    async def futures_get_open_algo_orders(self):
+        self.requests += 1
+        return self.motor.algos_abiertas()
+
+    async def get_open_algo_orders(self):
+        return await self.futures_get_open_algo_orders()
+
+    async def futures_account_trades(self, startTime=None, fromId=None, limit=1000):
+        self.requests += 1
+        return self.motor.trades_cuenta(None if fromId is not None else startTime, fromId, limit)
+
+    async def get_open_orders(self):
+        return await self.futures_get_open_orders()
+
+    async def place_limit(self, side, price, qty, reduce_only=False, newClientOrderId=None):
+        params = self._limit_params(side, price, qty, reduce_only, newClientOrderId)
+        if params is None:
+            return {'status': 'ERROR', 'error': 'price or qty zero'}
+        try:
+            return await self.futures_create_order(**params)
+        except ErrorExchange as e:
+            return self._error(e)
+
+    async def place_limit_batch(self, params_list):
+        self.requests += 1
+        out = []
+        for p in params_list:
+            try:
+                out.append(self.motor.crear_orden(p))
+            except ErrorExchange as e:
+                out.append({'code': e.code, 'msg': e.msg})
+        return out
+
+    async def place_stop_market_close_position(self, stop_price):
+        params = self._stop_params(stop_price)
+        if params is None:
+            return {'status': 'ERROR', 'error': 'stop_price zero'}
+        try:
+            return await self.futures_create_order(**params)
+        except ErrorExchange as e:
+            return self._error(e)
+
+    async def cancel_order(self, orderId):
+        self.requests += 1
+        try:
+            return self.motor.cancelar(orderId)
+        except ErrorExchange as e:
+            return self._error(e)
+
+    async def cancel_algo_order(self, algoId):
+        self.requests += 1
+        try:
+            return self.motor.cancelar_algo(algoId)
+        except ErrorExchange as e:
+            return self._error(e)
+
+    async def modify_limit(self, orderId, side, price, qty):
+        price = self.round_price(price)
+        qty = self.round_qty(qty)
+        if not price or not qty:
+            return {'status': 'ERROR', 'error': 'price or qty zero'}
+        self.requests += 1
+        try:
+            return self.motor.modificar(orderId, price=price, qty=qty)
+        except ErrorExchange as e:
+            return self._error(e)
+
+    async def cancel_orders_batch(self, order_ids):
+        self.requests += 1
+        out = []
+        for oid in order_ids:
+            try:
+                out.append(self.motor.cancelar(oid))
+            except ErrorExchange as e:
+                out.append({'code': e.code, 'msg': e.msg})
+        return out
+
+    async def futures_cancel_all_open_orders(self):
+        self.requests += 1
+        return self.motor.cancelar_todas()
+
+    async def cancel_all(self):
+        return await self.futures_cancel_all_open_orders()
+
+    async def futures_stream_get_listen_key(self):
+        return None
+
+    async def futures_stream_keepalive(self, listenKey):
+        return None
+
+    async def futures_stream_close(self, listenKey):
+        return None
@@ -1,6 +1,8 @@
+import copy
 import json
 import os
-from config import STATE_FILE
+import threading
+from config import STATE_FILE, STATE_JOURNAL_COMPACT_BYTES, STATE_JOURNAL_FSYNC
 
 DEFAULT_STATE = {
     "grids_activados": [],
@@ -13,43 +15,203 @@ DEFAULT_STATE = {
 }
 
 class StateManager:
-    def __init__(self):
-        self.state = DEFAULT_STATE.copy()
+    """
+    Estado de la posición persistido como snapshot (STATE_FILE) + journal de fills
+    (STATE_FILE.journal, una línea JSON por fill con fsync). Cada fill es un append
+    O(1); al arrancar se carga el snapshot y se reaplica la cola del journal. Cuando
+    el journal supera STATE_JOURNAL_COMPACT_BYTES se rota y un hilo en segundo plano
+    escribe el snapshot nuevo de forma atómica (tmp + rename).
+    """
+
+    def __init__(self, state_file=STATE_FILE, compact_bytes=STATE_JOURNAL_COMPACT_BYTES, fsync=STATE_JOURNAL_FSYNC):
+        self.state_file = state_file
+        self.fsync = fsync
+        self.journal_file = state_file + ".journal"
+        self.journal_old_file = state_file + ".journal.old"
+        self.compact_bytes = compact_bytes
+        self.state = copy.deepcopy(DEFAULT_STATE)
+        self.seq = 0
+        self._journal = None
+        self._journal_size = 0
+        self._compactor = None
+        self._replaying = False
         self.load_state()
 
     def ensure_defaults(self):
         # Completar claves faltantes (migración desde versiones anteriores)
         for k, v in DEFAULT_STATE.items():
             if k not in self.state:
-                self.state[k] = v
+                self.state[k] = copy.deepcopy(v)
+
+    # --- persistencia ---
+    def _makedirs(self):
+        d = os.path.dirname(self.state_file)
+        if d:
+            os.makedirs(d, exist_ok=True)
+
+    def _leer_journal(self, path):
+        """Devuelve los registros válidos; una última línea truncada (crash a mitad de escritura) se ignora."""
+        registros = []
+        if not os.path.exists(path):
+            return registros
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    print(f"[STATE] Registro incompleto al final de {path}, descartado")
+                    break
+                try:
+                    registros.append(json.loads(line))
+                except Exception:
+                    print(f"[STATE] Registro corrupto en {path}, descartado")
+                    break
+        return registros
 
     def load_state(self):
-        if os.path.exists(STATE_FILE):
+        if os.path.exists(self.state_file):
             try:
-                with open(STATE_FILE, 'r') as f:
+                with open(self.state_file, 'r') as f:
                     self.state = json.load(f)
             except Exception as e:
                 print(f"[ERROR] Cargar estado: {e}")
+        self.seq = int(self.state.pop('_journal_seq', 0) or 0)
         self.ensure_defaults()
 
+        # Reaplicar la cola del journal (incluido un segmento a medio compactar)
+        self._replaying = True
+        try:
+            for path in (self.journal_old_file, self.journal_file):
+                for r in self._leer_journal(path):
+                    if r.get('seq', 0) <= self.seq:
+                        continue
+                    self._aplicar(r)
+                    self.seq = r['seq']
+        finally:
+            self._replaying = False
+        # Consolida lo reaplicado y deja el journal limpio
+        if os.path.exists(self.journal_old_file) or os.path.exists(self.journal_file):
+            self.save_state()
+
+    def _copia_snapshot(self):
+        # Copia superficial: los registros de las listas no se mutan tras crearse,
+        # basta con congelar las listas para serializar fuera del loop
+        data = {k: (list(v) if isinstance(v, list) else v) for k, v in self.state.items()}
+        data['_journal_seq'] = self.seq
+        return data
+
+    def _snapshot_bytes(self, data=None):
+        return json.dumps(data if data is not None else self._copia_snapshot()).encode()
+
+    def _escribir_snapshot(self, contenido):
+        self._makedirs()
+        tmp = self.state_file + ".tmp"
+        with open(tmp, 'wb') as f:
+            f.write(contenido)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.state_file)
+
+    def _cerrar_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _esperar_compactacion(self):
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+
     def save_state(self):
+        """Snapshot síncrono completo; descarta el journal (ya incluido en el snapshot)."""
+        if self._replaying:
+            return
         try:
-            os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
-            with open(STATE_FILE, 'w') as f:
-                json.dump(self.state, f, indent=2)
+            self._esperar_compactacion()
+            self._escribir_snapshot(self._snapshot_bytes())
+            self._cerrar_journal()
+            for path in (self.journal_old_file, self.journal_file):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._journal_size = 0
         except Exception as e:
             print(f"[ERROR] Guardar estado: {e}")
 
-    def agregar_compra(self, precio, cantidad, fee=0.0):
+    def _append(self, registro):
+        if self._replaying:
+            return
+        try:
+            if self._journal is None:
+                self._makedirs()
+                self._journal = open(self.journal_file, 'ab')
+                self._journal_size = self._journal.tell()
+            line = json.dumps(registro).encode() + b"\n"
+            self._journal.write(line)
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+            self._journal_size += len(line)
+        except Exception as e:
+            print(f"[ERROR] Journal estado: {e}")
+            return
+        if self._journal_size >= self.compact_bytes:
+            self.compactar_en_segundo_plano()
+
+    def compactar_en_segundo_plano(self):
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._esperar_compactacion()
+        try:
+            # Rotar: los fills nuevos van a un journal vacío mientras se escribe el snapshot
+            self._cerrar_journal()
+            if os.path.exists(self.journal_old_file):
+                # Quedó un segmento de una compactación fallida: se le añade el
+                # journal actual en vez de pisarlo (sus fills aún no están en el snapshot)
+                with open(self.journal_file, 'rb') as src, open(self.journal_old_file, 'ab') as dst:
+                    dst.write(src.read())
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                os.remove(self.journal_file)
+            else:
+                os.replace(self.journal_file, self.journal_old_file)
+            self._journal_size = 0
+            data = self._copia_snapshot()
+        except Exception as e:
+            print(f"[ERROR] Rotar journal: {e}")
+            return
+
+        def tarea():
+            try:
+                self._escribir_snapshot(self._snapshot_bytes(data))
+                os.remove(self.journal_old_file)
+            except Exception as e:
+                print(f"[ERROR] Compactar estado: {e}")
+
+        self._compactor = threading.Thread(target=tarea, name="state-compactor", daemon=True)
+        self._compactor.start()
+
+    def close(self):
+        self._esperar_compactacion()
+        self._cerrar_journal()
+
+    # --- operaciones ---
+    def _aplicar(self, r):
+        if r['op'] == 'BUY':
+            self._aplicar_compra(r['precio'], r['cantidad'], r.get('fee', 0.0))
+        elif r['op'] == 'SELL':
+            self._aplicar_venta(r['precio'], r['cantidad'], r.get('fee', 0.0))
+
+    def _registrar(self, op, precio, cantidad, fee):
+        self.seq += 1
+        self._append({"seq": self.seq, "op": op, "precio": precio, "cantidad": cantidad, "fee": fee})
+
+    def _aplicar_compra(self, precio, cantidad, fee=0.0):
         # Agregar compra y actualizar posición neta
         self.state['grids_activados'].append({"precio": precio, "cantidad": cantidad})
         self.state['posicion_total'] += float(cantidad)
         self.state['costo_total'] += float(cantidad) * float(precio)
         self.state['fees_total'] += float(fee)
         self.state['fills'].append({"side": "BUY", "precio": precio, "cantidad": cantidad, "fee": fee})
-        self.save_state()
 
-    def agregar_venta(self, precio, cantidad, fee=0.0):
+    def _aplicar_venta(self, precio, cantidad, fee=0.0):
         cantidad = float(cantidad)
         precio = float(precio)
         # Descontar costo proporcional según avg_cost actual
@@ -61,9 +223,21 @@ class StateManager:
         self.state['fills'].append({"side": "SELL", "precio": precio, "cantidad": cantidad, "fee": fee})
         # FIX robusto
         if self.state['posicion_total'] < 1e-3:
-            self.resetear_posicion()
-        else:
+            self.state = copy.deepcopy(DEFAULT_STATE)
+            return True
+        return False
+
+    def agregar_compra(self, precio, cantidad, fee=0.0):
+        self._aplicar_compra(precio, cantidad, fee)
+        self._registrar("BUY", precio, cantidad, fee)
+
+    def agregar_venta(self, precio, cantidad, fee=0.0):
+        if self._aplicar_venta(precio, cantidad, fee):
+            # Posición cerrada: el snapshot vacío reemplaza todo el journal
+            self.seq += 1
             self.save_state()
+        else:
+            self._registrar("SELL", float(precio), float(cantidad), fee)
 
     def calcular_costo_promedio(self):
         total_qty = float(self.state.get('posicion_total', 0.0))
@@ -72,5 +246,5 @@ class StateManager:
         return float(self.state.get('costo_total', 0.0)) / total_qty
 
     def resetear_posicion(self):
-        self.state = DEFAULT_STATE.copy()
-        self.save_state()
\ No newline at end of file
+        self.state = copy.deepcopy(DEFAULT_STATE)
+        self.save_state()
@@ -1,79 +1,171 @@
-import time
-from collections import deque
+from array import array
+import reloj
+from ticks import construir_escalera
+from config import (
+    TRADE_WINDOW_MS, TRADE_WINDOW_CAPACITY,
+    DUMP_MIN_TRADES_PER_SEC, DUMP_MIN_SELL_VOLUME,
+    SPACING_ATR_MULT, RANGO_ATR_MULT
+)
 
-trade_history = deque(maxlen=300)
-_last_dump_ts = 0
-_last_support_ts = 0
 COOLDOWN_MS = 5000
 
-def analizar_trade(trade_msg):
-    try:
-        price = float(trade_msg.get('p') or 0)
-        qty = float(trade_msg.get('q') or 0)
-        ts = int(trade_msg.get('T') or 0)
-        is_sell = bool(trade_msg.get('m'))
-    except Exception:
-        return None
+QTY_SCALE = 10**8  # Las cantidades se acumulan como enteros: sumas exactas, sin deriva
 
-    trade_history.append({'price': price, 'qty': qty, 'timestamp': ts, 'sell': is_sell})
-    return evaluar_senales()
 
-def evaluar_senales():
-    global _last_dump_ts
-    if not trade_history:
-        return None
-    now = trade_history[-1]['timestamp']
-    ultimos = [t for t in trade_history if now - t['timestamp'] <= 2000]
-    if not ultimos:
-        return None
-    ventas = [t for t in ultimos if t['sell']]
-    vol_ventas = sum(t['qty'] for t in ventas)
-    freq = len(ultimos) / 2.0  # trades/s
-    if freq > 15 and vol_ventas > 10:
-        if now - _last_dump_ts > COOLDOWN_MS:
-            _last_dump_ts = now
-            return 'DUMP'
-    return None
-
-def analizar_depth(depth_msg):
-    global _last_support_ts
-    bids = depth_msg.get('b') or []
-    if not bids:
-        return None
-    top5_vol = 0.0
-    top_bid_price = 0.0
-    for i, b in enumerate(bids[:5]):
+class VentanaTrades:
+    """
+    Agregado incremental de los trades de los últimos `window_ms` (como mucho
+    `capacidad` trades) sobre buffers circulares preasignados. Mantiene conteo y
+    volúmenes comprador/vendedor al día: agregar y expirar trades es O(1) amortizado.
+    """
+
+    def __init__(self, window_ms=TRADE_WINDOW_MS, capacidad=TRADE_WINDOW_CAPACITY):
+        self.window_ms = int(window_ms)
+        self.capacidad = int(capacidad)
+        self.ts = array('q', bytes(8 * self.capacidad))
+        self.qty = array('q', bytes(8 * self.capacidad))
+        self.sell = array('b', bytes(self.capacidad))
+        self.head = 0        # índice del trade más viejo
+        self.count = 0
+        self.vol_sell = 0    # en unidades de 1/QTY_SCALE
+        self.vol_buy = 0
+        self.now = 0         # timestamp (ms) del último trade
+
+    def _expirar_primero(self):
+        h = self.head
+        if self.sell[h]:
+            self.vol_sell -= self.qty[h]
+        else:
+            self.vol_buy -= self.qty[h]
+        self.head = (h + 1) % self.capacidad
+        self.count -= 1
+
+    def agregar(self, ts, qty, is_sell):
+        if self.count == self.capacidad:
+            self._expirar_primero()
+        i = (self.head + self.count) % self.capacidad
+        q = int(round(qty * QTY_SCALE))
+        self.ts[i] = ts
+        self.qty[i] = q
+        self.sell[i] = 1 if is_sell else 0
+        self.count += 1
+        if is_sell:
+            self.vol_sell += q
+        else:
+            self.vol_buy += q
+        if ts > self.now:
+            self.now = ts
+        limite = self.now - self.window_ms
+        while self.count and self.ts[self.head] < limite:
+            self._expirar_primero()
+
+    def frecuencia(self):
+        return self.count / (self.window_ms / 1000.0)  # trades/s
+
+    def volumen_ventas(self):
+        return self.vol_sell / QTY_SCALE
+
+    def volumen_compras(self):
+        return self.vol_buy / QTY_SCALE
+
+    def __len__(self):
+        return self.count
+
+
+class SenalesSimbolo:
+    """
+    Estado de las señales DUMP/SOPORTE de un símbolo (ventana de trades y cooldowns).
+    Con `barras` (AgregadorBarras) cada trade ya parseado también alimenta las barras.
+    """
+
+    def __init__(self, min_freq=DUMP_MIN_TRADES_PER_SEC, min_vol_ventas=DUMP_MIN_SELL_VOLUME, barras=None,
+                 window_ms=TRADE_WINDOW_MS, capacidad=TRADE_WINDOW_CAPACITY):
+        self.trade_window = VentanaTrades(window_ms, capacidad)
+        self.barras = barras
+        self.min_freq = min_freq
+        self.min_vol_ventas = min_vol_ventas
+        self.last_dump_ts = 0
+        self.last_support_ts = 0
+
+    def analizar_trade(self, trade_msg):
         try:
-            p = float(b[0]); q = float(b[1])
-            top5_vol += q
-            if i == 0:
-                top_bid_price = p
+            price = float(trade_msg.get('p') or 0)
+            qty = float(trade_msg.get('q') or 0)
+            ts = int(trade_msg.get('T') or 0)
+            is_sell = bool(trade_msg.get('m'))
         except Exception:
-            continue
-    now = int(time.time() * 1000)
-    if top5_vol > 100 and now - _last_support_ts > COOLDOWN_MS:
-        _last_support_ts = now
-        return {'tipo': 'SOPORTE', 'precio': top_bid_price, 'volumen': top5_vol}
-    return None
-
-def recomendar_spacing(signal, min_spacing, max_spacing):
+            return None
+
+        self.trade_window.agregar(ts, qty, is_sell)
+        if self.barras is not None:
+            self.barras.agregar(ts, price, qty)
+        return self.evaluar_senales()
+
+    def evaluar_senales(self, min_freq=None, min_vol_ventas=None):
+        min_freq = self.min_freq if min_freq is None else min_freq
+        min_vol_ventas = self.min_vol_ventas if min_vol_ventas is None else min_vol_ventas
+        ventana = self.trade_window
+        if not ventana.count:
+            return None
+        now = ventana.now
+        if ventana.frecuencia() > min_freq and ventana.vol_sell > min_vol_ventas * QTY_SCALE:
+            if now - self.last_dump_ts > COOLDOWN_MS:
+                self.last_dump_ts = now
+                return 'DUMP'
+        return None
+
+    def analizar_depth(self, libro):
+        """Señal SOPORTE sobre el libro local real (LocalOrderBook), no sobre el diff recibido."""
+        if libro is None or not libro.synced:
+            return None
+        bids = libro.top_bids(5)
+        if not bids:
+            return None
+        top_bid_price = bids[0][0]
+        top5_vol = 0.0
+        for p, q in bids:
+            top5_vol += q
+        now = reloj.ahora_ms()
+        if top5_vol > 100 and now - self.last_support_ts > COOLDOWN_MS:
+            self.last_support_ts = now
+            return {'tipo': 'SOPORTE', 'precio': top_bid_price, 'volumen': top5_vol}
+        return None
+
+
+# Instancia por defecto (un solo símbolo) para quien use las funciones del módulo
+_senales = SenalesSimbolo()
+trade_window = _senales.trade_window
+
+
+def analizar_trade(trade_msg):
+    return _senales.analizar_trade(trade_msg)
+
+def evaluar_senales(min_freq=DUMP_MIN_TRADES_PER_SEC, min_vol_ventas=DUMP_MIN_SELL_VOLUME):
+    return _senales.evaluar_senales(min_freq, min_vol_ventas)
+
+def analizar_depth(libro):
+    return _senales.analizar_depth(libro)
+
+def _por_volatilidad(volatilidad, mult, minimo, maximo):
+    # Sin señal: proporcional a la ATR relativa de las barras; sin barras suficientes, el punto medio
+    if volatilidad and mult:
+        return min(maximo, max(minimo, mult * volatilidad))
+    return (minimo + maximo) / 2.0
+
+def recomendar_spacing(signal, min_spacing, max_spacing, volatilidad=None, mult=SPACING_ATR_MULT):
     if signal == 'DUMP':
         return max_spacing
     if isinstance(signal, dict) and signal.get('tipo') == 'SOPORTE':
         return min_spacing
-    return (min_spacing + max_spacing) / 2.0
+    return _por_volatilidad(volatilidad, mult, min_spacing, max_spacing)
 
-def recomendar_rango(signal, min_range, max_range):
+def recomendar_rango(signal, min_range, max_range, volatilidad=None, mult=RANGO_ATR_MULT):
     if signal == 'DUMP':
         return max_range
     if isinstance(signal, dict) and signal.get('tipo') == 'SOPORTE':
         return min_range
-    return (min_range + max_range) / 2.0
-
-def construir_grid(precio_actual, spacing, range_down):
-    niveles = []
-    n = int(range_down / spacing)
-    for i in range(n):
-        price = precio_actual * (1 - spacing * (i+1))
-        niveles.append(round(price, 2))
-    return niveles
+    return _por_volatilidad(volatilidad, mult, min_range, max_range)
+
+def construir_grid(precio_actual, spacing, range_down, tick_size=0.01):
+    # Niveles ya en el tickSize del símbolo; el bot usa TickScale.escalera con cantidades y filtros
+    return construir_escalera(precio_actual, spacing, range_down, tick_size)
@@ -0,0 +1,60 @@
+import json
+
+# Decoder JSON más rápido si está instalado (orjson acepta bytes y str)
+try:
+    import orjson
+    _loads = orjson.loads
+    DECODER = 'orjson'
+except ImportError:
+    _loads = json.loads
+    DECODER = 'json'
+
+
+class StreamRouter:
+    """
+    Decodifica frames de WebSocket y los despacha por tabla (stream -> tipo, símbolo)
+    en lugar de una cadena if/elif. Para el endpoint combinado (/stream) el frame llega
+    como {"stream": "...", "data": {...}}; para sockets individuales el stream ya es conocido.
+    """
+
+    def __init__(self, handler, loads=None):
+        self.handler = handler  # coroutine (data, tipo, symbol)
+        self.loads = loads or _loads
+        self.rutas = {}         # nombre de stream -> (tipo, símbolo); símbolo None en USER
+        self.hooks = {}         # nombre de stream -> callable(data) síncrono, antes del handler
+        self.mensajes = 0
+        self.descartados = 0
+
+    def registrar(self, stream, tipo, symbol=None, hook=None):
+        self.rutas[stream] = (tipo, symbol)
+        if hook is not None:
+            self.hooks[stream] = hook
+
+    def quitar(self, stream):
+        self.rutas.pop(stream, None)
+        self.hooks.pop(stream, None)
+
+    def streams(self):
+        return list(self.rutas)
+
+    async def despachar(self, raw):
+        """Frame del endpoint combinado."""
+        frame = self.loads(raw)
+        stream = frame.get('stream')
+        if stream not in self.rutas:
+            # Respuestas a SUBSCRIBE ({"result": null, "id": 1}) o streams no registrados
+            self.descartados += 1
+            return
+        await self._entregar(frame['data'], stream)
+
+    async def despachar_directo(self, raw, stream):
+        """Frame de un socket dedicado a un solo stream."""
+        await self._entregar(self.loads(raw), stream)
+
+    async def _entregar(self, data, stream):
+        self.mensajes += 1
+        tipo, symbol = self.rutas[stream]
+        hook = self.hooks.get(stream)
+        if hook is not None:
+            hook(data)
+        await self.handler(data, tipo, symbol)
@@ -0,0 +1,554 @@
+"""
+Supervisor multiproceso: reparte los símbolos de SYMBOLS entre varios workers
+(un GridBot por proceso) para usar todos los núcleos, mientras el exchange sigue
+viendo un solo cliente:
+
+- ingest: la única conexión WebSocket. Reenvía cada frame crudo, por socket Unix,
+  al worker de su símbolo; el JSON se decodifica en el worker.
+- gateway: el único AsyncBinanceClient (sesión HTTP + RateGovernor de la cuenta).
+  Los workers le piden cada request REST por RPC, así los rate limits siguen
+  siendo los de una sola cuenta.
+- workers: GridBot con un ClienteRemoto y los mensajes que llegan del ingest.
+
+El supervisor vigila que cada proceso siga vivo y latiendo, y lo reinicia si cae o se cuelga.
+Uso: python supervisor.py
+"""
+import asyncio
+import copy
+import itertools
+import json
+import multiprocessing
+import os
+import struct
+import time
+import types
+
+from account_mirror import EVENTOS_DE_ORDEN
+from binance_client import DEFAULT_FILTERS, _SymbolRounding, obtener_cliente, cerrar_cliente
+from bot import GridBot
+from config import (
+    SYMBOLS, USE_TESTNET, GRID_BATCH_SIZE, METRICS_PORT,
+    SUPERVISOR_WORKERS, SUPERVISOR_IPC_DIR, SUPERVISOR_CHECK_SECONDS,
+    SUPERVISOR_HEARTBEAT_TIMEOUT, SUPERVISOR_RESTART_BACKOFF_MAX
+)
+from stream_router import StreamRouter
+from websocket_listener import WebSocketManager
+
+# Frames entre procesos: tipo (1 byte) + largo + cuerpo
+#   H hola (símbolos del worker)   D datos de stream (nombre\nJSON crudo)
+#   C reconexión (streams que perdieron mensajes)   Q request REST   R respuesta
+_CABECERA = struct.Struct('>cI')
+LIMITE_BUFFER_WORKER = 4 * 1024 * 1024  # Bytes pendientes hacia un worker antes de esperar a que drene
+
+# Métodos del AsyncBinanceClient que un worker puede invocar en el gateway
+METODOS_REMOTOS = frozenset({
+    'futures_account', 'get_available_balance', 'futures_position_information',
+    'futures_create_order', 'futures_cancel_all_open_orders', 'futures_get_open_orders', 'futures_get_open_algo_orders',
+    'futures_symbol_ticker', 'futures_order_book', 'futures_account_trades', 'place_limit', 'place_limit_batch',
+    'place_stop_market_close_position', 'get_open_orders', 'get_open_algo_orders', 'cancel_order', 'cancel_algo_order',
+    'modify_limit', 'cancel_all',
+    'cancel_orders_batch', 'futures_stream_get_listen_key', 'futures_stream_keepalive',
+    'futures_stream_close',
+})
+
+
+def _frame(tipo, cuerpo):
+    return _CABECERA.pack(tipo, len(cuerpo)) + cuerpo
+
+
+async def _leer_frame(reader):
+    tipo, n = _CABECERA.unpack(await reader.readexactly(_CABECERA.size))
+    return tipo, await reader.readexactly(n)
+
+
+def _ruta_ipc(nombre):
+    return os.path.join(SUPERVISOR_IPC_DIR, f"{nombre}.sock")
+
+
+def repartir(symbols, n):
+    """Símbolos en `n` grupos (round-robin), sin grupos vacíos."""
+    grupos = [[] for _ in range(max(1, n))]
+    for i, s in enumerate(symbols):
+        grupos[i % len(grupos)].append(s)
+    return [g for g in grupos if g]
+
+
+# --- gateway REST ---
+
+class ErrorRemoto(Exception):
+    """Excepción que el gateway devolvió en lugar de una respuesta."""
+
+    def __init__(self, msg, code=None):
+        super().__init__(msg)
+        self.code = code
+
+
+async def _gateway():
+    client = await obtener_cliente()
+
+    async def ejecutar(req, writer):
+        vista = client.para_simbolo(req.get('s') or client.symbol)
+        r = {'id': req['id']}
+        try:
+            if req['m'] not in METODOS_REMOTOS:
+                raise AttributeError(f"método no permitido: {req['m']}")
+            r['ok'] = await getattr(vista, req['m'])(*req.get('a', ()), **req.get('k', {}))
+        except Exception as e:
+            r['error'] = str(e)
+            r['code'] = getattr(e, 'code', None)
+        r['filters'] = vista.filters
+        r.update(_estado_governor(client.governor))
+        if not writer.is_closing():
+            writer.write(_frame(b'R', json.dumps(r).encode()))
+
+    async def atender(reader, writer):
+        tareas = set()
+        try:
+            while True:
+                tipo, cuerpo = await _leer_frame(reader)
+                if tipo == b'H':
+                    symbols = json.loads(cuerpo)
+                    info = {'testnet': USE_TESTNET, 'filters': {s: client.para_simbolo(s).filters for s in symbols}}
+                    info.update(_estado_governor(client.governor))
+                    writer.write(_frame(b'H', json.dumps(info).encode()))
+                elif tipo == b'Q':
+                    # Cada request en su tarea: uno lento (o esperando al governor) no frena al resto
+                    t = asyncio.create_task(ejecutar(json.loads(cuerpo), writer))
+                    tareas.add(t)
+                    t.add_done_callback(tareas.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for t in tareas:
+                t.cancel()
+            writer.close()
+
+    server = await asyncio.start_unix_server(atender, path=_ruta_ipc('gateway'))
+    print(f"[GATEWAY] Escuchando en {_ruta_ipc('gateway')}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await cerrar_cliente()
+
+
+def _estado_governor(governor):
+    return {
+        'capacidad': governor.capacidad(peso_por_orden=5 / GRID_BATCH_SIZE),
+        'governor': governor.estado(),
+    }
+
+
+class _GovernorRemoto:
+    """Lo último que informó el governor del gateway; el que decide sigue siendo él."""
+
+    def __init__(self):
+        self._capacidad = 0
+        self._estado = {}
+
+    def actualizar(self, r):
+        self._capacidad = r.get('capacidad', self._capacidad)
+        self._estado = r.get('governor', self._estado)
+
+    def capacidad(self, peso_por_orden=1.0, prioridad=None):
+        return self._capacidad
+
+    def estado(self):
+        return self._estado
+
+
+class _ConexionRpc:
+    """Socket al gateway compartido por todas las vistas de un ClienteRemoto; reconecta solo."""
+
+    def __init__(self, ruta, symbols):
+        self.ruta = ruta
+        self.symbols = list(symbols)
+        self.writer = None
+        self.pendientes = {}  # id -> Future de la respuesta
+        self.ids = itertools.count(1)
+        self.al_conectar = None   # callable(info) con el hola del gateway
+        self.al_responder = None  # callable(respuesta)
+        self._lock = asyncio.Lock()
+
+    async def conectar(self):
+        async with self._lock:
+            if self.writer is not None:
+                return
+            espera = 0.2
+            while True:
+                try:
+                    reader, writer = await asyncio.open_unix_connection(self.ruta)
+                    writer.write(_frame(b'H', json.dumps(self.symbols).encode()))
+                    _, cuerpo = await _leer_frame(reader)
+                    break
+                except (OSError, asyncio.IncompleteReadError):
+                    await asyncio.sleep(espera)
+                    espera = min(espera * 2, 5)
+            if self.al_conectar is not None:
+                self.al_conectar(json.loads(cuerpo))
+            self.writer = writer
+            asyncio.create_task(self._leer(reader))
+
+    async def _leer(self, reader):
+        try:
+            while True:
+                _, cuerpo = await _leer_frame(reader)
+                r = json.loads(cuerpo)
+                if self.al_responder is not None:
+                    self.al_responder(r)
+                fut = self.pendientes.pop(r['id'], None)
+                if fut is not None and not fut.done():
+                    fut.set_result(r)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            print("[GATEWAY] Conexión perdida, se reconecta en el próximo request")
+        finally:
+            self.writer = None
+            pendientes, self.pendientes = self.pendientes, {}
+            for fut in pendientes.values():
+                if not fut.done():
+                    fut.set_exception(ErrorRemoto("gateway desconectado"))
+
+    async def llamar(self, symbol, metodo, args, kwargs):
+        if self.writer is None:
+            await self.conectar()
+        rid = next(self.ids)
+        fut = asyncio.get_running_loop().create_future()
+        self.pendientes[rid] = fut
+        self.writer.write(_frame(b'Q', json.dumps({'id': rid, 's': symbol, 'm': metodo, 'a': args, 'k': kwargs}).encode()))
+        return await fut
+
+
+class ClienteRemoto(_SymbolRounding):
+    """
+    Misma interfaz que AsyncBinanceClient para un worker: el redondeo es local
+    (filtros que manda el gateway) y cada request viaja al gateway, que lo pasa
+    por el RateGovernor de la cuenta. Crear con `await ClienteRemoto.conectar(symbols)`.
+    """
+
+    def __init__(self, conexion, symbol):
+        self._conexion = conexion
+        self.symbol = symbol
+        self.filters = dict(DEFAULT_FILTERS)
+        self.client = types.SimpleNamespace(testnet=USE_TESTNET)
+        self.governor = _GovernorRemoto()
+        self._vistas = {symbol: self}
+
+    @classmethod
+    async def conectar(cls, symbols, ruta=None):
+        conexion = _ConexionRpc(ruta or _ruta_ipc('gateway'), symbols)
+        self = cls(conexion, conexion.symbols[0])
+        conexion.al_conectar = self._aplicar_info
+        conexion.al_responder = self.governor.actualizar
+        await conexion.conectar()
+        return self
+
+    def _aplicar_info(self, info):
+        self.client.testnet = info.get('testnet', USE_TESTNET)
+        for s, filters in info.get('filters', {}).items():
+            self.para_simbolo(s).filters = dict(filters)
+        self.governor.actualizar(info)
+
+    def para_simbolo(self, symbol):
+        vista = self._vistas.get(symbol)
+        if vista is None:
+            vista = copy.copy(self)
+            vista.symbol = symbol
+            vista.filters = dict(DEFAULT_FILTERS)
+            vista._escala = None
+            self._vistas[symbol] = vista
+        return vista
+
+    async def _remoto(self, metodo, *args, **kwargs):
+        r = await self._conexion.llamar(self.symbol, metodo, args, kwargs)
+        if r.get('filters'):
+            self.filters = r['filters']
+        if 'error' in r:
+            raise ErrorRemoto(r['error'], r.get('code'))
+        return r.get('ok')
+
+    def __getattr__(self, nombre):
+        if nombre not in METODOS_REMOTOS:
+            raise AttributeError(nombre)
+
+        async def metodo(*args, **kwargs):
+            return await self._remoto(nombre, *args, **kwargs)
+        return metodo
+
+    async def close(self):
+        if self._conexion.writer is not None:
+            self._conexion.writer.close()
+
+
+# --- ingest de streams ---
+
+_PREFIJO_COMBINADO = '{"stream":"'
+_SEPARADOR_DATA = ',"data":'
+
+
+def _separar_combinado(raw):
+    """(stream, data crudo) de un frame {"stream":...,"data":...} sin decodificar el JSON."""
+    if isinstance(raw, bytes):
+        raw = raw.decode()
+    if raw.startswith(_PREFIJO_COMBINADO) and raw.endswith('}'):
+        fin = raw.find('"', len(_PREFIJO_COMBINADO))
+        if fin > 0 and raw.startswith(_SEPARADOR_DATA, fin + 1):
+            return raw[len(_PREFIJO_COMBINADO):fin], raw[fin + 1 + len(_SEPARADOR_DATA):-1]
+    return None, raw
+
+
+class RouterIngest(StreamRouter):
+    """Las mismas rutas que StreamRouter, pero el mensaje se reenvía crudo al worker del símbolo."""
+
+    def __init__(self, ingest):
+        super().__init__(None)
+        self.ingest = ingest
+
+    async def despachar(self, raw):
+        stream, data = _separar_combinado(raw)
+        if stream is None:
+            frame = self.loads(raw)
+            stream = frame.get('stream')
+            data = json.dumps(frame.get('data'))
+        if stream not in self.rutas:
+            self.descartados += 1
+            return
+        await self.despachar_directo(data, stream)
+
+    async def despachar_directo(self, raw, stream):
+        self.mensajes += 1
+        tipo, symbol = self.rutas[stream]
+        await self.ingest.reenviar(raw, stream, tipo, symbol)
+
+
+class IngestManager(WebSocketManager):
+    """WebSocketManager del proceso ingest: conecta y reconecta igual, pero no decodifica ni opera."""
+
+    def __init__(self, client, symbols):
+        super().__init__(client, symbols=symbols)
+        self.workers = {}  # símbolo -> StreamWriter del worker que lo opera
+
+    def _crear_router(self, handler):
+        # Mismas rutas que el WebSocketManager normal; los libros (hooks) viven en los workers
+        router = RouterIngest(self)
+        router.rutas = super()._crear_router(handler).rutas
+        return router
+
+    def _destinos(self, raw, tipo, symbol):
+        if tipo != 'USER':
+            return [self.workers.get(symbol)]
+        msg = self.router.loads(raw)
+        if msg.get('e') in EVENTOS_DE_ORDEN:
+            return [self.workers.get(msg.get('o', {}).get('s'))]
+        # RouterIngest no corre hooks: el vencimiento del listenKey se atiende aquí, donde está la conexión
+        self._evento_user(msg)
+        # ACCOUNT_UPDATE y demás eventos de cuenta: a todos
+        return list(set(self.workers.values()))
+
+    async def reenviar(self, raw, stream, tipo, symbol):
+        if isinstance(raw, str):
+            raw = raw.encode()
+        # Los workers conocen el USER stream por nombre fijo, no por el listenKey
+        frame = _frame(b'D', ('USER' if tipo == 'USER' else stream).encode() + b'\n' + raw)
+        for w in self._destinos(raw, tipo, symbol):
+            if w is None or w.is_closing():
+                self.router.descartados += 1
+                continue
+            w.write(frame)
+            if w.transport.get_write_buffer_size() > LIMITE_BUFFER_WORKER:
+                try:
+                    await w.drain()
+                except ConnectionError:
+                    pass
+
+    def _nombres(self, streams):
+        return ['USER' if self.router.rutas.get(s, (None,))[0] == 'USER' else s for s in streams]
+
+    def _al_conectar(self, streams):
+        # Los libros y espejos de cuenta están en los workers: que ellos invaliden y resincronicen
+        cuerpo = json.dumps(self._nombres(streams)).encode()
+        for w in set(self.workers.values()):
+            if not w.is_closing():
+                w.write(_frame(b'C', cuerpo))
+
+    async def atender_worker(self, reader, writer):
+        symbols = []
+        try:
+            _, cuerpo = await _leer_frame(reader)
+            symbols = json.loads(cuerpo)
+            for s in symbols:
+                self.workers[s] = writer
+            print(f"[INGEST] Worker conectado: {', '.join(symbols)}")
+            # Lo que pasó antes de conectarse no le llegó: libros y cuenta a resincronizar
+            if self.router is not None:
+                writer.write(_frame(b'C', json.dumps(self._nombres(self.router.streams())).encode()))
+            await reader.read()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for s in symbols:
+                if self.workers.get(s) is writer:
+                    del self.workers[s]
+            writer.close()
+            print(f"[INGEST] Worker desconectado: {', '.join(symbols)}")
+
+
+async def _ingest(symbols):
+    # Cliente remoto sólo para el listenKey: también pasa por el gateway
+    client = await ClienteRemoto.conectar(symbols)
+    ws = IngestManager(client, symbols)
+    server = await asyncio.start_unix_server(ws.atender_worker, path=_ruta_ipc('ingest'))
+    print(f"[INGEST] {len(symbols)} símbolos, workers en {_ruta_ipc('ingest')}")
+    async with server:
+        await ws.start_all(None)
+
+
+# --- worker ---
+
+async def _escuchar_ingest(ws, handler):
+    """Fuente de GridBot.run: los mensajes llegan del ingest en vez de un WebSocket propio."""
+    ws.router = ws._crear_router(handler)
+    ws.router.registrar('USER', 'USER')
+    espera = 0.2
+    while True:
+        try:
+            reader, writer = await asyncio.open_unix_connection(_ruta_ipc('ingest'))
+        except OSError:
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, 5)
+            continue
+        espera = 0.2
+        writer.write(_frame(b'H', json.dumps(ws.symbols).encode()))
+        try:
+            while True:
+                tipo, cuerpo = await _leer_frame(reader)
+                if tipo == b'D':
+                    stream, raw = cuerpo.split(b'\n', 1)
+                    try:
+                        await ws.router.despachar_directo(raw, stream.decode())
+                    except Exception as e:
+                        print(f"[ERROR] Handler {stream.decode()}: {e}")
+                elif tipo == b'C':
+                    ws._al_conectar(json.loads(cuerpo))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            print("[WORKER] Ingest desconectado, reintentando")
+        finally:
+            writer.close()
+
+
+async def _worker(symbols, indice):
+    client = await ClienteRemoto.conectar(symbols)
+    puerto = METRICS_PORT + 1 + indice if METRICS_PORT else 0
+    await GridBot(symbols, client=client, puerto_metricas=puerto).run(fuente=_escuchar_ingest)
+
+
+# --- supervisor ---
+
+_ROLES = {'gateway': _gateway, 'ingest': _ingest, 'worker': _worker}
+
+
+async def _latir(latido):
+    while True:
+        latido.value = time.monotonic()
+        await asyncio.sleep(1)
+
+
+def _entrar(rol, latido, *args):
+    async def principal():
+        # El latido corre en el mismo loop: si el loop se cuelga, deja de latir
+        asyncio.create_task(_latir(latido))
+        if args:
+            print(f"[{rol.upper()}] pid={os.getpid()} símbolos={', '.join(args[0])}")
+        await _ROLES[rol](*args)
+    try:
+        asyncio.run(principal())
+    except KeyboardInterrupt:
+        pass
+
+
+class Proceso:
+    def __init__(self, ctx, nombre, rol, *args):
+        self.ctx = ctx
+        self.nombre = nombre
+        self.rol = rol
+        self.args = args
+        self.latido = ctx.Value('d', 0.0, lock=False)  # time.monotonic() es común a todos los procesos
+        self.proc = None
+        self.inicio = 0.0
+        self.reinicios = 0
+        self.reiniciar_en = 0.0
+
+    def iniciar(self):
+        self.latido.value = self.inicio = time.monotonic()
+        self.proc = self.ctx.Process(target=_entrar, args=(self.rol, self.latido, *self.args), name=self.nombre, daemon=True)
+        self.proc.start()
+
+    def problema(self):
+        if not self.proc.is_alive():
+            return f"terminó con código {self.proc.exitcode}"
+        silencio = time.monotonic() - self.latido.value
+        if silencio > SUPERVISOR_HEARTBEAT_TIMEOUT:
+            return f"sin latido hace {silencio:.0f}s"
+        return None
+
+    def detener(self):
+        if self.proc is None:
+            return
+        if self.proc.is_alive():
+            self.proc.terminate()
+            self.proc.join(5)
+            if self.proc.is_alive():
+                self.proc.kill()
+                self.proc.join()
+        self.proc = None
+
+
+class Supervisor:
+    """Arranca gateway, ingest y workers, y los reinicia (con backoff) si caen o se cuelgan."""
+
+    def __init__(self, symbols=None, workers=SUPERVISOR_WORKERS):
+        self.symbols = [s.upper() for s in (symbols or SYMBOLS)]
+        # Dos núcleos quedan para ingest y gateway
+        n = workers or max(1, (os.cpu_count() or 1) - 2)
+        self.shards = repartir(self.symbols, min(n, len(self.symbols)))
+        ctx = multiprocessing.get_context('spawn')
+        self.procesos = [Proceso(ctx, 'gateway', 'gateway'), Proceso(ctx, 'ingest', 'ingest', self.symbols)]
+        self.procesos += [Proceso(ctx, f"worker-{i}", 'worker', shard, i) for i, shard in enumerate(self.shards)]
+
+    def chequear(self):
+        ahora = time.monotonic()
+        for p in self.procesos:
+            if p.proc is None:
+                if ahora >= p.reiniciar_en:
+                    print(f"[SUPERVISOR] Reiniciando {p.nombre} (reinicio #{p.reinicios})")
+                    p.iniciar()
+                continue
+            problema = p.problema()
+            if problema is None:
+                if p.reinicios and ahora - p.inicio > SUPERVISOR_RESTART_BACKOFF_MAX:
+                    p.reinicios = 0  # Estable de nuevo
+                continue
+            print(f"[SUPERVISOR] {p.nombre} {problema}")
+            p.detener()
+            p.reinicios += 1
+            p.reiniciar_en = ahora + min(2 ** (p.reinicios - 1), SUPERVISOR_RESTART_BACKOFF_MAX)
+
+    def run(self):
+        os.makedirs(SUPERVISOR_IPC_DIR, exist_ok=True)
+        print(f"[SUPERVISOR] {len(self.symbols)} símbolos en {len(self.shards)} workers: "
+              f"{' | '.join(', '.join(s) for s in self.shards)}")
+        for p in self.procesos:
+            p.iniciar()
+        try:
+            while True:
+                time.sleep(SUPERVISOR_CHECK_SECONDS)
+                self.chequear()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # Workers primero: el gateway atiende sus cancelaciones hasta el final
+            for p in reversed(self.procesos):
+                p.detener()
+
+
+if __name__ == "__main__":
+    Supervisor().run()
@@ -0,0 +1,362 @@
+"""
+Barrido de parámetros del grid (spacing / rango / TP / SL) sobre un dataset de ticks.
+
+El dataset se convierte una vez a un .npy (4 x N float64: t_ms, precio, qty, venta)
+que cada proceso abre con np.load(mmap_mode='r'): todas las workers comparten las
+mismas páginas del page cache. Las combinaciones se reparten en bloques por un
+multiprocessing.Pool y cada bloque se simula vectorizado (una fila por combinación).
+
+Modelo (el mismo flujo que GridBot, simplificado):
+  - Rebalanceo cada --intervalo segundos: grid de compras construido como construir_grid
+    desde el primer precio de la época, con spacing/rango según la señal vista desde el
+    rebalanceo anterior (DUMP -> máximos, sin señal -> punto medio) y el filtro SAFE
+    respecto del promedio.
+    El bot, sin señal, sigue la ATR de las barras (SPACING_ATR_MULT/RANGO_ATR_MULT);
+    aquí se modela el punto medio, como con esos multiplicadores en 0.
+  - Las compras límite se llenan cuando el precio toca el nivel (maker).
+  - Un único TP reduceOnly por la posición completa en avg*(1+tp) (maker) y un SL
+    closePosition en avg*(1-sl), llenado al precio del tick que lo dispara (taker).
+  - La señal SOPORTE necesita el libro y no está en los ticks: no se modela.
+
+Uso:
+  python sweep.py preparar trades.csv|eventos.jsonl [-o ticks.npy]
+  python sweep.py correr ticks.npy --spacing-min 0.0008:0.0014:4 --tp 0.002:0.004:5 ...
+Cada rango es "inicio:fin:pasos" (linspace) o una lista "a,b,c".
+"""
+import argparse
+import itertools
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import numpy as np
+
+from config import (
+    GRID_RANGE_MIN, GRID_RANGE_MAX, MIN_GRID_SPACING, MAX_GRID_SPACING,
+    STOP_LOSS_PERCENTAGE, ORDER_USDT_SIZE, LEVERAGE, SAFE_SPREAD,
+    MAKER_FEE_RATE, TAKER_FEE_RATE, REBALANCE_SECONDS,
+    TRADE_WINDOW_MS, TRADE_WINDOW_CAPACITY, DUMP_MIN_TRADES_PER_SEC, DUMP_MIN_SELL_VOLUME,
+)
+
+TICK_SIZE = 0.01
+STEP_SIZE = 0.001
+MIN_QTY = 0.001
+TP_DEFAULT = 0.003  # ensure_take_profits coloca el TP a +0.3%
+
+PARAMS = ('spacing_min', 'spacing_max', 'range_min', 'range_max', 'tp', 'sl')
+RESULTADOS = ('pnl_realizado', 'fees', 'pnl_no_realizado', 'pnl_neto', 'max_drawdown',
+              'compras', 'tps', 'sls')
+
+
+# --- dataset ---
+def preparar_ticks(origen, destino=None):
+    """Convierte trades CSV (data.binance.vision) o eventos JSONL de backtest.py a .npy (4, N)."""
+    destino = destino or os.path.splitext(origen)[0] + ".ticks.npy"
+    if origen.endswith('.csv'):
+        import pandas as pd
+        with open(origen) as f:
+            con_header = not f.readline()[:1].isdigit()
+        cols = ['id', 'price', 'qty', 'quote_qty', 'time', 'is_buyer_maker']
+        df = pd.read_csv(origen, header=0 if con_header else None, names=cols,
+                         usecols=['price', 'qty', 'time', 'is_buyer_maker'])
+        ticks = np.vstack([
+            df['time'].to_numpy(np.float64),
+            df['price'].to_numpy(np.float64),
+            df['qty'].to_numpy(np.float64),
+            df['is_buyer_maker'].astype(str).str.lower().eq('true').to_numpy(np.float64),
+        ])
+    else:
+        from backtest import leer_eventos
+        filas = [(float(d.get('T') or d.get('E') or 0), float(d['p']), float(d['q']), 1.0 if d.get('m') else 0.0)
+                 for tipo, d in leer_eventos(origen) if tipo == 'TRADE']
+        ticks = np.array(filas, dtype=np.float64).T.reshape(4, -1)
+    orden = np.argsort(ticks[0], kind='stable')
+    ticks = np.ascontiguousarray(ticks[:, orden])
+    np.save(destino, ticks)
+    print(f"[SWEEP] {ticks.shape[1]} ticks -> {destino}")
+    return destino
+
+
+def cargar_ticks(path):
+    return np.load(path, mmap_mode='r')
+
+
+def senal_dump(t, qty, venta, window_ms=TRADE_WINDOW_MS, capacidad=TRADE_WINDOW_CAPACITY,
+               min_freq=DUMP_MIN_TRADES_PER_SEC, min_vol_ventas=DUMP_MIN_SELL_VOLUME):
+    """Condición DUMP de strategy.evaluar_senales en cada tick, vectorizada."""
+    n = len(t)
+    i = np.arange(n)
+    inicio = np.maximum(np.searchsorted(t, t - window_ms, side='left'), i - capacidad + 1)
+    cs = np.concatenate(([0.0], np.cumsum(qty * venta)))
+    vol_ventas = cs[i + 1] - cs[inicio]
+    frecuencia = (i - inicio + 1) / (window_ms / 1000.0)
+    return (frecuencia > min_freq) & (vol_ventas > min_vol_ventas)
+
+
+def epocas(t, dump, intervalo_s):
+    """Índices de inicio de cada rebalanceo y si hubo DUMP desde el rebalanceo anterior."""
+    marcas = np.arange(t[0], t[-1] + 1, intervalo_s * 1000.0)
+    limites = np.unique(np.searchsorted(t, marcas, side='left'))
+    limites = np.append(limites, len(t))
+    vistos = np.cumsum(dump)
+    en_limite = vistos[limites[:-1]]
+    # El bot consume la señal en cada rebalanceo: cuentan sólo los DUMP de la época anterior
+    dump_epoca = (en_limite - np.concatenate(([0], en_limite[:-1]))) > 0
+    return limites, dump_epoca
+
+
+# --- consultas de rango (sparse table) ---
+def _tabla(x, op):
+    tablas = [x]
+    k = 1
+    while 2 * k <= len(x):
+        prev = tablas[-1]
+        tablas.append(op(prev[:-k], prev[k:]))
+        k *= 2
+    return tablas
+
+
+def _primero(tablas, t, objetivo, mayor):
+    """Primer índice >= t donde el precio alcanza `objetivo` (>= si mayor, <= si no); len si nunca."""
+    m = len(tablas[0])
+    t = t.copy()
+    for k in range(len(tablas) - 1, -1, -1):
+        tb = tablas[k]
+        paso = 1 << k
+        v = tb[np.minimum(t, len(tb) - 1)]
+        no_alcanza = (v < objetivo) if mayor else (v > objetivo)
+        t = np.where((t + paso <= m) & no_alcanza, t + paso, t)
+    return np.minimum(t, m)
+
+
+def _min_rango(tablas, a, b):
+    """Mínimo de [a, b) para a < b (las filas con a >= b devuelven +inf)."""
+    out = np.full(a.shape, np.inf)
+    largo = b - a
+    ok = largo > 0
+    k = np.zeros(a.shape, dtype=np.int64)
+    k[ok] = np.floor(np.log2(largo[ok])).astype(np.int64)
+    for nivel in np.unique(k[ok]):
+        sel = ok & (k == nivel)
+        tb = tablas[nivel]
+        out[sel] = np.minimum(tb[a[sel]], tb[b[sel] - (1 << nivel)])
+    return out
+
+
+# --- simulación vectorizada ---
+def simular(precio, limites, dump_epoca, params, max_niveles=20,
+            usdt=ORDER_USDT_SIZE, leverage=LEVERAGE, safe_spread=SAFE_SPREAD,
+            maker=MAKER_FEE_RATE, taker=TAKER_FEE_RATE):
+    """params: (C, 6) en el orden de PARAMS. Devuelve (C, 8) en el orden de RESULTADOS."""
+    C = len(params)
+    sp_min, sp_max, rg_min, rg_max, tp, sl = (params[:, i] for i in range(6))
+    filas = np.arange(C)
+    j = np.arange(max_niveles)
+
+    pos = np.zeros(C)
+    costo = np.zeros(C)
+    pnl = np.zeros(C)
+    fees = np.zeros(C)
+    pico = np.zeros(C)
+    max_dd = np.zeros(C)
+    compras = np.zeros(C, dtype=np.int64)
+    tps = np.zeros(C, dtype=np.int64)
+    sls = np.zeros(C, dtype=np.int64)
+
+    for e in range(len(limites) - 1):
+        a, b = limites[e], limites[e + 1]
+        p = np.asarray(precio[a:b])
+        m = len(p)
+        if m == 0:
+            continue
+        t_max = _tabla(p, np.maximum)
+        t_min = _tabla(p, np.minimum)
+
+        # construir_grid + recomendar_spacing/rango con la señal vigente
+        if dump_epoca[e]:
+            sp, rg = sp_max, rg_max
+        else:
+            sp, rg = (sp_min + sp_max) / 2.0, (rg_min + rg_max) / 2.0
+        n = np.minimum((rg / sp).astype(np.int64), max_niveles)
+        niveles = np.round(p[0] * (1 - sp[:, None] * (j + 1)) / TICK_SIZE) * TICK_SIZE
+        validos = j < n[:, None]
+        avg = np.divide(costo, pos, out=np.zeros(C), where=pos > 0)
+        safe = (pos <= 0)[:, None] | (niveles < (avg * (1 - safe_spread))[:, None])
+        validos &= safe
+        cant = np.maximum(np.floor(usdt * leverage / niveles / STEP_SIZE) * STEP_SIZE, MIN_QTY)
+
+        # Primer tick en que cada nivel se toca (mínimo acumulado: búsqueda binaria)
+        runmin = np.minimum.accumulate(p)
+        idx_compra = np.searchsorted(-runmin, -niveles.ravel(), side='left').reshape(niveles.shape)
+        idx_compra[~validos] = m
+        k = np.argmax(validos, axis=1)  # SAFE descarta un prefijo: empezar en el primer válido
+        k[~validos.any(axis=1)] = max_niveles
+
+        t = np.zeros(C, dtype=np.int64)
+        vivo = np.ones(C, dtype=bool)
+        while vivo.any():
+            kk = np.minimum(k, max_niveles - 1)
+            nb = np.where(k < max_niveles, idx_compra[filas, kk], m)
+            nb = np.maximum(nb, t)
+            hay = pos > 0
+            avg = np.divide(costo, pos, out=np.zeros(C), where=hay)
+            tp_px = np.round(avg * (1 + tp) / TICK_SIZE) * TICK_SIZE
+            sl_px = avg * (1 - sl)
+            ntp = np.where(hay, _primero(t_max, t + 1, tp_px, True), m)
+            nsl = np.where(hay, _primero(t_min, t + 1, sl_px, False), m)
+            ev = np.minimum(np.minimum(nb, ntp), nsl)
+
+            # Peor marca a mercado antes del próximo evento
+            fin = np.where(vivo, ev, t)
+            bajo = _min_rango(t_min, t, fin)
+            bajo = np.where(hay & np.isfinite(bajo), bajo, avg)
+            eq_bajo = pnl - fees + pos * (bajo - avg)
+            max_dd = np.maximum(max_dd, np.where(vivo, pico - eq_bajo, 0.0))
+
+            activo = vivo & (ev < m)
+            es_compra = activo & (nb <= ntp) & (nb <= nsl)
+            es_tp = activo & ~es_compra & (ntp <= nsl)
+            es_sl = activo & ~es_compra & ~es_tp
+
+            lvl = niveles[filas, kk]
+            q = cant[filas, kk]
+            pos = np.where(es_compra, pos + q, pos)
+            costo = np.where(es_compra, costo + q * lvl, costo)
+            fees += np.where(es_compra, q * lvl * maker, 0.0)
+            compras += es_compra
+            k = np.where(es_compra, k + 1, k)
+
+            pnl += np.where(es_tp, pos * (tp_px - avg), 0.0)
+            fees += np.where(es_tp, pos * tp_px * maker, 0.0)
+            tps += es_tp
+            px_sl = p[np.minimum(nsl, m - 1)]
+            pnl += np.where(es_sl, pos * (px_sl - avg), 0.0)
+            fees += np.where(es_sl, pos * px_sl * taker, 0.0)
+            sls += es_sl
+            cierre = es_tp | es_sl
+            pos = np.where(cierre, 0.0, pos)
+            costo = np.where(cierre, 0.0, costo)
+
+            t = np.where(activo, ev, t)
+            avg = np.divide(costo, pos, out=np.zeros(C), where=pos > 0)
+            eq = pnl - fees + pos * (p[np.minimum(t, m - 1)] - avg)
+            pico = np.maximum(pico, np.where(activo, eq, pico))
+            vivo = activo
+
+    ultimo = float(precio[-1])
+    avg = np.divide(costo, pos, out=np.zeros(C), where=pos > 0)
+    no_realizado = pos * (ultimo - avg)
+    neto = pnl - fees + no_realizado
+    return np.column_stack([pnl, fees, no_realizado, neto, max_dd, compras, tps, sls])
+
+
+# --- pool de procesos ---
+_W = {}
+
+
+def _init_worker(path, limites, dump_epoca, max_niveles):
+    _W['precio'] = cargar_ticks(path)[1]
+    _W['limites'] = limites
+    _W['dump_epoca'] = dump_epoca
+    _W['max_niveles'] = max_niveles
+
+
+def _correr_bloque(bloque):
+    return simular(_W['precio'], _W['limites'], _W['dump_epoca'], bloque, _W['max_niveles'])
+
+
+def combinaciones(spacing_min, spacing_max, range_min, range_max, tp, sl):
+    combos = np.array(list(itertools.product(spacing_min, spacing_max, range_min, range_max, tp, sl)),
+                      dtype=np.float64).reshape(-1, 6)
+    ok = (combos[:, 0] <= combos[:, 1]) & (combos[:, 2] <= combos[:, 3])
+    return combos[ok]
+
+
+def barrer(path, combos, procesos=None, intervalo=REBALANCE_SECONDS, max_niveles=20, bloque=None):
+    ticks = cargar_ticks(path)
+    t, qty, venta = np.asarray(ticks[0]), np.asarray(ticks[2]), np.asarray(ticks[3])
+    limites, dump_epoca = epocas(t, senal_dump(t, qty, venta), intervalo)
+    procesos = procesos or os.cpu_count() or 1
+    # Varios bloques por proceso para repartir bien la carga; cada bloque rehace las tablas por época
+    bloque = bloque or max(1, -(-len(combos) // (procesos * 4)))
+    bloques = [combos[i:i + bloque] for i in range(0, len(combos), bloque)]
+    args = (path, limites, dump_epoca, max_niveles)
+    if procesos == 1:
+        _init_worker(*args)
+        partes = [_correr_bloque(b) for b in bloques]
+    else:
+        with mp.Pool(procesos, initializer=_init_worker, initargs=args) as pool:
+            partes = pool.map(_correr_bloque, bloques, chunksize=1)
+    return np.vstack(partes) if partes else np.zeros((0, len(RESULTADOS))), len(limites) - 1, len(t)
+
+
+def _rango(texto, default):
+    if texto is None:
+        return [default]
+    if ':' in texto:
+        a, b, n = texto.split(':')
+        return list(np.linspace(float(a), float(b), int(n)))
+    return [float(x) for x in texto.split(',')]
+
+
+def tabla_ranking(combos, res, orden='pnl_neto', top=20):
+    col = RESULTADOS.index(orden)
+    idx = np.argsort(res[:, col])
+    if orden != 'max_drawdown':
+        idx = idx[::-1]
+    lineas = [" ".join(f"{h:>12}" for h in PARAMS + RESULTADOS)]
+    for i in idx[:top]:
+        vals = [f"{v:12.5f}" for v in combos[i]]
+        vals += [f"{v:12.4f}" for v in res[i, :5]] + [f"{int(v):12d}" for v in res[i, 5:]]
+        lineas.append(" ".join(vals))
+    return "\n".join(lineas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Barrido de parámetros del grid sobre ticks")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    prep = sub.add_parser('preparar', help="Convertir trades CSV / eventos JSONL a .npy")
+    prep.add_argument('origen')
+    prep.add_argument('-o', '--destino')
+    run = sub.add_parser('correr', help="Evaluar la grilla de combinaciones")
+    run.add_argument('ticks')
+    run.add_argument('--spacing-min')
+    run.add_argument('--spacing-max')
+    run.add_argument('--range-min')
+    run.add_argument('--range-max')
+    run.add_argument('--tp')
+    run.add_argument('--sl')
+    run.add_argument('--intervalo', type=float, default=REBALANCE_SECONDS, help="Segundos entre rebalanceos")
+    run.add_argument('--max-niveles', type=int, default=20)
+    run.add_argument('--procesos', type=int, default=None)
+    run.add_argument('--orden', choices=RESULTADOS, default='pnl_neto')
+    run.add_argument('--top', type=int, default=20)
+    run.add_argument('--csv', help="Guardar todos los resultados en CSV")
+    args = parser.parse_args()
+
+    if args.cmd == 'preparar':
+        preparar_ticks(args.origen, args.destino)
+        return
+
+    combos = combinaciones(
+        _rango(args.spacing_min, MIN_GRID_SPACING), _rango(args.spacing_max, MAX_GRID_SPACING),
+        _rango(args.range_min, GRID_RANGE_MIN), _rango(args.range_max, GRID_RANGE_MAX),
+        _rango(args.tp, TP_DEFAULT), _rango(args.sl, STOP_LOSS_PERCENTAGE),
+    )
+    if not len(combos):
+        sys.exit("[SWEEP] Ninguna combinación válida (spacing_min <= spacing_max <= ... )")
+    inicio = time.perf_counter()
+    res, n_epocas, n_ticks = barrer(args.ticks, combos, args.procesos, args.intervalo, args.max_niveles)
+    dur = time.perf_counter() - inicio
+    print(f"[SWEEP] {len(combos)} combinaciones x {n_ticks} ticks ({n_epocas} rebalanceos) "
+          f"en {dur:.2f}s ({len(combos) / dur:.0f} comb/s)")
+    print(tabla_ranking(combos, res, args.orden, args.top))
+    if args.csv:
+        np.savetxt(args.csv, np.hstack([combos, res]), delimiter=',',
+                   header=",".join(PARAMS + RESULTADOS), comments='', fmt='%.8g')
+        print(f"[SWEEP] Resultados completos en {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
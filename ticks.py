@@ -0,0 +1,94 @@
+"""
+Precios y cantidades como enteros: ticks de tickSize y steps de stepSize.
+Se redondea una sola vez al entrar (float -> entero) y se vuelve a float
+sólo al armar el request, así el mismo precio siempre produce el mismo tick.
+"""
+from decimal import Decimal, ROUND_FLOOR, ROUND_HALF_EVEN
+
+import numpy as np
+
+EPS = 1e-9  # Absorbe el error de representación de q/step (0.3/0.1 = 2.9999999999999996)
+
+
+def _decimales(paso):
+    return max(0, -Decimal(str(paso)).normalize().as_tuple().exponent)
+
+
+class TickScale:
+    """Conversión exacta float <-> ticks/steps para los filtros de un símbolo."""
+
+    def __init__(self, tick_size, step_size, min_qty):
+        self.filters = {'tickSize': tick_size, 'stepSize': step_size, 'minQty': min_qty}
+        self.tick = float(tick_size)
+        self.step = float(step_size)
+        self._tick_dec = Decimal(str(tick_size))
+        self._step_dec = Decimal(str(step_size))
+        self.dec_precio = _decimales(tick_size)
+        self.dec_qty = _decimales(step_size)
+        self.min_steps = max(1, int((Decimal(str(min_qty)) / self._step_dec).to_integral_value(ROUND_FLOOR)))
+
+    @classmethod
+    def desde_filtros(cls, filters):
+        return cls(filters['tickSize'], filters['stepSize'], filters['minQty'])
+
+    # --- escalares ---
+    def a_ticks(self, price):
+        """Tick más cercano (empate a par), calculado sobre la representación decimal del float."""
+        return int((Decimal(str(price)) / self._tick_dec).to_integral_value(ROUND_HALF_EVEN))
+
+    def a_steps(self, qty):
+        """Steps por truncamiento, nunca menos que minQty."""
+        steps = int((Decimal(str(qty)) / self._step_dec).to_integral_value(ROUND_FLOOR))
+        return max(steps, self.min_steps)
+
+    def precio(self, ticks):
+        return round(ticks * self.tick, self.dec_precio)
+
+    def cantidad(self, steps):
+        return round(steps * self.step, self.dec_qty)
+
+    def round_price(self, price):
+        return self.precio(self.a_ticks(price))
+
+    def round_qty(self, qty):
+        return self.cantidad(self.a_steps(qty))
+
+    # --- escalera del grid ---
+    def escalera(self, precio_actual, spacing, range_down, usdt_size=None, leverage=1,
+                 avg_entry=0.0, safe_spread=0.0, max_niveles=None):
+        """
+        Niveles BUY del grid en una sola pasada vectorizada: precio_actual*(1 - spacing*i)
+        llevado a ticks, sin niveles repetidos en el mismo tick, filtrados por avg_entry y
+        safe_spread y recortados a `max_niveles`. Devuelve (ticks, steps) como arrays int64;
+        steps queda vacío si no se pasa usdt_size.
+        """
+        n = int(range_down / spacing + EPS) if spacing > 0 else 0
+        i = np.arange(1, n + 1, dtype=np.float64)
+        ticks = np.rint(precio_actual * (1.0 - spacing * i) / self.tick).astype(np.int64)
+        ticks = ticks[ticks > 0]
+        # Decrecientes: los que colapsan en el mismo tick quedan contiguos
+        if len(ticks) > 1:
+            ticks = ticks[np.concatenate(([True], ticks[1:] != ticks[:-1]))]
+        if avg_entry:
+            # Sólo niveles que bajan el promedio al menos safe_spread
+            precios = ticks * self.tick
+            ticks = ticks[(precios < avg_entry) & ((avg_entry - precios) / avg_entry >= safe_spread)]
+        if max_niveles is not None:
+            ticks = ticks[:max(0, int(max_niveles))]
+        if usdt_size is None:
+            return ticks, np.zeros(0, dtype=np.int64)
+        steps = np.floor(usdt_size * leverage / (ticks * self.tick) / self.step + EPS).astype(np.int64)
+        return ticks, np.maximum(steps, self.min_steps)
+
+    def niveles(self, ticks, steps):
+        """(precio, qty) en float listos para el request."""
+        precios = np.round(ticks * self.tick, self.dec_precio).tolist()
+        qtys = np.round(steps * self.step, self.dec_qty).tolist()
+        return list(zip(precios, qtys))
+
+
+def construir_escalera(precio_actual, spacing, range_down, tick_size):
+    """Sólo precios, para quien no tiene los filtros completos (strategy.construir_grid)."""
+    escala = TickScale(tick_size, tick_size, tick_size)
+    ticks, _ = escala.escalera(precio_actual, spacing, range_down)
+    return np.round(ticks * escala.tick, escala.dec_precio).tolist()
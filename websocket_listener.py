@@ -1,76 +1,269 @@
 import asyncio
 import json
+import random
 import websockets
-from config import SYMBOL, USE_TESTNET, PAPER_MODE
-from binance_client import BinanceClient
+import reloj
+from config import (
+    SYMBOLS, USE_TESTNET, PAPER_MODE, WS_MODE, WS_FAPI_URL,
+    WS_RECONNECT_BASE_SECONDS, WS_RECONNECT_MAX_SECONDS, LISTEN_KEY_KEEPALIVE_SECONDS
+)
+from binance_client import AsyncBinanceClient, obtener_cliente
+from stream_router import StreamRouter
+from metrics import RECONEXIONES, LISTEN_KEY_RENOVADO
 
 WS_FAPI_MAIN = 'wss://fstream.binance.com/ws'
 WS_FAPI_TEST = 'wss://stream.binancefuture.com/ws'
+WS_FAPI_MAIN_COMBINED = 'wss://fstream.binance.com/stream'
+WS_FAPI_TEST_COMBINED = 'wss://stream.binancefuture.com/stream'
+CONEXION_ESTABLE_SECONDS = 5  # Una conexión que duró menos cuenta como fallo aunque cierre limpio
+
+
+def espera_reconexion(fallos):
+    """Segundos antes de reconectar: 0 sin fallos; si no, backoff exponencial con jitter (mitad fija, mitad al azar)."""
+    if fallos <= 0:
+        return 0.0
+    tope = min(WS_RECONNECT_MAX_SECONDS, WS_RECONNECT_BASE_SECONDS * 2 ** (fallos - 1))
+    return tope / 2 + random.uniform(0, tope / 2)
+
 
 class WebSocketManager:
-    def __init__(self):
-        self.symbol = SYMBOL.lower()
+    """
+    Streams de mercado (trade, depth, miniTicker) de todos los símbolos más el USER
+    stream de la cuenta. En modo 'combined'/'subscribe' todo va por una sola conexión;
+    el router entrega cada mensaje con su (tipo, símbolo).
+    """
+
+    def __init__(self, client: AsyncBinanceClient = None, mode=WS_MODE, symbols=None):
+        self.symbols = [s.upper() for s in (symbols or SYMBOLS)]
+        self.mode = mode  # 'separate' | 'combined' | 'subscribe'
         self.base_ws = WS_FAPI_TEST if USE_TESTNET else WS_FAPI_MAIN
-        self.trade_url = f"{self.base_ws}/{self.symbol}@trade"
-        self.depth_url = f"{self.base_ws}/{self.symbol}@depth@100ms"
-        self.ticker_url = f"{self.base_ws}/{self.symbol}@miniTicker"
+        self.base_combined = WS_FAPI_TEST_COMBINED if USE_TESTNET else WS_FAPI_MAIN_COMBINED
+        if WS_FAPI_URL:
+            self.base_ws = f"{WS_FAPI_URL}/ws"
+            self.base_combined = f"{WS_FAPI_URL}/stream"
         self.user_url = None
         self.listen_key = None
         self._stop = False
-        self._client = BinanceClient()
+        self._client = client
+        self.order_books = {}   # símbolo -> LocalOrderBook alimentado con los diffs de DEPTH
+        self.cuentas = {}       # símbolo -> AccountMirror: se resincronizan al reconectar el USER stream
+        self.recuperadores = {} # símbolo -> corrutina(t0) que recupera el hueco del USER stream (fills + espejo)
+        self._resync_cuenta = None
+        self._renovacion = None
+        self._ws_user = None    # conexión que lleva el USER stream (se cierra al renovar el listenKey)
+        self._caidas = {}       # conexión -> reloj.monotonic() de la última caída
+        self.router = None
+
+    def _crear_router(self, handler):
+        router = StreamRouter(handler)
+        for symbol in self.symbols:
+            s = symbol.lower()
+            libro = self.order_books.get(symbol)
+            router.registrar(f"{s}@trade", 'TRADE', symbol)
+            router.registrar(f"{s}@depth@100ms", 'DEPTH', symbol, hook=libro.aplicar_diff if libro is not None else None)
+            router.registrar(f"{s}@miniTicker", 'TICKER', symbol)
+        return router
 
-    async def _connect_and_listen(self, url, name, handler):
-        backoff = 1
+    async def _resincronizar_cuentas(self, t0):
+        await asyncio.gather(*(
+            self.recuperadores[s](t0) if s in self.recuperadores else c.sincronizar()
+            for s, c in self.cuentas.items()
+        ))
+
+    def _al_conectar(self, streams):
+        user = False
+        for stream in streams:
+            tipo, symbol = self.router.rutas.get(stream, (None, None))
+            if tipo == 'DEPTH' and symbol in self.order_books:
+                # Tras (re)conectar se perdieron diffs: el libro debe resincronizar
+                self.order_books[symbol].invalidar()
+            elif tipo == 'USER':
+                user = True
+        if user and self.cuentas:
+            # Igual con los eventos de cuenta: REST hasta recuperar los fills del hueco y resincronizar.
+            # Una recuperación en curso se reemplaza: el hueco pendiente se conserva en cada espejo
+            t0 = reloj.monotonic()
+            for cuenta in self.cuentas.values():
+                cuenta.invalidar()
+            if self._resync_cuenta is not None and not self._resync_cuenta.done():
+                self._resync_cuenta.cancel()
+            self._resync_cuenta = asyncio.create_task(self._resincronizar_cuentas(t0))
+
+    def _conectado(self, name, etiqueta=None):
+        caida = self._caidas.pop(name, None)
+        hueco = f" tras {(reloj.monotonic() - caida) * 1000:.0f}ms sin conexión" if caida is not None else ""
+        print(f"[WS] Conectado a {etiqueta or name}{hueco}")
+
+    async def _mantener_conexion(self, name, sesion):
+        """
+        Repite `sesion()` (conectar y leer hasta el cierre) mientras no se detenga. Tras el
+        cierre limpio de una conexión estable (corte programado, listenKey renovado)
+        reconecta sin espera; tras errores, backoff exponencial con jitter.
+        """
+        fallos = 0
         while not self._stop:
+            inicio = reloj.monotonic()
             try:
-                async with websockets.connect(url, ping_interval=20, ping_timeout=20) as ws:
-                    print(f"[WS] Conectado a {name}")
-                    backoff = 1
-                    async for msg in ws:
-                        try:
-                            data = json.loads(msg)
-                            await handler(data, name)
-                        except Exception as e:
-                            print(f"[ERROR] Handler {name}: {e}")
+                await sesion()
+                motivo, limpio = "cerrado por el servidor", True
             except Exception as e:
-                print(f"[WS] {name} desconectado: {e}. Reintentando en {backoff}s")
-                await asyncio.sleep(backoff)
-                backoff = min(backoff * 2, 30)
+                motivo, limpio = str(e), False
+            if self._stop:
+                return
+            RECONEXIONES.inc(name)
+            self._caidas[name] = ahora = reloj.monotonic()
+            if ahora - inicio >= CONEXION_ESTABLE_SECONDS:
+                fallos = 0 if limpio else 1
+            else:
+                fallos += 1
+            espera = espera_reconexion(fallos)
+            print(f"[WS] {name} desconectado: {motivo}. Reintentando en {espera:.1f}s")
+            if espera:
+                await asyncio.sleep(espera)
 
-    async def _user_stream_task(self, handler):
-        if PAPER_MODE:
-            return
+    async def _connect_and_listen(self, url, stream):
+        tipo, symbol = self.router.rutas[stream]
+        name = f"{tipo} {symbol}" if symbol else tipo  # sin el listenKey en los logs
+
+        async def sesion():
+            # El USER stream usa el listenKey vigente: pudo renovarse desde la última conexión
+            u, s = (self.user_url, self.listen_key) if tipo == 'USER' else (url, stream)
+            async with websockets.connect(u, ping_interval=20, ping_timeout=20) as ws:
+                self._conectado(name)
+                if tipo == 'USER':
+                    self._ws_user = ws
+                self._al_conectar((s,))
+                async for msg in ws:
+                    try:
+                        await self.router.despachar_directo(msg, s)
+                    except Exception as e:
+                        print(f"[ERROR] Handler {name}: {e}")
+
+        await self._mantener_conexion(name, sesion)
+
+    async def _combined_listen(self):
+        """
+        Una sola conexión para todos los streams: un único ping/pong y una única
+        máquina de reconexión. En modo 'subscribe' se conecta al endpoint /stream
+        vacío y se suscribe con SUBSCRIBE; en 'combined' los streams van en la URL.
+        """
+        async def sesion():
+            streams = self.router.streams()
+            if self.mode == 'subscribe':
+                url = self.base_combined
+            else:
+                url = f"{self.base_combined}?streams={'/'.join(streams)}"
+            async with websockets.connect(url, ping_interval=20, ping_timeout=20, max_size=None) as ws:
+                if self.mode == 'subscribe':
+                    await ws.send(json.dumps({"method": "SUBSCRIBE", "params": streams, "id": 1}))
+                self._conectado('combinado', f"stream combinado ({len(streams)} streams)")
+                if self.listen_key in streams:
+                    self._ws_user = ws
+                self._al_conectar(streams)
+                async for msg in ws:
+                    try:
+                        await self.router.despachar(msg)
+                    except Exception as e:
+                        print(f"[ERROR] Handler combinado: {e}")
+
+        await self._mantener_conexion('combinado', sesion)
+
+    async def _obtener_listen_key(self):
+        if self._client is None:
+            self._client = await obtener_cliente()
         # Obtener listenKey de forma robusta
-        lk = self._client.futures_stream_get_listen_key()
+        lk = await self._client.futures_stream_get_listen_key()
         if not lk:
             print("[WARN] No listenKey disponible: deshabilitando USER stream")
-            return
+            return None
         self.listen_key = lk
         self.user_url = f"{self.base_ws}/{self.listen_key}"
+        return lk
 
-        async def keepalive():
-            while not self._stop:
-                await asyncio.sleep(30 * 60)  # 30 minutos
-                self._client.futures_stream_keepalive(self.listen_key)
+    async def _keepalive(self):
+        while not self._stop:
+            await asyncio.sleep(LISTEN_KEY_KEEPALIVE_SECONDS)
+            if await self._client.futures_stream_keepalive(self.listen_key) is None:
+                # Falló el keepalive (listenKey vencido o inexistente): pedir uno nuevo
+                self._programar_renovacion('keepalive')
 
-        ka_task = asyncio.create_task(keepalive())
+    def _evento_user(self, data):
+        # Hook del USER stream, antes del handler: el exchange avisa que el listenKey venció
+        if data.get('e') == 'listenKeyExpired':
+            self._programar_renovacion('expirado')
+
+    def _programar_renovacion(self, motivo):
+        if self._renovacion is None or self._renovacion.done():
+            self._renovacion = asyncio.create_task(self._renovar_listen_key(motivo))
+
+    async def _renovar_listen_key(self, motivo):
+        """listenKey nuevo y el USER stream reconectado con él; lo perdido se recupera en _al_conectar."""
+        anterior = self.listen_key
+        espera = 1
+        while not await self._obtener_listen_key():
+            if self._stop:
+                return
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, 30)
+        LISTEN_KEY_RENOVADO.inc(motivo)
+        if self.listen_key == anterior:
+            print(f"[USER] listenKey vigente ({motivo}): sin reconectar")
+            return
+        print(f"[USER] listenKey renovado ({motivo})")
+        self.router.quitar(anterior)
+        self.router.registrar(self.listen_key, 'USER', hook=self._evento_user)
+        ws = self._ws_user
+        if ws is None:
+            return
+        if self.mode == 'subscribe':
+            # Misma conexión: cambiar la suscripción y recuperar lo que se perdió con la anterior
+            await ws.send(json.dumps({"method": "UNSUBSCRIBE", "params": [anterior], "id": 2}))
+            await ws.send(json.dumps({"method": "SUBSCRIBE", "params": [self.listen_key], "id": 3}))
+            self._al_conectar((self.listen_key,))
+        else:
+            # Cierre limpio: _mantener_conexion reconecta sin espera con el listenKey nuevo
+            await ws.close()
+
+    async def _cerrar_listen_key(self):
+        try:
+            await self._client.futures_stream_close(self.listen_key)
+        except Exception as e:
+            print(f"[USER] close error: {e}")
+
+    async def _user_stream_task(self):
+        if PAPER_MODE:
+            return
+        if not await self._obtener_listen_key():
+            return
+
+        self.router.registrar(self.listen_key, 'USER', hook=self._evento_user)
+        ka_task = asyncio.create_task(self._keepalive())
         try:
-            await self._connect_and_listen(self.user_url, 'USER', handler)
+            await self._connect_and_listen(self.user_url, self.listen_key)
         finally:
             ka_task.cancel()
-            try:
-                self._client.futures_stream_close(self.listen_key)
-            except Exception as e:
-                print(f"[USER] close error: {e}")
+            await self._cerrar_listen_key()
 
     async def start_all(self, handler):
-        tasks = [
-            self._connect_and_listen(self.trade_url, 'TRADE', handler),
-            self._connect_and_listen(self.depth_url, 'DEPTH', handler),
-            self._connect_and_listen(self.ticker_url, 'TICKER', handler),
-        ]
+        self.router = self._crear_router(handler)
+        if self.mode in ('combined', 'subscribe'):
+            ka_task = None
+            if not PAPER_MODE and await self._obtener_listen_key():
+                # El listenKey se multiplexa como un stream más de la misma conexión
+                self.router.registrar(self.listen_key, 'USER', hook=self._evento_user)
+                ka_task = asyncio.create_task(self._keepalive())
+            try:
+                await self._combined_listen()
+            finally:
+                if ka_task is not None:
+                    ka_task.cancel()
+                    await self._cerrar_listen_key()
+            return
+
+        # 'separate': un socket por stream de mercado y otro para el USER stream
+        tasks = [self._connect_and_listen(f"{self.base_ws}/{stream}", stream) for stream in self.router.streams()]
         if not PAPER_MODE:
-            tasks.append(self._user_stream_task(handler))
+            tasks.append(self._user_stream_task())
         await asyncio.gather(*tasks)
 
     def stop(self):